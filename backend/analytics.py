@@ -0,0 +1,171 @@
+"""
+Streaming analytics of incoming questions in bounded memory.
+
+Each query is reduced to a normalized question, the control IDs it names and
+its intent. Each of those is counted in one shared count-min sketch. The sketch
+is ``depth`` rows of ``width`` counters, and an item's estimate is its smallest
+counter across the rows. The estimate never undercounts, and it overcounts by
+at most about ``e / width`` of all observations. Conservative update (raising
+only the counters that equal the minimum) keeps the overcount lower in
+practice.
+
+A ``HeavyHitters`` list per kind keeps the items with the highest estimates,
+up to a fixed capacity. Counts are halved every ``half_life_hours``, so the
+top items follow current traffic. The top questions drive the response cache
+warm-up in main.py.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+_CONTROL_ID = re.compile(r"\bA\s*\.?\s*(\d{1,2})\s*\.\s*(\d{1,2})\b", re.IGNORECASE)
+_PUNCTUATION = re.compile(r"[^\w\s.]|(?<!\w)\.|\.(?!\w)")
+
+def normalize_question(query: str) -> str:
+    """Canonical form of a question for counting and caching: lower case, no punctuation, one space"""
+    text = _CONTROL_ID.sub(lambda m: f"a.{int(m.group(1))}.{int(m.group(2))}", query.strip().lower())
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+class CountMinSketch:
+    """Approximate counts of arbitrary string items in ``width * depth`` counters"""
+
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self._rows = [array("I", [0]) * width for _ in range(depth)]
+        self.total = 0
+
+    def _cells(self, item: str) -> List[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width for row in range(self.depth)]
+
+    def add(self, item: str, count: int = 1) -> int:
+        """Count ``item`` and return its new estimate"""
+        cells = self._cells(item)
+        estimate = min(row[cell] for row, cell in zip(self._rows, cells)) + count
+        for row, cell in zip(self._rows, cells):
+            if row[cell] < estimate:
+                row[cell] = estimate
+        self.total += count
+        return estimate
+
+    def estimate(self, item: str) -> int:
+        return min(row[cell] for row, cell in zip(self._rows, self._cells(item)))
+
+    def halve(self):
+        for row in self._rows:
+            for i in range(self.width):
+                row[i] >>= 1
+        self.total >>= 1
+
+class HeavyHitters:
+    """The ``capacity`` items with the highest sketch estimates, with one sample text each"""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self._items: Dict[str, List[Any]] = {}  # key -> [estimate, sample]
+
+    def offer(self, key: str, estimate: int, sample: str):
+        entry = self._items.get(key)
+        if entry is not None:
+            entry[0] = estimate
+            return
+        if len(self._items) >= self.capacity:
+            smallest = min(self._items, key=lambda k: self._items[k][0])
+            if self._items[smallest][0] >= estimate:
+                return
+            del self._items[smallest]
+        self._items[key] = [estimate, sample]
+
+    def halve(self):
+        for entry in self._items.values():
+            entry[0] >>= 1
+
+    def top(self, k: int) -> List[Tuple[str, int, str]]:
+        ranked = sorted(self._items.items(), key=lambda item: item[1][0], reverse=True)[:k]
+        return [(key, estimate, sample) for key, (estimate, sample) in ranked]
+
+    def __len__(self):
+        return len(self._items)
+
+class QueryAnalytics:
+    """Frequency of questions, control IDs and intents over recent traffic"""
+
+    KINDS = ("question", "control", "intent")
+
+    def __init__(self, width: int = 4096, depth: int = 4, capacity: int = 200, half_life_hours: float = 24.0):
+        self.sketch = CountMinSketch(width, depth)
+        self.hitters = {kind: HeavyHitters(capacity) for kind in self.KINDS}
+        self.half_life = half_life_hours * 3600
+        self._halved_at = time.time()
+        self._lock = threading.Lock()
+
+    def _count(self, kind: str, key: str, sample: str):
+        estimate = self.sketch.add(f"{kind}:{key}")
+        self.hitters[kind].offer(key, estimate, sample)
+
+    def observe(self, query: str, control_ids: List[str], intent: str, now: Optional[float] = None):
+        """Count one incoming query"""
+        now = time.time() if now is None else now
+        question = normalize_question(query)
+        with self._lock:
+            if self.half_life and now - self._halved_at >= self.half_life:
+                self.sketch.halve()
+                for hitters in self.hitters.values():
+                    hitters.halve()
+                self._halved_at = now
+            if question:
+                self._count("question", question, query.strip())
+            for control_id in control_ids:
+                self._count("control", control_id, control_id)
+            self._count("intent", intent, intent)
+
+    def top(self, kind: str, k: int = 20) -> List[Dict[str, Any]]:
+        """Most frequent items of ``kind`` with their estimated counts (never under the true count)"""
+        with self._lock:
+            return [
+                {"key": key, "count": estimate, **({"sample": sample} if kind == "question" else {})}
+                for key, estimate, sample in self.hitters[kind].top(k)
+            ]
+
+    def export(self) -> Tuple[Dict[str, Any], bytes]:
+        """Sketch settings, heavy hitters and halving time, and the sketch counters as raw bytes"""
+        with self._lock:
+            state = {
+                "width": self.sketch.width, "depth": self.sketch.depth, "total": self.sketch.total,
+                "halved_at": self._halved_at,
+                "hitters": {kind: hitters._items for kind, hitters in self.hitters.items()},
+            }
+            return state, b"".join(row.tobytes() for row in self.sketch._rows)
+
+    def restore(self, state: Dict[str, Any], counters: bytes) -> bool:
+        """Load an ``export``; False (and nothing loaded) when the sketch dimensions differ"""
+        size = array("I").itemsize * self.sketch.width
+        if ((state["width"], state["depth"]) != (self.sketch.width, self.sketch.depth)
+                or len(counters) != size * self.sketch.depth):
+            return False
+        rows = []
+        for row in range(self.sketch.depth):
+            counts = array("I")
+            counts.frombytes(counters[row * size:(row + 1) * size])
+            rows.append(counts)
+        with self._lock:
+            self.sketch._rows = rows
+            self.sketch.total = state["total"]
+            self._halved_at = state["halved_at"]
+            for kind, items in state["hitters"].items():
+                if kind in self.hitters:
+                    self.hitters[kind]._items = {key: list(value) for key, value in items.items()}
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "observed": self.sketch.total,
+            "sketch": {"width": self.sketch.width, "depth": self.sketch.depth,
+                       "max_overcount": round(2.718 * self.sketch.total / self.sketch.width, 1)},
+            "tracked": {kind: len(hitters) for kind, hitters in self.hitters.items()},
+        }
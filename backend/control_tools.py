@@ -0,0 +1,136 @@
+"""
+Control lookup tools for the ISO 27001:2022 auditor.
+
+Instead of carrying the whole catalogue in its system prompt, the model is
+offered these tools and pulls only the controls it needs. Calls are answered
+in-process from the loaded ``KnowledgeBase`` and memoized. A ``ControlTools``
+instance is built per knowledge version, so the memo is invalidated by a
+reload.
+"""
+
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# OpenAI function-calling schemas, in the form accepted by ``bind_tools``
+TOOL_SCHEMAS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "lookup_control",
+            "description": "Get an ISO 27001:2022 Annex A control by its ID, e.g. A.5.23.",
+            "parameters": {
+                "type": "object",
+                "properties": {"control_id": {"type": "string", "description": "Control ID such as A.8.13"}},
+                "required": ["control_id"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "list_group",
+            "description": "List every control in a control group: organizational, people, physical or technological.",
+            "parameters": {
+                "type": "object",
+                "properties": {"name": {"type": "string", "description": "Group name"}},
+                "required": ["name"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_controls",
+            "description": "Find the controls most relevant to a topic or question.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string", "description": "Topic or question"},
+                    "limit": {"type": "integer", "description": "Maximum results (default 5)"},
+                },
+                "required": ["text"],
+            },
+        },
+    },
+]
+
+TOOL_NAMES = frozenset(schema["function"]["name"] for schema in TOOL_SCHEMAS)
+
+class ControlTools:
+    """Memoized tool implementations over one knowledge version
+
+    ``search`` maps (text, limit) to ``[(control_id, score)]``; main.py passes
+    the vector index search.
+    """
+
+    def __init__(self, kb, search: Callable[[str, int], List[Tuple[str, float]]]):
+        self.kb = kb
+        self._search = search
+        self._memo: Dict[Tuple[str, str], str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _control(self, control) -> Dict[str, str]:
+        return {"id": control.id, "title": control.title, "group": control.group}
+
+    def lookup_control(self, control_id: str) -> Dict[str, Any]:
+        control = self.kb.by_id.get(str(control_id).strip().upper())
+        if control is None:
+            return {"error": f"No control {control_id!r} in knowledge version {self.kb.version}"}
+        group = self.kb.groups[control.group]
+        return {**self._control(control), "group_description": group["description"], "clause": group["clause"]}
+
+    def list_group(self, name: str) -> Dict[str, Any]:
+        name = str(name).strip().lower()
+        if name not in self.kb.by_group:
+            return {"error": f"Unknown group {name!r}; groups are {', '.join(self.kb.by_group)}"}
+        return {
+            "group": name,
+            "description": self.kb.groups[name]["description"],
+            "controls": [self._control(control) for control in self.kb.by_group[name]],
+        }
+
+    def search_controls(self, text: str, limit: int = 5) -> Dict[str, Any]:
+        limit = max(1, min(int(limit or 5), 20))
+        return {"results": [
+            {**self._control(self.kb.by_id[control_id]), "score": round(score, 3)}
+            for control_id, score in self._search(str(text), limit)
+        ]}
+
+    def call(self, name: str, args: Optional[Dict[str, Any]]) -> Tuple[str, bool]:
+        """Run a tool and return its JSON result and whether it came from the memo"""
+        if name not in TOOL_NAMES:
+            return json.dumps({"error": f"Unknown tool {name!r}"}), False
+        key = (name, json.dumps(args or {}, sort_keys=True))
+        result = self._memo.get(key)
+        if result is not None:
+            self.hits += 1
+            return result, True
+        self.misses += 1
+        try:
+            result = json.dumps(getattr(self, name)(**(args or {})))
+        except TypeError as e:
+            return json.dumps({"error": f"Bad arguments for {name}: {e}"}), False
+        except Exception as e:
+            # Malformed values (e.g. a non-numeric limit) or a failing search: the model
+            # sees the error and can retry; it is not memoized
+            return json.dumps({"error": f"{name} failed: {e}"}), False
+        if len(self._memo) < 4096:
+            self._memo[key] = result
+        return result, False
+
+    def execute(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Answer a batch of model tool calls with one timed result per call"""
+        results = []
+        for tool_call in tool_calls:
+            started = time.perf_counter()
+            content, cached = self.call(tool_call["name"], tool_call.get("args"))
+            results.append({
+                "id": tool_call.get("id"),
+                "name": tool_call["name"],
+                "content": content,
+                "cached": cached,
+                "ms": (time.perf_counter() - started) * 1000,
+            })
+        return results
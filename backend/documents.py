@@ -0,0 +1,478 @@
+"""
+Uploaded policy documents and evidence for the ISO 27001:2022 Auditor Agent.
+
+Uploads are streamed to disk block by block while they are hashed, decoded and
+chunked incrementally, so a large file is never held in memory. Chunk
+boundaries are content-defined (they fall after paragraphs whose hash matches a
+pattern), which keeps unchanged text in identical chunks when a document is
+edited. Chunks are content-addressed by SHA-256 and stored once in an
+append-only pack file (``DOCUMENTS_DIR/chunks.pack`` with a ``chunks.idx``
+sidecar); each document keeps a ``meta.json`` listing its chunks.
+
+Uploading a new version of a document diffs its chunk hashes against the
+previous version: only new chunks are indexed, and the version's ``diff``
+records which chunks were added, removed or unchanged.
+"""
+
+import codecs
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+DOCUMENTS_DIR = Path(os.getenv(
+    "DOCUMENTS_DIR", Path(__file__).resolve().parent / "storage" / "documents"
+))
+
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown", ".csv", ".json", ".yaml", ".yml", ".rst", ".html", ".htm"}
+PDF_EXTENSIONS = {".pdf"}
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+class DocumentError(ValueError):
+    """Raised for unsupported or malformed uploads"""
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; dotted identifiers such as a.5.23 stay whole"""
+    return _TOKEN.findall(text.lower())
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class IncrementalChunker:
+    """Split streamed text into content-defined chunks
+
+    A chunk closes after a paragraph once it holds at least ``min_chars`` and
+    the paragraph's hash hits the boundary pattern, or as soon as it reaches
+    ``max_chars``. Because the decision only looks at local content, an edit
+    changes the chunks around it and boundaries resynchronise afterwards.
+    """
+
+    def __init__(self, min_chars: int = 800, max_chars: int = 4000, boundary_modulus: int = 3):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.boundary_modulus = boundary_modulus
+        self._pending = ""
+        self._paragraphs: List[str] = []
+        self._size = 0
+
+    def feed(self, text: str) -> Iterator[str]:
+        """Add text and yield every chunk that is now complete"""
+        self._pending += text.replace("\r\n", "\n").replace("\r", "\n")
+        parts = _PARAGRAPH_BREAK.split(self._pending)
+        # The last part may still be growing; keep it for the next call
+        self._pending = parts.pop()
+        for paragraph in parts:
+            yield from self._add_paragraph(paragraph)
+        while len(self._pending) > self.max_chars:
+            head, self._pending = _split_long(self._pending, self.max_chars)
+            yield from self._add_paragraph(head)
+
+    def close(self) -> Iterator[str]:
+        """Flush the remaining text"""
+        if self._pending.strip():
+            yield from self._add_paragraph(self._pending)
+        self._pending = ""
+        if self._paragraphs:
+            yield self._emit()
+
+    def _add_paragraph(self, paragraph: str) -> Iterator[str]:
+        paragraph = paragraph.strip()
+        if not paragraph:
+            return
+        while len(paragraph) > self.max_chars:
+            head, paragraph = _split_long(paragraph, self.max_chars)
+            yield from self._add_paragraph(head)
+        if self._size and self._size + len(paragraph) > self.max_chars:
+            yield self._emit()
+        self._paragraphs.append(paragraph)
+        self._size += len(paragraph) + 2
+        if self._size >= self.min_chars and self._is_boundary(paragraph):
+            yield self._emit()
+
+    def _is_boundary(self, paragraph: str) -> bool:
+        digest = hashlib.blake2b(paragraph.encode("utf-8"), digest_size=4).digest()
+        return int.from_bytes(digest, "big") % self.boundary_modulus == 0
+
+    def _emit(self) -> str:
+        chunk = "\n\n".join(self._paragraphs)
+        self._paragraphs = []
+        self._size = 0
+        return chunk
+
+def _split_long(text: str, limit: int) -> Tuple[str, str]:
+    """Split at the last sentence end or whitespace before ``limit``"""
+    window = text[:limit]
+    cut = max(window.rfind(". "), window.rfind("\n"))
+    if cut < limit // 2:
+        cut = window.rfind(" ")
+    if cut < limit // 2:
+        cut = limit - 1
+    return text[:cut + 1], text[cut + 1:]
+
+class DocumentChunk:
+    __slots__ = ("hash", "index", "offset", "length")
+
+    def __init__(self, hash: str, index: int, offset: int, length: int):
+        self.hash = hash
+        self.index = index
+        self.offset = offset
+        self.length = length
+
+    def to_dict(self):
+        return {"hash": self.hash, "index": self.index, "offset": self.offset, "length": self.length}
+
+class DocumentStore:
+    """On-disk document and chunk store with an in-memory term index over chunks"""
+
+    def __init__(self, root=DOCUMENTS_DIR):
+        self.root = Path(root)
+        self.pack_path = self.root / "chunks.pack"
+        self.index_path = self.root / "chunks.idx"
+        self._lock = threading.RLock()
+        # Chunk hash -> (offset, length) in the pack file
+        self._pack_index: Dict[str, Tuple[int, int]] = {}
+        self._pack = None
+        self._documents: Dict[str, dict] = {}
+        self._chunk_cache: Dict[str, str] = {}
+        # Term index: token -> {chunk hash: term frequency}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._chunk_lengths: Dict[str, int] = {}
+        self._chunk_refs: Counter = Counter()
+        self._listeners: List[Callable[[dict, List[str], List[str]], None]] = []
+        self._load()
+
+    # ---- persistence -------------------------------------------------
+    def _load(self):
+        if not self.root.exists():
+            return
+        if self.index_path.exists():
+            pack_size = self.pack_path.stat().st_size if self.pack_path.exists() else 0
+            with open(self.index_path, "r") as index:
+                for line in index:
+                    parts = line.split()
+                    # Ignore a torn last line or entries past the end of the pack
+                    if len(parts) == 3 and int(parts[1]) + int(parts[2]) <= pack_size:
+                        self._pack_index[parts[0]] = (int(parts[1]), int(parts[2]))
+        for meta_path in self.root.glob("*/meta.json"):
+            try:
+                meta = json.loads(meta_path.read_text())
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"WARNING: Skipping unreadable document metadata {meta_path}: {e}")
+                continue
+            self._documents[meta["doc_id"]] = meta
+            for chunk in meta["chunks"]:
+                self._index_chunk(chunk["hash"])
+
+    def _open_pack(self):
+        if self._pack is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._pack = open(self.pack_path, "a+b")
+            self._index_file = open(self.index_path, "a")
+        return self._pack
+
+    def _write_chunk(self, text: str) -> str:
+        """Append a chunk to the pack unless identical content is already stored"""
+        digest = chunk_hash(text)
+        with self._lock:
+            if digest not in self._pack_index:
+                data = text.encode("utf-8")
+                pack = self._open_pack()
+                pack.seek(0, os.SEEK_END)
+                offset = pack.tell()
+                pack.write(data)
+                pack.flush()
+                self._index_file.write(f"{digest} {offset} {len(data)}\n")
+                self._index_file.flush()
+                self._pack_index[digest] = (offset, len(data))
+            self._cache_chunk(digest, text)
+        return digest
+
+    def _cache_chunk(self, digest: str, text: str):
+        if len(self._chunk_cache) > 4096:
+            self._chunk_cache.clear()
+        self._chunk_cache[digest] = text
+
+    def chunk_text(self, digest: str) -> str:
+        text = self._chunk_cache.get(digest)
+        if text is None:
+            offset, length = self._pack_index[digest]
+            with self._lock:
+                pack = self._open_pack()
+                text = os.pread(pack.fileno(), length, offset).decode("utf-8")
+            self._cache_chunk(digest, text)
+        return text
+
+    # ---- ingestion -----------------------------------------------------
+    def begin(self, filename: str, content_type: str = "", doc_id: str = None) -> "DocumentWriter":
+        """Start a streamed upload; feed it blocks and call ``finish()``
+
+        With ``doc_id`` the upload becomes the next version of that document.
+        """
+        previous = None
+        if doc_id is not None:
+            previous = self._documents.get(doc_id)
+            if previous is None:
+                raise KeyError(doc_id)
+        return DocumentWriter(self, filename, content_type, previous)
+
+    def on_publish(self, listener: Callable[[dict, List[str], List[str]], None]):
+        """Call ``listener(meta, added_hashes, removed_hashes)`` after a document version is published or deleted"""
+        self._listeners.append(listener)
+
+    def _notify(self, meta: dict, added: List[str], removed: List[str]):
+        for listener in self._listeners:
+            try:
+                listener(meta, added, removed)
+            except Exception as e:
+                print(f"WARNING: Document publish listener failed: {e}")
+
+    def _publish(self, meta: dict) -> Dict[str, int]:
+        doc_dir = self.root / meta["doc_id"]
+        tmp = doc_dir / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta, indent=2))
+        os.replace(tmp, doc_dir / "meta.json")
+        with self._lock:
+            previous = self._documents.get(meta["doc_id"])
+            self._documents[meta["doc_id"]] = meta
+            # Index the new version before releasing the old one so unchanged
+            # chunks keep their postings instead of being tokenized again
+            indexed = sum(self._index_chunk(chunk["hash"]) for chunk in meta["chunks"])
+            if previous:
+                for chunk in previous["chunks"]:
+                    self._unindex_chunk(chunk["hash"])
+        self._notify(meta, meta["diff"]["added_hashes"], meta["diff"]["removed_hashes"])
+        return {"indexed_chunks": indexed}
+
+    def _index_chunk(self, digest: str) -> bool:
+        """Reference a chunk from the term index; True when it had to be tokenized"""
+        with self._lock:
+            self._chunk_refs[digest] += 1
+            if self._chunk_refs[digest] > 1:
+                return False
+            try:
+                tokens = tokenize(self.chunk_text(digest))
+            except (OSError, KeyError):
+                tokens = []
+            self._chunk_lengths[digest] = len(tokens)
+            for token, count in Counter(tokens).items():
+                self._postings.setdefault(token, {})[digest] = count
+            return True
+
+    def _unindex_chunk(self, digest: str):
+        with self._lock:
+            self._chunk_refs[digest] -= 1
+            if self._chunk_refs[digest] > 0:
+                return
+            del self._chunk_refs[digest]
+            self._chunk_lengths.pop(digest, None)
+            for token in set(tokenize(self.chunk_text(digest))):
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(digest, None)
+                    if not postings:
+                        del self._postings[token]
+
+    # ---- queries -------------------------------------------------------
+    def get(self, doc_id: str) -> Optional[dict]:
+        return self._documents.get(doc_id)
+
+    def referenced_chunks(self) -> Set[str]:
+        """Hashes of the chunks used by any stored document version"""
+        with self._lock:
+            return set(self._chunk_refs)
+
+    def list(self) -> List[dict]:
+        return [
+            {key: meta.get(key) for key in (
+                "doc_id", "filename", "version", "size", "sha256", "uploaded_at", "chunk_count"
+            )}
+            for meta in sorted(self._documents.values(), key=lambda meta: meta["uploaded_at"])
+        ]
+
+    def delete(self, doc_id: str) -> bool:
+        with self._lock:
+            meta = self._documents.pop(doc_id, None)
+            if meta is None:
+                return False
+            for chunk in meta["chunks"]:
+                self._unindex_chunk(chunk["hash"])
+        shutil.rmtree(self.root / doc_id, ignore_errors=True)
+        # Listeners drop the chunks no other document references (e.g. their vectors)
+        self._notify(meta, [], [chunk["hash"] for chunk in meta["chunks"]])
+        return True
+
+    def chunks(self, doc_id: str) -> List[Tuple[dict, str]]:
+        """(chunk metadata, text) pairs of a document in order"""
+        meta = self._documents.get(doc_id)
+        if meta is None:
+            return []
+        return [(chunk, self.chunk_text(chunk["hash"])) for chunk in meta["chunks"]]
+
+    def search(self, query: str, doc_ids: Optional[Iterable[str]] = None, k: int = 4) -> List[dict]:
+        """Rank chunks of the given documents by TF-IDF overlap with ``query``"""
+        doc_ids = list(doc_ids) if doc_ids else list(self._documents)
+        allowed: Dict[str, Tuple[str, dict]] = {}
+        for doc_id in doc_ids:
+            meta = self._documents.get(doc_id)
+            if meta:
+                for chunk in meta["chunks"]:
+                    allowed.setdefault(chunk["hash"], (doc_id, chunk))
+        if not allowed:
+            return []
+
+        total = max(len(self._chunk_lengths), 1)
+        scores: Dict[str, float] = {}
+        with self._lock:
+            for token in set(tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + total / len(postings))
+                for digest, count in postings.items():
+                    if digest in allowed:
+                        length = self._chunk_lengths.get(digest) or 1
+                        scores[digest] = scores.get(digest, 0.0) + idf * count / math.sqrt(length)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            {
+                "doc_id": allowed[digest][0],
+                "chunk_index": allowed[digest][1]["index"],
+                "hash": digest,
+                "score": round(score, 4),
+                "text": self.chunk_text(digest),
+            }
+            for digest, score in ranked
+        ]
+
+class DocumentWriter:
+    """Streams one upload to disk while hashing and chunking it"""
+
+    def __init__(self, store: DocumentStore, filename: str, content_type: str = "", previous: dict = None):
+        self.store = store
+        self.previous = previous
+        self.filename = Path(filename or "upload.txt").name
+        extension = Path(self.filename).suffix.lower()
+        if extension in PDF_EXTENSIONS or content_type == "application/pdf":
+            self.kind = "pdf"
+        elif extension in TEXT_EXTENSIONS or content_type.startswith("text/"):
+            self.kind = "text"
+        else:
+            raise DocumentError(f"Unsupported document type: {self.filename} ({content_type or 'unknown'})")
+        self.content_type = content_type
+        self.doc_id = previous["doc_id"] if previous else uuid.uuid4().hex
+        self.doc_dir = store.root / self.doc_id
+        self.doc_dir.mkdir(parents=True, exist_ok=True)
+        self.source_path = self.doc_dir / f"source.{uuid.uuid4().hex}.upload{extension or '.txt'}"
+        self._final_source = self.doc_dir / f"source{extension or '.txt'}"
+        self._file = open(self.source_path, "wb")
+        self._sha256 = hashlib.sha256()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._chunker = IncrementalChunker()
+        self._chunks: List[DocumentChunk] = []
+        self._offset = 0
+        self.size = 0
+        self._started = time.perf_counter()
+
+    def write(self, block: bytes):
+        """Persist, hash and (for text) chunk the next block of the upload"""
+        self._file.write(block)
+        self._sha256.update(block)
+        self.size += len(block)
+        if self.kind == "text":
+            self._add_chunks(self._chunker.feed(self._decoder.decode(block)))
+
+    def _add_chunks(self, texts: Iterable[str]):
+        for text in texts:
+            digest = self.store._write_chunk(text)
+            self._chunks.append(DocumentChunk(digest, len(self._chunks), self._offset, len(text)))
+            self._offset += len(text)
+
+    def _extract_pdf(self):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise DocumentError("PDF uploads need the optional 'pypdf' package (pip install pypdf)")
+        try:
+            reader = PdfReader(str(self.source_path))
+            for page in reader.pages:
+                self._add_chunks(self._chunker.feed((page.extract_text() or "") + "\n\n"))
+        except DocumentError:
+            raise
+        except Exception as e:
+            raise DocumentError(f"Could not read PDF {self.filename}: {e}") from e
+
+    def finish(self) -> dict:
+        """Close the upload, publish its metadata and return it"""
+        self._file.close()
+        try:
+            if self.kind == "pdf":
+                self._extract_pdf()
+            else:
+                self._add_chunks(self._chunker.feed(self._decoder.decode(b"", final=True)))
+            self._add_chunks(self._chunker.close())
+        except Exception:
+            self.abort()
+            raise
+        if self.previous:
+            for old_source in self.doc_dir.glob("source.*"):
+                if old_source != self.source_path and ".upload" not in old_source.name:
+                    old_source.unlink(missing_ok=True)
+        os.replace(self.source_path, self._final_source)
+
+        previous_hashes = [chunk["hash"] for chunk in self.previous["chunks"]] if self.previous else []
+        new_hashes = [chunk.hash for chunk in self._chunks]
+        previous_set, new_set = set(previous_hashes), set(new_hashes)
+        added = [digest for digest in dict.fromkeys(new_hashes) if digest not in previous_set]
+        removed = [digest for digest in dict.fromkeys(previous_hashes) if digest not in new_set]
+        version = (self.previous.get("version", 1) + 1) if self.previous else 1
+        sha256 = self._sha256.hexdigest()
+        now = time.time()
+        elapsed = max(time.perf_counter() - self._started, 1e-9)
+        meta = {
+            "doc_id": self.doc_id,
+            "filename": self.filename,
+            "content_type": self.content_type,
+            "kind": self.kind,
+            "version": version,
+            "size": self.size,
+            "sha256": sha256,
+            "uploaded_at": now,
+            "chunk_count": len(self._chunks),
+            "chunks": [chunk.to_dict() for chunk in self._chunks],
+            "diff": {
+                "previous_version": self.previous.get("version", 1) if self.previous else None,
+                "added": len(added),
+                "removed": len(removed),
+                "unchanged": len(new_set & previous_set),
+                "added_hashes": added,
+                "removed_hashes": removed,
+            },
+            "versions": (self.previous.get("versions", []) if self.previous else []) + [
+                {"version": version, "sha256": sha256, "size": self.size,
+                 "chunk_count": len(self._chunks), "uploaded_at": now}
+            ],
+            "ingest_seconds": elapsed,
+            "ingest_mb_per_s": self.size / elapsed / 1e6,
+        }
+        meta.update(self.store._publish(meta))
+        return meta
+
+    def abort(self):
+        """Discard a failed upload; a failed new version leaves the previous one intact"""
+        if not self._file.closed:
+            self._file.close()
+        if self.previous:
+            self.source_path.unlink(missing_ok=True)
+        else:
+            shutil.rmtree(self.doc_dir, ignore_errors=True)
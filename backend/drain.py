@@ -0,0 +1,82 @@
+"""
+Graceful drain of HTTP requests at shutdown.
+
+On SIGTERM, uvicorn stops accepting connections, waits for the open ones and
+then runs the shutdown half of the lifespan. ``DrainMiddleware`` counts the
+requests still running. Once ``Drain.begin`` is called, it answers new ones
+with 503 and ``Retry-After``, so a load balancer sends them to another
+instance. Paths in ``exempt`` are neither counted nor refused. ``Drain.wait``
+returns when the last running request is done, or after a timeout.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterable
+
+class Drain:
+    """In-flight request count and the draining flag"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._started = None
+
+    def enter(self):
+        self.in_flight += 1
+        self._idle.clear()
+
+    def leave(self):
+        self.in_flight -= 1
+        if not self.in_flight:
+            self._idle.set()
+
+    def begin(self):
+        """Refuse new requests from now on"""
+        if not self.draining:
+            self.draining = True
+            self._started = time.perf_counter()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for the running requests to finish; False when ``timeout`` seconds pass first"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "draining": self.draining,
+            "in_flight": self.in_flight,
+            "draining_for_s": round(time.perf_counter() - self._started, 3) if self.draining else None,
+        }
+
+class DrainMiddleware:
+    """Count running requests in ``drain``; while draining, refuse new ones with 503"""
+
+    def __init__(self, app, drain: Drain, exempt: Iterable[str] = ("/health",)):
+        self.app = app
+        self.drain = drain
+        self.exempt = tuple(exempt)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            # Exempt paths are not counted either: a health probe must not hold up the drain
+            await self.app(scope, receive, send)
+            return
+        if self.drain.draining:
+            body = json.dumps({"detail": "Server is shutting down; retry shortly"}).encode()
+            await send({"type": "http.response.start", "status": 503, "headers": [
+                (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                (b"retry-after", b"5"), (b"connection", b"close"),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        self.drain.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.drain.leave()
@@ -0,0 +1,92 @@
+"""
+Offline chat model with simulated latency, for benchmarks and tests.
+
+``FakeLLM`` streams a canned reply word by word after a first-token delay drawn
+from a log-normal distribution. With ``tail_probability`` it instead waits
+``tail_seconds`` first, which models the occasional very slow completion.
+With ``fail_probability`` a call raises ``FakeLLMError`` instead, to simulate an
+outage.
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import Iterator, AsyncIterator
+
+DEFAULT_REPLY = (
+    "Under ISO 27001:2022 this is addressed by the Annex A controls of the relevant group; "
+    "document the policy, assign an owner, and keep evidence of operation for the audit."
+)
+
+class FakeLLMError(ConnectionError):
+    """Simulated provider failure"""
+
+class FakeLLM:
+    """Drop-in for the chat model used by the auditor, without network calls"""
+
+    def __init__(self, name: str = "fake", reply: str = DEFAULT_REPLY, first_token_seconds: float = 0.5,
+                 jitter: float = 0.3, tail_probability: float = 0.0, tail_seconds: float = 10.0,
+                 tokens_per_second: float = 200.0, fail_probability: float = 0.0, seed: int = None):
+        self.model_name = name
+        self.reply = reply
+        self.first_token_seconds = first_token_seconds
+        self.jitter = jitter
+        self.tail_probability = tail_probability
+        self.tail_seconds = tail_seconds
+        self.tokens_per_second = tokens_per_second
+        self.fail_probability = fail_probability
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delays(self):
+        with self._lock:
+            self.calls += 1
+            if self.fail_probability and self._random.random() < self.fail_probability:
+                raise FakeLLMError(f"{self.model_name} is unavailable (simulated)")
+            if self._random.random() < self.tail_probability:
+                first = self.tail_seconds
+            else:
+                first = self.first_token_seconds * math.exp(self.jitter * self._random.gauss(0, 1))
+        return first, 1.0 / self.tokens_per_second
+
+    def _chunks(self):
+        from langchain_core.messages import AIMessageChunk
+        words = self.reply.split(" ")
+        for i, word in enumerate(words):
+            yield AIMessageChunk(content=word if i == len(words) - 1 else word + " ")
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def stream(self, messages, **kwargs) -> Iterator:
+        first, per_token = self._delays()
+        time.sleep(first)
+        for i, chunk in enumerate(self._chunks()):
+            if i:
+                time.sleep(per_token)
+            yield chunk
+
+    async def astream(self, messages, **kwargs) -> AsyncIterator:
+        first, per_token = self._delays()
+        await asyncio.sleep(first)
+        for i, chunk in enumerate(self._chunks()):
+            if i:
+                await asyncio.sleep(per_token)
+            yield chunk
+
+    def invoke(self, messages, **kwargs):
+        from langchain_core.messages import message_chunk_to_message
+        message = None
+        for chunk in self.stream(messages, **kwargs):
+            message = chunk if message is None else message + chunk
+        return message_chunk_to_message(message)
+
+    async def ainvoke(self, messages, **kwargs):
+        from langchain_core.messages import message_chunk_to_message
+        message = None
+        async for chunk in self.astream(messages, **kwargs):
+            message = chunk if message is None else message + chunk
+        return message_chunk_to_message(message)
@@ -0,0 +1,312 @@
+"""
+Map-reduce gap analysis of an uploaded document against the control catalogue.
+
+Map: one LLM evaluation per (document chunk, control) pair, run with bounded
+concurrency and a shared back-off when the provider rate-limits. Findings are
+cached by (chunk hash, control ID, knowledge version), so re-running an
+unchanged document costs no LLM calls.
+
+Reduce: the findings of each control are folded into a coverage verdict as soon
+as all of its pairs are done, and streamed to the client as NDJSON events.
+
+After a document is revised only its new chunks miss the cache, so re-analysis
+cost follows the size of the edit. Every event reports how many findings were
+reused from the cache and how many were recomputed.
+
+With a usage ledger, a run is refused up front when its tenant is at the hard
+quota, and every evaluation's tokens are recorded against the tenant.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from llm_backends import is_rate_limit_error
+from metrics import estimate_tokens, metrics, token_usage
+from usage import DEFAULT_TENANT, cost
+
+GAP_CACHE_FILE = Path(os.getenv(
+    "GAP_CACHE_FILE", Path(__file__).resolve().parent / "storage" / "gap_cache.jsonl"
+))
+
+# Verdicts ordered from weakest to strongest evidence
+STATUS_RANK = {"error": -1, "not_addressed": 0, "partial": 1, "covered": 2}
+# Control verdicts: "incomplete" when no evidence was found but some evaluations failed
+CONTROL_STATUSES = ("error", "incomplete", "not_addressed", "partial", "covered")
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+EVALUATION_PROMPT = """You are an ISO 27001:2022 internal auditor reviewing an organisation's documentation.
+Decide whether the document excerpt provides evidence that the control below is implemented.
+
+Control {control_id} ({group}): {title}
+
+Answer with a single JSON object and nothing else:
+{{"status": "covered" | "partial" | "not_addressed", "evidence": "<short quote from the excerpt or empty>", "rationale": "<one sentence>"}}"""
+
+class GapCache:
+    """Findings keyed by (chunk hash, control ID, knowledge version), persisted as JSON lines"""
+
+    def __init__(self, path=GAP_CACHE_FILE):
+        self.path = Path(path)
+        self._entries: Dict[Tuple[str, str, str], dict] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line
+                    self._entries[(record["chunk"], record["control"], record["version"])] = record["finding"]
+
+    def get(self, chunk: str, control: str, version: str) -> Optional[dict]:
+        return self._entries.get((chunk, control, version))
+
+    def put(self, chunk: str, control: str, version: str, finding: dict):
+        with self._lock:
+            self._entries[(chunk, control, version)] = finding
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps(
+                {"chunk": chunk, "control": control, "version": version, "finding": finding}
+            ) + "\n")
+            self._file.flush()
+
+    def prune(self, keep_version: str):
+        """Drop findings made against other knowledge versions and compact the file"""
+        with self._lock:
+            self._entries = {key: value for key, value in self._entries.items() if key[2] == keep_version}
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.path.exists():
+                tmp = self.path.with_suffix(".tmp")
+                with open(tmp, "w") as f:
+                    for (chunk, control, version), finding in self._entries.items():
+                        f.write(json.dumps(
+                            {"chunk": chunk, "control": control, "version": version, "finding": finding}
+                        ) + "\n")
+                os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self._entries)
+
+def parse_finding(content: str) -> dict:
+    """Extract the JSON verdict from a model reply"""
+    match = _JSON_OBJECT.search(content or "")
+    try:
+        data = json.loads(match.group(0)) if match else {}
+    except json.JSONDecodeError:
+        data = {}
+    status = str(data.get("status", "")).strip().lower().replace(" ", "_")
+    if status not in STATUS_RANK or status == "error":
+        return {"status": "error", "evidence": "", "rationale": f"Unparseable evaluation: {content[:200]!r}"}
+    return {
+        "status": status,
+        "evidence": str(data.get("evidence") or "")[:500],
+        "rationale": str(data.get("rationale") or "")[:500],
+    }
+
+class GapAnalyzer:
+    """Fans out (chunk, control) evaluations and reduces them per control"""
+
+    def __init__(self, llm_provider: Callable[[], Any], knowledge, documents, cache: GapCache,
+                 concurrency: int = None, max_retries: int = 5, scheduler=None, ledger=None):
+        self.llm_provider = llm_provider
+        # Optional scheduler.Scheduler; each LLM call then takes a batch slot
+        self.scheduler = scheduler
+        # Optional usage.UsageLedger; a run is refused at the hard quota and every evaluation is recorded
+        self.ledger = ledger
+        self.knowledge = knowledge
+        self.documents = documents
+        self.cache = cache
+        self.concurrency = concurrency or int(os.getenv("GAP_ANALYSIS_CONCURRENCY", "8"))
+        self.max_retries = max_retries
+        # Shared across all evaluations: nobody calls the provider before this time
+        self._paused_until = 0.0
+
+    def _slot(self, tenant: str):
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        return self.scheduler.slot("batch", tenant)
+
+    def _record_usage(self, doc_id: str, tenant: str, messages, response, latency: float, stats: Dict[str, int]):
+        """Fold one evaluation's tokens into the run's stats and the usage ledger"""
+        usage = token_usage(response)
+        if not usage["prompt_tokens"]:
+            # Backends that report no usage are accounted by estimate
+            usage = {"prompt_tokens": sum(estimate_tokens(str(msg.content)) for msg in messages),
+                     "completion_tokens": estimate_tokens(str(response.content)), "cached_tokens": 0}
+        stats["prompt_tokens"] += usage["prompt_tokens"]
+        stats["completion_tokens"] += usage["completion_tokens"]
+        if self.ledger is not None:
+            model = (getattr(response, "response_metadata", None) or {}).get("model_name", "")
+            self.ledger.record(f"gap:{doc_id}", tenant, {
+                **usage, "turns": 0, "llm_calls": 1, "llm_ms": latency * 1000, "cost_usd": cost(usage, model),
+            })
+
+    async def _evaluate(self, semaphore, chunk_text: str, control, stats: Dict[str, int], doc_id: str,
+                        tenant: str) -> dict:
+        from langchain_core.messages import HumanMessage, SystemMessage
+        messages = [
+            SystemMessage(content=EVALUATION_PROMPT.format(
+                control_id=control.id, title=control.title, group=control.group
+            )),
+            HumanMessage(content=f"Document excerpt:\n\n{chunk_text}"),
+        ]
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                delay = self._paused_until - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    stats["llm_calls"] += 1
+                    metrics.incr("gap_analysis.llm_calls")
+                    async with self._slot(f"gap:{doc_id}"):
+                        started = time.perf_counter()
+                        response = await self.llm_provider().ainvoke(messages)
+                    self._record_usage(doc_id, tenant, messages, response, time.perf_counter() - started, stats)
+                    return parse_finding(response.content)
+                except Exception as e:
+                    rate_limited, retry_after = is_rate_limit_error(e)
+                    if not rate_limited or attempt == self.max_retries:
+                        return {"status": "error", "evidence": "", "rationale": str(e)[:500]}
+                    stats["rate_limited"] += 1
+                    metrics.incr("gap_analysis.rate_limited")
+                    backoff = retry_after or min(60.0, 2 ** attempt) * (1 + random.random())
+                    self._paused_until = max(self._paused_until, time.monotonic() + backoff)
+
+    async def run(self, doc_id: str, control_ids: Iterable[str] = (), groups: Iterable[str] = (),
+                  tenant: str = DEFAULT_TENANT) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a start event, one event per control as it completes, then a summary
+
+        Raises KeyError for unknown control IDs and ``QuotaExceeded`` when
+        ``tenant`` is at its hard quota, both before the start event.
+        """
+        started = time.perf_counter()
+        kb = self.knowledge.current()
+        chunks = self.documents.chunks(doc_id)
+        wanted_ids, wanted_groups = set(control_ids), set(groups)
+        unknown = wanted_ids - set(kb.by_id)
+        if unknown:
+            raise KeyError(f"Unknown control IDs: {', '.join(sorted(unknown))}")
+        controls = [
+            control for control in kb.controls
+            if (not wanted_ids or control.id in wanted_ids) and (not wanted_groups or control.group in wanted_groups)
+        ]
+
+        if self.ledger is not None:
+            self.ledger.check(f"gap:{doc_id}", tenant)
+
+        stats = {"llm_calls": 0, "cache_hits": 0, "rate_limited": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        meta = self.documents.get(doc_id) or {}
+        diff = meta.get("diff") or {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def evaluate_control(control):
+            findings = []
+            pending = []
+            for chunk, text in chunks:
+                cached = self.cache.get(chunk["hash"], control.id, kb.version)
+                if cached is not None:
+                    stats["cache_hits"] += 1
+                    findings.append((chunk, cached, True))
+                else:
+                    pending.append((chunk, text))
+            results = await asyncio.gather(*(
+                self._evaluate(semaphore, text, control, stats, doc_id, tenant) for _, text in pending
+            ))
+            for (chunk, _), finding in zip(pending, results):
+                if finding["status"] != "error":
+                    self.cache.put(chunk["hash"], control.id, kb.version, finding)
+                findings.append((chunk, finding, False))
+            return reduce_control(control, doc_id, findings)
+
+        yield {
+            "type": "start",
+            "doc_id": doc_id,
+            "document_version": meta.get("version", 1),
+            "knowledge_version": kb.version,
+            "controls": len(controls),
+            "chunks": len(chunks),
+            "pairs": len(controls) * len(chunks),
+            "changed_chunks": {key: diff.get(key, 0) for key in ("added", "removed", "unchanged")},
+        }
+
+        counts = {status: 0 for status in CONTROL_STATUSES}
+        reused = recomputed = errors = 0
+        tasks = [asyncio.ensure_future(evaluate_control(control)) for control in controls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                event = await next_done
+                counts[event["status"]] += 1
+                reused += event["reused"]
+                recomputed += event["evaluated"]
+                errors += event["errors"]
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        elapsed = time.perf_counter() - started
+        metrics.incr("gap_analysis.cache_hits", stats["cache_hits"])
+        metrics.observe("gap_analysis.seconds", elapsed)
+        yield {
+            "type": "summary",
+            "doc_id": doc_id,
+            "status_counts": counts,
+            "coverage": (counts["covered"] + 0.5 * counts["partial"]) / len(controls) if controls else 0.0,
+            # Coverage is a lower bound while some controls could not be fully evaluated
+            "coverage_complete": not (counts["error"] or counts["incomplete"]),
+            "failed_evaluations": errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "findings_reused": reused,
+            "findings_recomputed": recomputed,
+            **stats,
+        }
+
+def reduce_control(control, doc_id: str, findings: List[Tuple[dict, dict, bool]]) -> Dict[str, Any]:
+    """Fold the per-chunk findings of one control into its coverage verdict"""
+    status = "not_addressed"
+    evidence = []
+    for chunk, finding, cached in findings:
+        if STATUS_RANK[finding["status"]] > STATUS_RANK[status]:
+            status = finding["status"]
+        if finding["status"] in ("covered", "partial"):
+            evidence.append({
+                "chunk_index": chunk["index"],
+                "chunk_hash": chunk["hash"],
+                "status": finding["status"],
+                "quote": finding["evidence"],
+                "rationale": finding["rationale"],
+                "reused": cached,
+            })
+    errors = sum(1 for _, finding, _ in findings if finding["status"] == "error")
+    if findings and errors == len(findings):
+        status = "error"
+    elif errors and status == "not_addressed":
+        # The chunks that failed may have covered it; this is not a confirmed gap
+        status = "incomplete"
+    evidence.sort(key=lambda item: (-STATUS_RANK[item["status"]], item["chunk_index"]))
+    return {
+        "type": "control",
+        "doc_id": doc_id,
+        "control_id": control.id,
+        "title": control.title,
+        "group": control.group,
+        "status": status,
+        "evidence": evidence[:3],
+        "errors": errors,
+        "evaluated": sum(1 for _, _, cached in findings if not cached),
+        "reused": sum(1 for _, _, cached in findings if cached),
+    }
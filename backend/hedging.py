@@ -0,0 +1,233 @@
+"""
+Hedged LLM requests for the ISO 27001:2022 Auditor Agent.
+
+``HedgedLLM`` streams from the primary model. If no first token has arrived by
+the hedge deadline, it starts the secondary model in parallel. The first model
+to produce a token wins, and the other request is cancelled. A primary that
+fails before its first token falls back to the secondary straight away.
+
+The deadline is a rolling percentile (``HEDGE_PERCENTILE``) of the primary's
+observed first-token latency, kept in the metrics registry. So hedging adapts
+to how the model is behaving now, and only the slowest requests are
+duplicated.
+"""
+
+import asyncio
+import threading
+import time
+from typing import List, Optional
+
+from metrics import Metrics, metrics as default_metrics
+
+class LatencyTracker:
+    """Rolling first-token latency per model, used to derive hedge deadlines"""
+
+    def __init__(self, registry: Metrics = None, percentile: float = 0.95, min_samples: int = 20,
+                 default_deadline: float = 5.0, min_deadline: float = 0.25, max_deadline: float = 30.0):
+        self.registry = registry or default_metrics
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+
+    @staticmethod
+    def _name(model: str) -> str:
+        return f"llm.first_token_seconds.{model}"
+
+    def record(self, model: str, seconds: float):
+        self.registry.observe(self._name(model), seconds)
+
+    def deadline(self, model: str) -> float:
+        """Seconds to wait for the first token before hedging"""
+        if self.registry.count(self._name(model)) < self.min_samples:
+            return self.default_deadline
+        value = self.registry.percentile(self._name(model), self.percentile)
+        return min(self.max_deadline, max(self.min_deadline, value))
+
+def _model_name(llm, fallback: str) -> str:
+    bound = getattr(llm, "bound", llm)  # RunnableBinding from bind_tools
+    return getattr(bound, "model_name", None) or getattr(bound, "model", None) or fallback
+
+class _Lane:
+    """One model's attempt within a hedged request"""
+
+    def __init__(self, role: str, llm, model: str):
+        self.role = role
+        self.llm = llm
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.message = None
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.task = None
+
+    def add(self, chunk):
+        self.message = chunk if self.message is None else self.message + chunk
+
+    def finish(self):
+        from langchain_core.messages import message_chunk_to_message
+        if self.message is not None:
+            self.result = message_chunk_to_message(self.message)
+        self.done = True
+
+class HedgedLLM:
+    """Chat model wrapper that races a secondary model against a slow primary"""
+
+    def __init__(self, primary, secondary, tracker: LatencyTracker = None,
+                 primary_name: str = None, secondary_name: str = None):
+        self.primary = primary
+        self.secondary = secondary
+        self.tracker = tracker or LatencyTracker()
+        self.primary_name = primary_name or _model_name(primary, "primary")
+        self.secondary_name = secondary_name or _model_name(secondary, "secondary")
+        self.model_name = self.primary_name
+
+    def bind_tools(self, tools, **kwargs) -> "HedgedLLM":
+        return HedgedLLM(
+            self.primary.bind_tools(tools, **kwargs), self.secondary.bind_tools(tools, **kwargs),
+            self.tracker, self.primary_name, self.secondary_name,
+        )
+
+    def _on_first_token(self, lane: _Lane, race: dict) -> bool:
+        """Record the lane's first-token latency; True when it won the race"""
+        lane.first_token = time.perf_counter() - lane.started
+        self.tracker.record(lane.model, lane.first_token)
+        if race["winner"] is None:
+            race["winner"] = lane
+        return race["winner"] is lane
+
+    def _annotate(self, lane: _Lane, lanes: List[_Lane], deadline: float, started: float):
+        hedged = len(lanes) > 1
+        default_metrics.incr("hedge.requests")
+        if hedged:
+            default_metrics.incr("hedge.hedged")
+        if lane.role == "secondary":
+            default_metrics.incr("hedge.secondary_won")
+        lane.result.response_metadata["hedge"] = {
+            "winner": lane.model,
+            "hedged": hedged,
+            "deadline_seconds": round(deadline, 3),
+            "first_token_seconds": round(lane.started - started + lane.first_token, 3),
+        }
+        return lane.result
+
+    @staticmethod
+    def _failure(lanes: List[_Lane]) -> BaseException:
+        for lane in lanes:
+            if lane.error is not None:
+                return lane.error
+        return RuntimeError("Hedged request produced no response")
+
+    # ---- synchronous path: one thread per lane ---------------------------
+    def invoke(self, messages, **kwargs):
+        started = time.perf_counter()
+        deadline = self.tracker.deadline(self.primary_name)
+        race = {"winner": None}
+        condition = threading.Condition()
+        lanes: List[_Lane] = []
+
+        def run(lane: _Lane):
+            try:
+                stream = lane.llm.stream(messages, **kwargs)
+                try:
+                    for chunk in stream:
+                        if lane.first_token is None:
+                            with condition:
+                                won = self._on_first_token(lane, race)
+                                condition.notify_all()
+                            if not won:
+                                return  # cancelled: closing the stream drops the connection
+                        lane.add(chunk)
+                finally:
+                    close = getattr(stream, "close", None)
+                    if close:
+                        close()
+            except Exception as e:
+                lane.error = e
+            finally:
+                with condition:
+                    lane.finish()
+                    condition.notify_all()
+
+        def start(role, llm, model):
+            lane = _Lane(role, llm, model)
+            lanes.append(lane)
+            threading.Thread(target=run, args=(lane,), name=f"hedge-{role}", daemon=True).start()
+
+        start("primary", self.primary, self.primary_name)
+        with condition:
+            condition.wait_for(lambda: race["winner"] is not None or lanes[0].done, timeout=deadline)
+            slow_or_failed = race["winner"] is None
+        if slow_or_failed:
+            start("secondary", self.secondary, self.secondary_name)
+        with condition:
+            condition.wait_for(lambda: (race["winner"] is not None and race["winner"].done)
+                               or all(lane.done for lane in lanes))
+        winner = race["winner"]
+        if winner is None or winner.result is None or winner.error is not None:
+            raise (winner.error if winner is not None and winner.error else self._failure(lanes))
+        return self._annotate(winner, lanes, deadline, started)
+
+    # ---- asynchronous path: one task per lane ----------------------------
+    async def ainvoke(self, messages, **kwargs):
+        started = time.perf_counter()
+        deadline = self.tracker.deadline(self.primary_name)
+        race = {"winner": None}
+        changed = asyncio.Event()
+        lanes: List[_Lane] = []
+
+        async def run(lane: _Lane):
+            try:
+                async for chunk in lane.llm.astream(messages, **kwargs):
+                    if lane.first_token is None:
+                        won = self._on_first_token(lane, race)
+                        changed.set()
+                        if not won:
+                            return
+                    lane.add(chunk)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                lane.error = e
+            finally:
+                lane.finish()
+                changed.set()
+
+        def start(role, llm, model):
+            lane = _Lane(role, llm, model)
+            lane.task = asyncio.ensure_future(run(lane))
+            lanes.append(lane)
+
+        async def wait_until(predicate, timeout=None):
+            loop_deadline = None if timeout is None else time.perf_counter() + timeout
+            while not predicate():
+                changed.clear()
+                remaining = None if loop_deadline is None else loop_deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return
+
+        start("primary", self.primary, self.primary_name)
+        try:
+            await wait_until(lambda: race["winner"] is not None or lanes[0].done, deadline)
+            if race["winner"] is None:
+                start("secondary", self.secondary, self.secondary_name)
+            await wait_until(lambda: (race["winner"] is not None and race["winner"].done)
+                             or all(lane.done for lane in lanes))
+        finally:
+            for lane in lanes:
+                if lane is not race["winner"] and not lane.done:
+                    lane.task.cancel()
+                    if lane.first_token is None:
+                        # Censored sample: the model was at least this slow
+                        self.tracker.record(lane.model, time.perf_counter() - lane.started)
+        winner = race["winner"]
+        if winner is None or winner.result is None or winner.error is not None:
+            raise (winner.error if winner is not None and winner.error else self._failure(lanes))
+        return self._annotate(winner, lanes, deadline, started)
@@ -0,0 +1,264 @@
+"""
+Full-text search over conversation turns.
+
+Every user and assistant message is one document in a positional inverted
+index: term -> {document: [positions]}. ISO control IDs such as ``A.5.23`` are
+kept as single terms, so ``A.5.23`` matches only that control and not 5.2 or
+A.5.2. A query is a mix of terms and "quoted phrases". All of them must match;
+a phrase must match at consecutive positions. Results are ranked newest first,
+or by BM25 weighted with a recency half-life.
+
+``process_query`` only enqueues the new turns; a background thread indexes
+them. Indexed turns and session deletions are appended to a JSON-lines log,
+which is replayed on startup, so the index outlives a restart.
+"""
+
+import json
+import math
+import os
+import queue
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+HISTORY_INDEX_FILE = Path(os.getenv(
+    "HISTORY_INDEX_FILE", Path(__file__).resolve().parent / "storage" / "history_index.jsonl"
+))
+
+# Control IDs first so their dots are not split off
+_TOKEN = re.compile(r"\ba\.\d{1,2}\.\d{1,2}\b|[a-z0-9]+")
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+class _Turn:
+    __slots__ = ("session_id", "tenant_id", "turn", "role", "content", "timestamp", "length")
+
+    def __init__(self, session_id, tenant_id, turn, role, content, timestamp, length):
+        self.session_id = session_id
+        self.tenant_id = tenant_id
+        self.turn = turn
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+        self.length = length
+
+class HistoryIndex:
+    """Positional inverted index over conversation turns, fed by a background thread"""
+
+    def __init__(self, path=HISTORY_INDEX_FILE, half_life_days: float = 30.0):
+        self.path = Path(path)
+        self.half_life = half_life_days * 86400
+        self._postings: Dict[str, Dict[int, List[int]]] = {}
+        self._turns: Dict[int, _Turn] = {}
+        self._sessions: Dict[str, List[int]] = {}
+        self._total_length = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._file = None
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        records = deletions = 0
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line
+                records += 1
+                if record.get("deleted"):
+                    deletions += 1
+                    self._remove(record["session_id"])
+                else:
+                    self._add(record)
+        if deletions and records > 2 * len(self._turns):
+            # Mostly deleted sessions: rewrite the log with the live turns only
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                for turn in self._turns.values():
+                    f.write(json.dumps(self._record(turn)) + "\n")
+            os.replace(tmp, self.path)
+
+    @staticmethod
+    def _record(turn: _Turn) -> Dict[str, Any]:
+        return {"session_id": turn.session_id, "tenant_id": turn.tenant_id, "turn": turn.turn,
+                "role": turn.role, "content": turn.content, "timestamp": turn.timestamp}
+
+    def _add(self, record: Dict[str, Any]):
+        tokens = tokenize(record["content"])
+        doc = self._next_id
+        self._next_id += 1
+        self._turns[doc] = _Turn(record["session_id"], record.get("tenant_id", ""), record["turn"], record["role"],
+                                 record["content"], record["timestamp"], len(tokens))
+        self._sessions.setdefault(record["session_id"], []).append(doc)
+        self._total_length += len(tokens)
+        for position, term in enumerate(tokens):
+            self._postings.setdefault(term, {}).setdefault(doc, []).append(position)
+
+    def _remove(self, session_id: str):
+        for doc in self._sessions.pop(session_id, ()):
+            turn = self._turns.pop(doc)
+            self._total_length -= turn.length
+            for term in set(tokenize(turn.content)):
+                postings = self._postings[term]
+                del postings[doc]
+                if not postings:
+                    del self._postings[term]
+
+    def _append(self, record: Dict[str, Any]):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def _apply(self, item):
+        with self._lock:
+            if item[0] == "add":
+                self._add(item[1])
+            else:
+                self._remove(item[1])
+        self._append(item[1] if item[0] == "add" else {"session_id": item[1], "deleted": True})
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self._apply(item)
+            except Exception as e:
+                print(f"ERROR: Indexing conversation turn failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        """Start the indexing thread; until then submitted turns wait in the queue"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="history-index", daemon=True)
+            self._thread.start()
+
+    def submit(self, session_id: str, tenant_id: str, turns: Iterable[Dict[str, Any]], first_turn: int):
+        """Queue new conversation turns (history entries) for indexing"""
+        for offset, turn in enumerate(turns):
+            timestamp = turn.get("timestamp")
+            try:
+                epoch = time.mktime(time.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S")) if timestamp else time.time()
+            except ValueError:
+                epoch = time.time()
+            self._queue.put(("add", {"session_id": session_id, "tenant_id": tenant_id, "turn": first_turn + offset,
+                                     "role": turn.get("role", ""), "content": turn.get("content", ""),
+                                     "timestamp": epoch}))
+
+    def remove_session(self, session_id: str):
+        self._queue.put(("delete", session_id))
+
+    def flush(self):
+        """Wait until every queued change is indexed"""
+        self.start()
+        self._queue.join()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def __len__(self):
+        return len(self._turns)
+
+    def _phrase_docs(self, terms: List[str], within: Optional[set] = None) -> Dict[int, int]:
+        """Documents (among ``within``) containing ``terms`` at consecutive positions, with the occurrence count"""
+        postings = [self._postings.get(term) for term in terms]
+        if not all(postings):
+            return {}
+        docs = set.intersection(*(set(p) for p in sorted(postings, key=len)))
+        if within is not None:
+            docs &= within
+        matches = {}
+        for doc in docs:
+            starts = set(postings[0][doc])
+            for offset, posting in enumerate(postings[1:], 1):
+                starts &= {position - offset for position in posting[doc]}
+                if not starts:
+                    break
+            if starts:
+                matches[doc] = len(starts)
+        return matches
+
+    def search(self, query: str, limit: int = 20, sort: str = "recency", tenant_id: Optional[str] = None,
+               session_id: Optional[str] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        """Turns matching every term and phrase of ``query``, newest first or by relevance"""
+        # A quoted phrase is one clause; every bare term is its own clause
+        clauses = []
+        for phrase, word in _QUERY.findall(query):
+            if phrase:
+                terms = tokenize(phrase)
+                if terms:
+                    clauses.append(terms)
+            else:
+                clauses.extend([term] for term in tokenize(word))
+        if not clauses:
+            return {"query": query, "total": 0, "results": []}
+        now = time.time() if now is None else now
+        with self._lock:
+            # Rarest clause first, so the candidate set shrinks quickly
+            matched = None
+            frequencies = []  # (document frequency, {doc: occurrences}) per clause
+            for clause in sorted(clauses, key=lambda c: min(len(self._postings.get(term, ())) for term in c)):
+                if len(clause) == 1:
+                    posting = self._postings.get(clause[0], {})
+                    df = len(posting)
+                    docs = {doc: len(positions) for doc, positions in posting.items()
+                            if matched is None or doc in matched}
+                else:
+                    docs = self._phrase_docs(clause, matched)
+                    df = len(docs)
+                frequencies.append((df, docs))
+                matched = set(docs)
+                if not matched:
+                    break
+            turns = [(doc, self._turns[doc]) for doc in matched or ()]
+            turns = [(doc, turn) for doc, turn in turns
+                     if (not tenant_id or turn.tenant_id == tenant_id)
+                     and (not session_id or turn.session_id == session_id)]
+            total_docs = len(self._turns) or 1
+            average_length = self._total_length / total_docs or 1.0
+            scored = []
+            for doc, turn in turns:
+                score = 0.0
+                for df, docs in frequencies:
+                    tf = docs[doc]
+                    idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                    score += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * turn.length / average_length))
+                score *= 0.5 ** (max(0.0, now - turn.timestamp) / self.half_life)
+                scored.append((score, turn))
+        if sort == "relevance":
+            scored.sort(key=lambda item: (item[0], item[1].timestamp), reverse=True)
+        else:
+            scored.sort(key=lambda item: (item[1].timestamp, item[0]), reverse=True)
+        first_term = clauses[0][0]
+        return {
+            "query": query,
+            "total": len(scored),
+            "results": [
+                {
+                    "session_id": turn.session_id,
+                    "turn": turn.turn,
+                    "role": turn.role,
+                    "timestamp": turn.timestamp,
+                    "score": round(score, 4),
+                    "snippet": _snippet(turn.content, first_term),
+                }
+                for score, turn in scored[:limit]
+            ],
+        }
+
+def _snippet(content: str, term: str, width: int = 160) -> str:
+    at = max(0, content.lower().find(term))
+    start = max(0, at - width // 3)
+    text = content[start:start + width]
+    return ("..." if start else "") + text + ("..." if start + width < len(content) else "")
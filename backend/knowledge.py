@@ -0,0 +1,252 @@
+"""
+Versioned ISO 27001:2022 knowledge base.
+
+The control catalogue lives in ``data/iso_27001_knowledge.json`` (or the file
+named by ``KNOWLEDGE_FILE``). Loading validates it into an immutable
+``KnowledgeBase`` snapshot identified by its ``version`` and content hash.
+Everything derived from the catalogue (rendered prompts, indexes, ...) is
+registered with ``KnowledgeStore.register_derived`` and built into the new
+snapshot before it is published, so ``reload()`` swaps the catalogue and all of
+its dependents in a single reference assignment.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+DEFAULT_KNOWLEDGE_FILE = Path(__file__).resolve().parent / "data" / "iso_27001_knowledge.json"
+
+_CONTROL_ID = re.compile(r"^A\.(\d+)\.(\d+)$")
+
+class KnowledgeError(ValueError):
+    """Raised when a knowledge base file is missing or fails validation"""
+
+class Control(NamedTuple):
+    id: str
+    title: str
+    group: str
+
+def control_sort_key(control_id: str) -> Tuple[int, ...]:
+    """Sort A.5.2 before A.5.10"""
+    return tuple(int(part) for part in control_id[2:].split("."))
+
+def _reject_duplicate_keys(pairs):
+    result = {}
+    for key, value in pairs:
+        if key in result:
+            raise KnowledgeError(f"Duplicate key in knowledge base: {key}")
+        result[key] = value
+    return result
+
+class KnowledgeBase:
+    """Validated, read-only snapshot of the control catalogue"""
+
+    def __init__(self, data: Dict[str, Any], content_hash: str, source: str = ""):
+        self.version = str(data.get("version") or "").strip()
+        if not self.version:
+            raise KnowledgeError("Knowledge base must declare a non-empty 'version'")
+        self.content_hash = content_hash
+        self.source = source
+        self.loaded_at = time.time()
+        self.standard = data.get("standard", "ISO/IEC 27001:2022")
+        self.overview = _require_text(data, "overview")
+        self.implementation_steps = tuple(_require_list(data, "implementation_steps"))
+        self.benefits = tuple(_require_list(data, "benefits"))
+
+        # Control groups, keyed by name and by clause prefix ("A.5")
+        self.groups: Dict[str, Dict[str, str]] = {}
+        clause_to_group = {}
+        for name, group in (data.get("control_groups") or {}).items():
+            if not isinstance(group, dict) or not group.get("clause") or not group.get("description"):
+                raise KnowledgeError(f"Control group '{name}' needs a 'clause' and a 'description'")
+            if group["clause"] in clause_to_group:
+                raise KnowledgeError(f"Clause {group['clause']} is assigned to more than one group")
+            clause_to_group[group["clause"]] = name
+            self.groups[name] = {"clause": group["clause"], "description": group["description"]}
+        if not self.groups:
+            raise KnowledgeError("Knowledge base defines no control groups")
+
+        # Controls: well-formed IDs, known group, unique non-placeholder titles
+        raw_controls = data.get("controls") or {}
+        if not raw_controls:
+            raise KnowledgeError("Knowledge base defines no controls")
+        seen_titles: Dict[str, str] = {}
+        controls: List[Control] = []
+        for control_id, title in raw_controls.items():
+            match = _CONTROL_ID.match(control_id)
+            if not match:
+                raise KnowledgeError(f"Malformed control ID: {control_id!r}")
+            clause = f"A.{match.group(1)}"
+            if clause not in clause_to_group:
+                raise KnowledgeError(f"Control {control_id} does not belong to any control group")
+            title = " ".join(str(title).split())
+            if not title:
+                raise KnowledgeError(f"Control {control_id} has an empty title")
+            folded = title.casefold()
+            if folded in seen_titles:
+                raise KnowledgeError(
+                    f"Control {control_id} repeats the title of {seen_titles[folded]}: {title!r}"
+                )
+            seen_titles[folded] = control_id
+            controls.append(Control(sys.intern(control_id), sys.intern(title), clause_to_group[clause]))
+
+        controls.sort(key=lambda control: control_sort_key(control.id))
+        self.controls: Tuple[Control, ...] = tuple(controls)
+        self.by_id: Dict[str, Control] = {control.id: control for control in self.controls}
+        self.by_group: Dict[str, Tuple[Control, ...]] = {
+            name: tuple(control for control in self.controls if control.group == name)
+            for name in self.groups
+        }
+        self._derived: Dict[str, Any] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Catalogue in the shape the prompts have always used"""
+        return {
+            "overview": self.overview,
+            "control_groups": {
+                name: f"{group['description']} ({group['clause']})" for name, group in self.groups.items()
+            },
+            "key_controls": {control.id: control.title for control in self.controls},
+            "implementation_steps": list(self.implementation_steps),
+            "benefits": list(self.benefits),
+        }
+
+    def get(self, name: str) -> Any:
+        """Return a derived artifact that was built for this snapshot"""
+        return self._derived[name]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "content_hash": self.content_hash,
+            "standard": self.standard,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "control_count": len(self.controls),
+            "groups": {name: len(controls) for name, controls in self.by_group.items()},
+        }
+
+def _require_text(data, key):
+    value = data.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise KnowledgeError(f"Knowledge base field '{key}' must be a non-empty string")
+    return value.strip()
+
+def _require_list(data, key):
+    value = data.get(key)
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise KnowledgeError(f"Knowledge base field '{key}' must be a list of strings")
+    return value
+
+def load_knowledge_file(path) -> KnowledgeBase:
+    """Read, hash and validate a knowledge base file"""
+    path = Path(path)
+    try:
+        raw = path.read_bytes()
+    except OSError as e:
+        raise KnowledgeError(f"Cannot read knowledge base {path}: {e}") from e
+    try:
+        data = json.loads(raw, object_pairs_hook=_reject_duplicate_keys)
+    except json.JSONDecodeError as e:
+        raise KnowledgeError(f"Knowledge base {path} is not valid JSON: {e}") from e
+    return KnowledgeBase(data, hashlib.sha256(raw).hexdigest(), str(path))
+
+class KnowledgeStore:
+    """Holds the current KnowledgeBase and swaps it atomically on reload"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv("KNOWLEDGE_FILE") or DEFAULT_KNOWLEDGE_FILE)
+        self._builders: Dict[str, Callable[[KnowledgeBase], Any]] = {}
+        self._listeners: List[Callable[[KnowledgeBase, KnowledgeBase], None]] = []
+        self._reload_lock = threading.Lock()
+        self._current: KnowledgeBase = None
+        self._file_state = None
+        self._watcher = None
+        self.last_error = ""
+        self.reload()
+
+    def current(self) -> KnowledgeBase:
+        return self._current
+
+    def register_derived(self, name: str, builder: Callable[[KnowledgeBase], Any]):
+        """Derive an artifact from every snapshot; it is built before the snapshot is published"""
+        with self._reload_lock:
+            self._builders[name] = builder
+            self._current._derived[name] = builder(self._current)
+
+    def on_swap(self, listener: Callable[[KnowledgeBase, KnowledgeBase], None]):
+        """Call ``listener(old, new)`` after a new version has been published"""
+        self._listeners.append(listener)
+
+    def reload(self, force: bool = False) -> Dict[str, Any]:
+        """Load the file again and publish it if its content changed
+
+        A file that fails validation leaves the current snapshot in place and
+        raises ``KnowledgeError``.
+        """
+        with self._reload_lock:
+            file_state = self._stat()
+            try:
+                candidate = load_knowledge_file(self.path)
+                if not force and self._current and candidate.content_hash == self._current.content_hash:
+                    self._file_state = file_state
+                    self.last_error = ""
+                    return {"reloaded": False, **self._current.summary()}
+                for name, builder in self._builders.items():
+                    candidate._derived[name] = builder(candidate)
+            except Exception as e:
+                self._file_state = file_state
+                self.last_error = str(e)
+                if isinstance(e, KnowledgeError):
+                    raise
+                raise KnowledgeError(f"Building knowledge base artifacts failed: {e}") from e
+            previous, self._current = self._current, candidate
+            self._file_state = file_state
+            self.last_error = ""
+
+        if previous is not None:
+            print(f"INFO: Knowledge base reloaded: {previous.version} -> {candidate.version} "
+                  f"({candidate.content_hash[:12]})")
+            for listener in self._listeners:
+                try:
+                    listener(previous, candidate)
+                except Exception as e:
+                    print(f"WARNING: Knowledge reload listener failed: {e}")
+        return {"reloaded": True, **candidate.summary()}
+
+    def _stat(self):
+        try:
+            stat = self.path.stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def watch(self, interval: float = 5.0):
+        """Poll the file in a daemon thread and reload when it changes"""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                if self._stat() != self._file_state:
+                    try:
+                        self.reload()
+                    except KnowledgeError as e:
+                        print(f"WARNING: Keeping knowledge base {self._current.version}: {e}")
+
+        self._watcher = threading.Thread(target=run, name="knowledge-watch", daemon=True)
+        self._watcher.start()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self._current.summary(),
+            "watching": self._watcher is not None,
+            "last_error": self.last_error,
+        }
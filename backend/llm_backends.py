@@ -0,0 +1,359 @@
+"""
+Pluggable LLM backends with health tracking and priority failover.
+
+``LLM_BACKENDS`` lists backends in priority order (default ``openai``):
+
+- ``openai``: the OpenAI API (``OPENAI_MODEL``, default gpt-4), hedged when
+  ``HEDGE_MODEL`` is set (see hedging.py)
+- ``local``: an OpenAI-compatible server such as vLLM, llama.cpp or Ollama
+  (``LOCAL_LLM_BASE_URL``, ``LOCAL_LLM_MODEL``)
+- ``fake``: the offline FakeLLM
+
+``FailoverLLM`` tries them in order. A backend that fails is taken out of
+rotation by a circuit breaker: it opens after ``LLM_FAILURE_THRESHOLD``
+consecutive failures, or at once on a rate limit, and stays open for a
+cooldown that doubles while the backend keeps failing. An open backend is
+skipped until a single half-open probe succeeds. Answers from a lower-priority
+backend are flagged as degraded.
+
+A backend with ``<NAME>_RPM`` / ``<NAME>_TPM`` set (e.g. ``OPENAI_TPM``) books
+each call against the shared token buckets in rate_limiter.py first. Bursts
+wait their turn there. When the quota is booked more than
+``RATE_LIMIT_MAX_WAIT_SECONDS`` ahead, the call moves on to the next backend.
+
+``LLM_FAKE=1`` swaps every configured backend for a deterministic FakeLLM of the
+same name, and ``LLM_FAKE_DOWN=openai,...`` makes those fakes fail. Together
+they let failover and degraded mode be exercised offline.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import estimate_tokens, metrics, token_usage
+from rate_limiter import RateLimitExceeded, TokenBucketLimiter, limiter_from_env
+
+def is_rate_limit_error(error: Exception) -> Tuple[bool, Optional[float]]:
+    """Whether ``error`` is a provider 429, and the Retry-After it carried"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status != 429 and type(error).__name__ != "RateLimitError":
+        return False, None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        retry_after = None
+    return True, retry_after
+
+class BackendHealth:
+    """Circuit breaker state of one backend"""
+
+    def __init__(self, failure_threshold: int = 2, cooldown: float = 30.0, max_cooldown: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.successes = 0
+        self.failures = 0
+        self.last_error = ""
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.open_until == 0.0:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half_open"
+
+    def acquire(self) -> bool:
+        """Whether a call may go to this backend now (one probe at a time when half-open)"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def release(self):
+        """Give back a half-open probe that ended without a verdict (e.g. cancelled)"""
+        with self._lock:
+            self.probing = False
+
+    def success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            self.cooldown = self.base_cooldown
+            self.probing = False
+
+    def failure(self, error: Exception):
+        rate_limited, retry_after = is_rate_limit_error(error)
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"[:300]
+            was_probing, self.probing = self.probing, False
+            if rate_limited or was_probing or self.consecutive_failures >= self.failure_threshold:
+                cooldown = retry_after or self.cooldown
+                self.open_until = time.monotonic() + cooldown
+                if not retry_after:
+                    self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(max(0.0, self.open_until - time.monotonic()), 1) if self.open_until else 0.0,
+            "successes": self.successes,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+class Backend:
+    """A named chat model built on first use, with its health"""
+
+    def __init__(self, name: str, factory: Callable[[], Any], health: BackendHealth = None,
+                 limiter: Optional[TokenBucketLimiter] = None):
+        self.name = name
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+        self.health = health or BackendHealth()
+        self.limiter = limiter
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+class AllBackendsFailed(RuntimeError):
+    """Raised when no backend could answer; carries the last provider error"""
+
+    def __init__(self, errors: Dict[str, str], last_error: Optional[Exception]):
+        super().__init__("All LLM backends failed: " + "; ".join(f"{name}: {error}" for name, error in errors.items()))
+        self.errors = errors
+        self.last_error = last_error
+        # Let callers that honour provider rate limits (gap analysis) see the 429
+        self.response = getattr(last_error, "response", None)
+        self.status_code = 429 if isinstance(last_error, RateLimitExceeded) else getattr(last_error, "status_code", None)
+
+class FailoverLLM:
+    """Chat model facade that answers from the first healthy backend"""
+
+    def __init__(self, backends: List[Backend], tools: Optional[tuple] = None):
+        self.backends = backends
+        self._tools = tools  # (tools, kwargs) from bind_tools
+        self.model_name = backends[0].name if backends else "none"
+
+    def bind_tools(self, tools, **kwargs) -> "FailoverLLM":
+        return FailoverLLM(self.backends, (tools, kwargs))
+
+    def _client(self, backend: Backend):
+        client = backend.client
+        if self._tools is not None:
+            tools, kwargs = self._tools
+            if not hasattr(client, "bind_tools"):
+                raise TypeError(f"Backend {backend.name} does not support tool calling")
+            client = client.bind_tools(tools, **kwargs)
+        return client
+
+    def _candidates(self):
+        """Backends to try, in priority order; if every circuit is open, the one closest to reopening
+
+        Lazy, so a half-open probe is only taken when the backend is actually tried.
+        """
+        tried = False
+        for backend in self.backends:
+            if backend.health.acquire():
+                tried = True
+                yield backend
+        if not tried:
+            yield min(self.backends, key=lambda backend: backend.health.open_until)
+
+    @staticmethod
+    def _estimate(messages) -> int:
+        """Prompt plus expected completion tokens, for the TPM reservation"""
+        prompt = sum(estimate_tokens(str(getattr(message, "content", message))) for message in messages)
+        return prompt + int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500"))
+
+    def _reserve(self, backend: Backend, tokens: int, errors: Dict[str, str]) -> Optional[float]:
+        """Book the backend's quota; None when it is booked too far ahead to wait"""
+        if backend.limiter is None:
+            return 0.0
+        try:
+            return backend.limiter.reserve(tokens)
+        except RateLimitExceeded as e:
+            backend.health.release()
+            metrics.incr(f"rate_limit.{backend.name}.refused")
+            errors[backend.name] = str(e)
+            return None
+
+    def _succeeded(self, backend: Backend, response, started: float, reserved_tokens: int):
+        backend.health.success()
+        metrics.incr(f"llm.backend.{backend.name}.calls")
+        metrics.observe(f"llm.backend.{backend.name}.latency_ms", (time.perf_counter() - started) * 1000)
+        if backend.limiter is not None:
+            usage = token_usage(response)
+            actual = usage["prompt_tokens"] + usage["completion_tokens"]
+            if actual:
+                backend.limiter.refund(reserved_tokens - actual)
+        degraded = backend is not self.backends[0]
+        if degraded:
+            metrics.incr("llm.degraded_responses")
+        response.response_metadata["backend"] = {"name": backend.name, "degraded": degraded}
+        return response
+
+    def _failed(self, backend: Backend, error: Exception, errors: Dict[str, str]):
+        backend.health.failure(error)
+        rate_limited, retry_after = is_rate_limit_error(error)
+        if rate_limited and backend.limiter is not None:
+            backend.limiter.penalize(retry_after)
+        metrics.incr(f"llm.backend.{backend.name}.failures")
+        errors[backend.name] = f"{type(error).__name__}: {error}"[:200]
+        print(f"WARNING: LLM backend {backend.name} failed, trying the next one: {error}")
+
+    def invoke(self, messages, **kwargs):
+        errors: Dict[str, str] = {}
+        last_error = None
+        tokens = self._estimate(messages)
+        for backend in self._candidates():
+            wait = self._reserve(backend, tokens, errors)
+            if wait is None:
+                last_error = RateLimitExceeded(backend.name, backend.limiter.max_wait)
+                continue
+            if wait:
+                time.sleep(wait)  # queued behind earlier reservations
+            started = time.perf_counter()
+            try:
+                response = self._client(backend).invoke(messages, **kwargs)
+            except Exception as e:
+                last_error = e
+                self._failed(backend, e, errors)
+                continue
+            except BaseException:
+                backend.health.release()
+                raise
+            return self._succeeded(backend, response, started, tokens)
+        raise AllBackendsFailed(errors, last_error)
+
+    async def ainvoke(self, messages, **kwargs):
+        errors: Dict[str, str] = {}
+        last_error = None
+        tokens = self._estimate(messages)
+        for backend in self._candidates():
+            wait = self._reserve(backend, tokens, errors)
+            if wait is None:
+                last_error = RateLimitExceeded(backend.name, backend.limiter.max_wait)
+                continue
+            if wait:
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+            try:
+                response = await self._client(backend).ainvoke(messages, **kwargs)
+            except Exception as e:
+                last_error = e
+                self._failed(backend, e, errors)
+                continue
+            except BaseException:
+                backend.health.release()
+                raise
+            return self._succeeded(backend, response, started, tokens)
+        raise AllBackendsFailed(errors, last_error)
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": backend.name,
+                "priority": i,
+                **backend.health.status(),
+                "quota": backend.limiter.status() if backend.limiter is not None else None,
+            }
+            for i, backend in enumerate(self.backends)
+        ]
+
+# ---- backend factories ----------------------------------------------------
+def _openai():
+    from langchain_openai import ChatOpenAI
+    primary = ChatOpenAI(
+        model=os.getenv("OPENAI_MODEL", "gpt-4"),
+        temperature=0.1,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        stream_usage=True,
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "1")),
+    )
+    # Optional hedging: race HEDGE_MODEL (or HEDGE_BASE_URL) against a slow first token
+    hedge_model = os.getenv("HEDGE_MODEL")
+    if not hedge_model:
+        return primary
+    from hedging import HedgedLLM, LatencyTracker
+    secondary = ChatOpenAI(
+        model=hedge_model,
+        temperature=0.1,
+        api_key=os.getenv("HEDGE_API_KEY") or os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("HEDGE_BASE_URL") or None,
+        stream_usage=True,
+    )
+    return HedgedLLM(primary, secondary, LatencyTracker(
+        percentile=float(os.getenv("HEDGE_PERCENTILE", "0.95")),
+        default_deadline=float(os.getenv("HEDGE_DEFAULT_DEADLINE_SECONDS", "5")),
+        min_deadline=float(os.getenv("HEDGE_MIN_DEADLINE_SECONDS", "0.25")),
+    ))
+
+def _local():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=os.getenv("LOCAL_LLM_MODEL", "llama3.1"),
+        temperature=0.1,
+        base_url=os.getenv("LOCAL_LLM_BASE_URL", "http://localhost:11434/v1"),
+        api_key=os.getenv("LOCAL_LLM_API_KEY", "local"),
+        timeout=float(os.getenv("LOCAL_LLM_TIMEOUT_SECONDS", "120")),
+        max_retries=0,
+    )
+
+def _fake(name: str = "fake", fail: bool = False):
+    from fake_llm import FakeLLM
+    return FakeLLM(
+        name=name,
+        reply=f"[{name}] " + FAKE_REPLY,
+        first_token_seconds=float(os.getenv("LLM_FAKE_LATENCY_SECONDS", "0.05")),
+        jitter=0.0,
+        fail_probability=1.0 if fail else 0.0,
+        seed=0,
+    )
+
+FAKE_REPLY = "Offline answer: see the ISO 27001:2022 Annex A controls relevant to your question."
+
+BACKEND_FACTORIES: Dict[str, Callable[[], Any]] = {"openai": _openai, "local": _local, "fake": _fake}
+
+def build_backends(spec: str = None, fake: bool = None, fake_down: str = None) -> FailoverLLM:
+    """FailoverLLM over ``LLM_BACKENDS``; with ``LLM_FAKE`` every backend is a deterministic fake"""
+    spec = spec if spec is not None else os.getenv("LLM_BACKENDS", "openai")
+    fake = fake if fake is not None else os.getenv("LLM_FAKE", "").lower() in ("1", "true", "yes")
+    down = {name.strip() for name in (fake_down if fake_down is not None else os.getenv("LLM_FAKE_DOWN", "")).split(",")}
+    threshold = int(os.getenv("LLM_FAILURE_THRESHOLD", "2"))
+    cooldown = float(os.getenv("LLM_BACKEND_COOLDOWN_SECONDS", "30"))
+
+    backends = []
+    for name in (part.strip().lower() for part in spec.split(",")):
+        if not name:
+            continue
+        if name not in BACKEND_FACTORIES:
+            raise ValueError(f"Unknown LLM backend {name!r}; choose from {', '.join(BACKEND_FACTORIES)}")
+        if fake or name == "fake":
+            factory = (lambda name=name: _fake(name, fail=name in down))
+        else:
+            factory = BACKEND_FACTORIES[name]
+        backends.append(Backend(name, factory, BackendHealth(threshold, cooldown), limiter_from_env(name)))
+    if not backends:
+        raise ValueError("LLM_BACKENDS must name at least one backend")
+    return FailoverLLM(backends)
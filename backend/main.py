@@ -1,21 +1,84 @@
-from fastapi import FastAPI, HTTPException
+import time
+
+_import_started = time.perf_counter()
+
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import Annotated, List, Literal, Dict, Any, Optional
+from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
-from langchain.memory import ConversationBufferWindowMemory
+import asyncio
 import json
+import threading
 import uuid
 from datetime import datetime
+from pathlib import Path
+
+from documents import DocumentError, DocumentStore
+from drain import Drain, DrainMiddleware
+from analytics import QueryAnalytics
+from gap_analysis import GapAnalyzer, GapCache
+from history_search import HistoryIndex
+from quick_actions import QuickActions
+from knowledge import KnowledgeError, KnowledgeStore
+from metrics import estimate_tokens, metrics, token_usage
+from prefetch import Prefetcher, follow_ups, state_hash
+from profiler import ProfilerBusy, ProfilerError, StackSampler
+from memory_report import SnapshotTracker, deep_size, process_memory, session_report
+from message_log import MessageLog
+from response_cache import ResponseCache
+from responses import CompressionMiddleware, FastJSONResponse, etag_response
+from scheduler import QueueFull, scheduler_from_env
+from sessions import SORT_FIELDS, SessionStore
+from snapshot import SNAPSHOT_FILE, SnapshotError, decode_sessions, encode_session, open_snapshot, write_snapshot
+from usage import DEFAULT_TENANT, QuotaExceeded, cost as llm_cost, ledger_from_env
+from startup import (STARTUP_TIMINGS, LazyResource, lazy_resource, register_resource, resource_status,
+                     start_warm_up)
+
+# LangGraph, LangChain and the OpenAI client are imported lazily (see startup.py)
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="ISO 27001:2022 Auditor Agent", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Restore the session snapshot, warm up heavy dependencies and watch the knowledge base file before serving
+
+    On shutdown, drain running requests, flush the history index and write a new snapshot.
+    """
+    if snapshot_enabled():
+        await run_in_threadpool(restore_snapshot)
+    start_warm_up()
+    knowledge.watch(float(os.getenv("KNOWLEDGE_WATCH_INTERVAL", "5")))
+    history_index.start()
+    tasks = [asyncio.create_task(_cache_warm_up_loop())] if cache_warm_up_enabled() else []
+    if os.getenv("QUICK_ACTIONS_WARM_UP", "1").lower() not in ("0", "false", "no"):
+        tasks.append(asyncio.create_task(_quick_actions_loop()))
+    if snapshot_enabled() and float(os.getenv("SESSION_SNAPSHOT_INTERVAL_SECONDS", "0")) > 0:
+        tasks.append(asyncio.create_task(_snapshot_loop()))
+    yield
+    drain.begin()
+    for task in tasks + list(_speculations):
+        task.cancel()
+    if not await drain.wait(float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "30"))):
+        print(f"WARNING: Shutting down with {drain.in_flight} requests still running")
+    await run_in_threadpool(history_index.flush)
+    if snapshot_enabled():
+        try:
+            await run_in_threadpool(save_snapshot)
+        except Exception as e:
+            print(f"ERROR: Writing the session snapshot failed: {e}")
+
+app = FastAPI(
+    title="ISO 27001:2022 Auditor Agent",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -24,211 +87,251 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-# Initialize OpenAI model
-llm = ChatOpenAI(
-    model="gpt-4",
-    temperature=0.1,
-    api_key=os.getenv("OPENAI_API_KEY")
+# Compress larger JSON bodies (brotli when installed, otherwise gzip)
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "1024")))
+
+# Counts running requests; at shutdown new ones get 503 until they are done (see drain.py)
+drain = Drain()
+app.add_middleware(DrainMiddleware, drain=drain)
+
+# Initialize the LLM backends on first use (priority failover, see llm_backends.py)
+def _build_llm():
+    from llm_backends import build_backends
+    return build_backends()
+
+get_llm = lazy_resource("llm", _build_llm)
+
+# ISO 27001:2022 knowledge base, loaded from a versioned data file (see knowledge.py)
+knowledge = KnowledgeStore()
+
+# Prompt rendering of the catalogue; rebuilt together with every new knowledge version
+knowledge.register_derived("knowledge_json", lambda kb: json.dumps(kb.as_dict(), indent=2))
+
+# Uploaded policy documents and evidence, chunked and indexed on disk
+documents = DocumentStore()
+
+# Semantic retrieval: embeddings of controls and document chunks (see vector_store.py).
+# numpy and the embedder are loaded on first use to keep worker start-up fast.
+def _build_embedder():
+    from vector_store import get_embedder
+    return get_embedder()
+
+get_embedder = lazy_resource("embedder", _build_embedder)
+
+def _build_chunk_index():
+    from vector_store import ChunkIndex
+    return ChunkIndex(documents, get_embedder())
+
+get_chunk_index = lazy_resource("chunk_index", _build_chunk_index)
+documents.on_publish(lambda meta, added, removed: get_chunk_index().update(added, removed))
+
+def _build_control_index(kb):
+    """Deferred per knowledge version: the controls are embedded on first retrieval"""
+    def build():
+        from vector_store import build_control_index
+        return build_control_index(kb, get_embedder())
+    return LazyResource(f"control_index:{kb.version}", build)
+
+knowledge.register_derived("control_index", _build_control_index)
+
+class _CurrentControlIndex:
+    """The current knowledge version's control index, as warm-up and /startup see it"""
+    name = "control_index"
+
+    @property
+    def loaded(self):
+        return knowledge.current().get("control_index").loaded
+
+    def __call__(self):
+        return knowledge.current().get("control_index")()
+
+register_resource(_CurrentControlIndex())
+
+# Map-reduce gap analysis of documents against the catalogue, cached per knowledge version
+gap_cache = GapCache()
+# Admission control for LLM work: chat ahead of batch jobs, fair across tenants
+scheduler = scheduler_from_env()
+
+# Token and cost rollups per session and tenant, with quotas
+usage_ledger = ledger_from_env()
+
+gap_analyzer = GapAnalyzer(lambda: get_llm(), knowledge, documents, gap_cache, scheduler=scheduler,
+                           ledger=usage_ledger)
+knowledge.on_swap(lambda old, new: gap_cache.prune(new.version))
+
+# Approximate counts of the most asked questions, controls and intents
+query_analytics = QueryAnalytics(
+    width=int(os.getenv("ANALYTICS_SKETCH_WIDTH", "4096")),
+    half_life_hours=float(os.getenv("ANALYTICS_HALF_LIFE_HOURS", "24")),
 )
 
-# ISO 27001:2022 knowledge base
-ISO_27001_KNOWLEDGE = {
-    "overview": """
-    ISO 27001:2022 is an international standard for Information Security Management Systems (ISMS).
-    It provides a framework for establishing, implementing, maintaining, and continually improving
-    information security within an organization.
-    
-    Key changes in the 2022 version:
-    - Reduced from 114 controls to 93 controls
-    - Reorganized into 4 control groups instead of 14
-    - New controls for cloud security, threat intelligence, and data leakage prevention
-    """,
-    
-    "control_groups": {
-        "people": "Controls related to human resources, awareness, and training",
-        "organizational": "Controls for policies, procedures, and organizational structure",
-        "technological": "Technical controls for systems and infrastructure",
-        "physical": "Physical security controls for facilities and equipment"
-    },
-    
-    "key_controls": {
-        "A.5.1": "Information security policies",
-        "A.5.2": "Information security roles and responsibilities",
-        "A.5.3": "Segregation of duties",
-        "A.5.4": "Management responsibilities",
-        "A.5.5": "Contact with authorities",
-        "A.5.6": "Contact with special interest groups",
-        "A.5.7": "Threat intelligence",
-        "A.5.8": "Information security risk assessment",
-        "A.5.9": "Information security risk treatment",
-        "A.6.1": "Internal organization",
-        "A.6.2": "Mobile device policy",
-        "A.6.3": "Information security event reporting",
-        "A.6.4": "Information security events assessment",
-        "A.6.5": "Incident response",
-        "A.6.6": "Learning from information security incidents",
-        "A.6.7": "Evidence collection",
-        "A.6.8": "Business continuity",
-        "A.6.9": "Business continuity planning and testing",
-        "A.7.1": "Screening",
-        "A.7.2": "Terms and conditions of employment",
-        "A.7.3": "Information security awareness, education and training",
-        "A.7.4": "Disciplinary process",
-        "A.7.5": "Information security event reporting",
-        "A.7.6": "Information security event assessment",
-        "A.7.7": "Incident response",
-        "A.7.8": "Learning from information security incidents",
-        "A.7.9": "Evidence collection",
-        "A.7.10": "Business continuity",
-        "A.7.11": "Business continuity planning and testing",
-        "A.8.1": "Inventory of information and other associated assets",
-        "A.8.2": "Ownership of assets",
-        "A.8.3": "Acceptable use of assets",
-        "A.8.4": "Return of assets",
-        "A.8.5": "Classification of information",
-        "A.8.6": "Labelling of information",
-        "A.8.7": "Handling of assets",
-        "A.8.8": "Media handling",
-        "A.8.9": "Physical media transfer",
-        "A.8.10": "Disposal of media",
-        "A.8.11": "Business continuity",
-        "A.8.12": "Business continuity planning and testing",
-        "A.8.13": "Information security event reporting",
-        "A.8.14": "Information security event assessment",
-        "A.8.15": "Incident response",
-        "A.8.16": "Learning from information security incidents",
-        "A.8.17": "Evidence collection",
-        "A.8.18": "Business continuity",
-        "A.8.19": "Business continuity planning and testing",
-        "A.8.20": "Information security event reporting",
-        "A.8.21": "Information security event assessment",
-        "A.8.22": "Incident response",
-        "A.8.23": "Learning from information security incidents",
-        "A.8.24": "Evidence collection",
-        "A.8.25": "Business continuity",
-        "A.8.26": "Business continuity planning and testing",
-        "A.8.27": "Information security event reporting",
-        "A.8.28": "Information security event assessment",
-        "A.8.29": "Incident response",
-        "A.8.30": "Learning from information security incidents",
-        "A.8.31": "Evidence collection",
-        "A.8.32": "Business continuity",
-        "A.8.33": "Business continuity planning and testing",
-        "A.8.34": "Information security event reporting",
-        "A.8.35": "Information security event assessment",
-        "A.8.36": "Incident response",
-        "A.8.37": "Learning from information security incidents",
-        "A.8.38": "Evidence collection",
-        "A.8.39": "Business continuity",
-        "A.8.40": "Business continuity planning and testing",
-        "A.8.41": "Information security event reporting",
-        "A.8.42": "Information security event assessment",
-        "A.8.43": "Incident response",
-        "A.8.44": "Learning from information security incidents",
-        "A.8.45": "Evidence collection",
-        "A.8.46": "Business continuity",
-        "A.8.47": "Business continuity planning and testing",
-        "A.8.48": "Information security event reporting",
-        "A.8.49": "Information security event assessment",
-        "A.8.50": "Incident response",
-        "A.8.51": "Learning from information security incidents",
-        "A.8.52": "Evidence collection",
-        "A.8.53": "Business continuity",
-        "A.8.54": "Business continuity planning and testing",
-        "A.8.55": "Information security event reporting",
-        "A.8.56": "Information security event assessment",
-        "A.8.57": "Incident response",
-        "A.8.58": "Learning from information security incidents",
-        "A.8.59": "Evidence collection",
-        "A.8.60": "Business continuity",
-        "A.8.61": "Business continuity planning and testing",
-        "A.8.62": "Information security event reporting",
-        "A.8.63": "Information security event assessment",
-        "A.8.64": "Incident response",
-        "A.8.65": "Learning from information security incidents",
-        "A.8.66": "Evidence collection",
-        "A.8.67": "Business continuity",
-        "A.8.68": "Business continuity planning and testing",
-        "A.8.69": "Information security event reporting",
-        "A.8.70": "Information security event assessment",
-        "A.8.71": "Incident response",
-        "A.8.72": "Learning from information security incidents",
-        "A.8.73": "Evidence collection",
-        "A.8.74": "Business continuity",
-        "A.8.75": "Business continuity planning and testing",
-        "A.8.76": "Information security event reporting",
-        "A.8.77": "Information security event assessment",
-        "A.8.78": "Incident response",
-        "A.8.79": "Learning from information security incidents",
-        "A.8.80": "Evidence collection",
-        "A.8.81": "Business continuity",
-        "A.8.82": "Business continuity planning and testing",
-        "A.8.83": "Information security event reporting",
-        "A.8.84": "Information security event assessment",
-        "A.8.85": "Incident response",
-        "A.8.86": "Learning from information security incidents",
-        "A.8.87": "Evidence collection",
-        "A.8.88": "Business continuity",
-        "A.8.89": "Business continuity planning and testing",
-        "A.8.90": "Information security event reporting",
-        "A.8.91": "Information security event assessment",
-        "A.8.92": "Incident response",
-        "A.8.93": "Learning from information security incidents"
-    },
-    
-    "implementation_steps": [
-        "1. Establish the context of the organization",
-        "2. Define the scope of the ISMS",
-        "3. Conduct risk assessment",
-        "4. Select and implement controls",
-        "5. Monitor and review performance",
-        "6. Continual improvement"
-    ],
-    
-    "benefits": [
-        "Enhanced security posture",
-        "Regulatory compliance",
-        "Customer trust and confidence",
-        "Risk reduction",
-        "Business continuity",
-        "Competitive advantage"
-    ]
-}
+# Answers to context-free first questions, filled by queries and the off-peak warm-up
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400")),
+)
+knowledge.on_swap(lambda old, new: response_cache.clear())
 
-# In-memory storage for conversation sessions
+# Canonical sidebar prompts, answered ahead of time for each knowledge version
+quick_actions = QuickActions()
+
+# Speculative answers to likely follow-ups, computed while the user reads (PREFETCH=1)
+prefetcher = Prefetcher(budget_tokens_per_hour=int(os.getenv("PREFETCH_BUDGET_TOKENS_PER_HOUR", "200000")))
+_speculations = set()  # running tasks, referenced so they are not garbage collected
+
+# tracemalloc snapshots taken through /debug/memory/snapshots
+memory_snapshots = SnapshotTracker()
+
+# In-memory storage for conversation sessions, indexed for paginated listing
 # In production, you'd want to use a database
-conversation_sessions = {}
+conversation_sessions = SessionStore()
+
+# Full-text index over conversation turns, updated by a background thread
+history_index = HistoryIndex(half_life_days=float(os.getenv("SEARCH_RECENCY_HALF_LIFE_DAYS", "30")))
+
+# Bumped on every session change; used with the boot ID as the ETag of /sessions
+_sessions_revision = 0
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+def _touch_sessions():
+    global _sessions_revision
+    _sessions_revision += 1
+
+def _touch_session(session_id):
+    """Mark a session as changed so history ETags are invalidated, and re-index it"""
+    session = conversation_sessions.get(session_id)
+    if session is None:
+        return  # deleted or expired while its turn was running
+    session["revision"] += 1
+    conversation_sessions.touch(
+        session_id, message_count=len(session["log"]), tenant_id=session["tenant_id"]
+    )
+    _touch_sessions()
+
+def _delete_sessions(session_ids):
+    """Drop sessions and everything kept about them: usage, history index, prefetched answers"""
+    for session_id in session_ids:
+        conversation_sessions.delete(session_id)
+        usage_ledger.forget_session(session_id)
+        history_index.remove_session(session_id)
+        prefetcher.discard(session_id)
+    if session_ids:
+        _touch_sessions()
+
+def snapshot_enabled():
+    return os.getenv("SESSION_SNAPSHOT", "1").lower() not in ("0", "false", "no")
+
+# Outcome of the boot-time restore and of the last snapshot written
+snapshot_status: Dict[str, Any] = {"restored": None, "saved": None}
+_snapshot_lock = threading.Lock()
+
+def save_snapshot(path=None) -> Dict[str, Any]:
+    """Write every session, its usage, the response cache and the question analytics to the snapshot file"""
+    with _snapshot_lock:
+        started = time.perf_counter()
+        saved = {"sessions": 0}
+
+        def sessions():
+            for session_id, record, fields in conversation_sessions.dump():
+                saved["sessions"] += 1
+                yield encode_session(session_id, record, fields)
+
+        cache = {"content_hash": knowledge.current().content_hash, "entries": response_cache.export()}
+        analytics_state, sketch = query_analytics.export()
+        saved["bytes"] = write_snapshot(path or SNAPSHOT_FILE, [
+            (b"SESS", sessions()),
+            (b"RCCH", [json.dumps(cache).encode()]),
+            (b"ANLY", [json.dumps(analytics_state).encode()]),
+            (b"SKCH", [sketch]),
+            (b"USGE", [json.dumps(usage_ledger.export_sessions()).encode()]),
+        ])
+        saved["seconds"] = round(time.perf_counter() - started, 3)
+        saved["at"] = datetime.now().isoformat()
+    snapshot_status["saved"] = saved
+    metrics.observe("snapshot.write_ms", saved["seconds"] * 1000)
+    print(f"INFO: Saved {saved['sessions']} sessions ({saved['bytes']} bytes) in {saved['seconds']}s")
+    return saved
+
+def restore_snapshot(path=None) -> Optional[Dict[str, Any]]:
+    """Load the sessions and caches of the last snapshot, then set the file aside as ``*.restored``
+
+    Returns what was restored, or None when there is no usable snapshot; the
+    server then starts with no sessions.
+    """
+    path = Path(path or SNAPSHOT_FILE)
+    started = time.perf_counter()
+    try:
+        with open_snapshot(path) as sections:
+            conversation_sessions.restore(decode_sessions(sections.get("SESS", b"")))
+            cache = json.loads(bytes(sections.get("RCCH", b"")) or b"{}")
+            if cache.get("content_hash") == knowledge.current().content_hash:
+                response_cache.restore(cache["entries"])
+            if "ANLY" in sections and "SKCH" in sections:
+                query_analytics.restore(json.loads(bytes(sections["ANLY"])), bytes(sections["SKCH"]))
+            usage_ledger.restore_sessions(json.loads(bytes(sections.get("USGE", b"")) or b"{}"))
+            size = len(sections.get("SESS", b""))
+    except FileNotFoundError:
+        return None
+    except SnapshotError as e:
+        print(f"WARNING: Not restoring session snapshot: {e}")
+        return None
+    except Exception as e:
+        print(f"ERROR: Restoring session snapshot {path} failed: {e}")
+        return None
+    path.replace(path.with_name(path.name + ".restored"))
+    _touch_sessions()
+    restored = {"sessions": len(conversation_sessions), "cached_answers": len(response_cache),
+                "bytes": size, "seconds": round(time.perf_counter() - started, 3)}
+    snapshot_status["restored"] = restored
+    STARTUP_TIMINGS["snapshot_restore"] = restored["seconds"]
+    print(f"INFO: Restored {restored['sessions']} sessions from {path} in {restored['seconds']}s")
+    return restored
+
+async def _snapshot_loop():
+    """Every SESSION_SNAPSHOT_INTERVAL_SECONDS, write a snapshot so a crash loses at most that much"""
+    interval = float(os.getenv("SESSION_SNAPSHOT_INTERVAL_SECONDS", "0"))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(save_snapshot)
+        except Exception as e:
+            print(f"ERROR: Writing the session snapshot failed: {e}")
+
+def _merge_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    """Reducer so parallel branches can each report their own node timing"""
+    return {**(left or {}), **(right or {})}
 
 # Define the state structure with memory
 class AgentState(BaseModel):
     session_id: str = ""
     current_query: str = ""
     response: str = ""
-    conversation_history: List[Dict[str, str]] = []
-    memory: Any = None
+    # The session's MessageLog; the auditor node appends the finished turn to it
+    log: Any = None
+    document_ids: List[str] = []
+    # Messages of the current turn, including tool calls and their results
+    messages: List[Any] = []
+    tool_rounds: int = 0
+    metrics: Dict[str, Any] = {}
+    # Written by the parallel pre-processing branches, read by the auditor node
+    query_class: Dict[str, Any] = {}
+    history_summary: str = ""
+    retrieved_controls: List[str] = []
+    retrieved_excerpts: List[Dict[str, Any]] = []
+    node_timings: Annotated[Dict[str, float], _merge_timings] = {}
+    started_at: float = 0.0
 
-# Define the ISO 27001 auditor node with memory
-def iso_27001_auditor_node(state: AgentState) -> AgentState:
-    """Node responsible for answering ISO 27001:2022 compliance queries with memory"""
-    
-    query = state.current_query.lower()
-    
-    # Get conversation context from memory
-    conversation_context = ""
-    if state.memory and hasattr(state.memory, 'chat_memory'):
-        # Get recent conversation history
-        recent_messages = state.memory.chat_memory.messages[-10:]  # Last 10 messages
-        if recent_messages:
-            conversation_context = "\n\nRecent conversation context:\n"
-            for msg in recent_messages:
-                if hasattr(msg, 'content'):
-                    role = "User" if isinstance(msg, HumanMessage) else "Assistant"
-                    conversation_context += f"{role}: {msg.content}\n"
-    
-    # Create a comprehensive prompt for the LLM with memory context
-    system_prompt = f"""You are an expert Internal Auditor specializing in ISO 27001:2022 compliance framework. 
+def _build_system_prompt(kb):
+    """Static system prompt for a knowledge version
+
+    It contains nothing that changes between turns, so it is byte-identical for
+    every request and provider-side prompt caching can reuse it. Conversation
+    history follows it as separate messages.
+    """
+    return f"""You are an expert Internal Auditor specializing in ISO 27001:2022 compliance framework. 
     
     You have comprehensive knowledge of:
     - ISO 27001:2022 standard requirements
@@ -237,7 +340,7 @@ def iso_27001_auditor_node(state: AgentState) -> AgentState:
     - Best practices for information security management
     
     Current ISO 27001:2022 Knowledge Base:
-    {json.dumps(ISO_27001_KNOWLEDGE, indent=2)}
+    {kb.get("knowledge_json")}
     
     Your role is to:
     1. Answer questions about ISO 27001:2022 compliance
@@ -247,192 +350,691 @@ def iso_27001_auditor_node(state: AgentState) -> AgentState:
     5. Help with risk assessment and treatment
     6. Remember and refer to previous conversation context when relevant
     
-    IMPORTANT: Use the conversation context below to provide more relevant and contextual responses.
+    IMPORTANT: The earlier messages in this conversation are its context. Use them to provide more relevant and contextual responses.
     If the user refers to previous questions or builds upon earlier discussions, acknowledge that context.
     
-    {conversation_context}
-    
     Always provide accurate, practical, and actionable advice based on the ISO 27001:2022 standard.
     If you're unsure about something, acknowledge the limitation and suggest consulting the official standard.
     
     If the query is not related to ISO 27001:2022 compliance, politely decline to answer and suggest the user to contact the ISO 27001:2022 certification body.
     """
+
+knowledge.register_derived("system_prompt", _build_system_prompt)
+
+def _build_tool_system_prompt(kb):
+    """Static system prompt for tool-calling turns: the catalogue is fetched through tools"""
+    groups = "\n".join(
+        f"    - {name}: {group['description']} ({group['clause']}, {len(kb.by_group[name])} controls)"
+        for name, group in kb.groups.items()
+    )
+    return f"""You are an expert Internal Auditor specializing in ISO 27001:2022 compliance framework. 
+    
+    {kb.overview}
+    
+    Control groups (knowledge base version {kb.version}):
+{groups}
+    
+    Do not rely on memory for control IDs or titles. Use the tools to read the catalogue:
+    - lookup_control(control_id) for a specific control
+    - list_group(name) for every control in a group
+    - search_controls(text) to find the controls relevant to a topic
+    Call only the tools you need, then answer.
     
-    # Create messages for the LLM
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=state.current_query)
+    Your role is to:
+    1. Answer questions about ISO 27001:2022 compliance
+    2. Provide guidance on implementation
+    3. Explain specific controls and their requirements
+    4. Offer best practices and recommendations
+    5. Help with risk assessment and treatment
+    6. Remember and refer to previous conversation context when relevant
+    
+    IMPORTANT: The earlier messages in this conversation are its context. Use them to provide more relevant and contextual responses.
+    If the user refers to previous questions or builds upon earlier discussions, acknowledge that context.
+    
+    Always provide accurate, practical, and actionable advice based on the ISO 27001:2022 standard.
+    If you're unsure about something, acknowledge the limitation and suggest consulting the official standard.
+    
+    If the query is not related to ISO 27001:2022 compliance, politely decline to answer and suggest the user to contact the ISO 27001:2022 certification body.
+    """
+
+knowledge.register_derived("tool_system_prompt", _build_tool_system_prompt)
+
+# Tool implementations for this knowledge version; memoized until the next reload
+def _build_control_tools(kb):
+    from control_tools import ControlTools
+    def search(text, limit):
+        return kb.get("control_index")().search(get_embedder().embed_query(text), k=limit)[0]
+    return ControlTools(kb, search)
+
+knowledge.register_derived("control_tools", _build_control_tools)
+
+def tools_enabled():
+    """Tool calling is on unless AUDITOR_TOOLS=0; the model must support ``bind_tools``"""
+    return os.getenv("AUDITOR_TOOLS", "1").lower() not in ("0", "false", "no")
+
+def record_llm_usage(response, latency_seconds):
+    """Report token usage, including provider-cached prompt tokens, into metrics"""
+    usage = token_usage(response)
+    metrics.incr("llm.calls")
+    metrics.incr("llm.prompt_tokens", usage["prompt_tokens"])
+    metrics.incr("llm.completion_tokens", usage["completion_tokens"])
+    metrics.incr("llm.cached_tokens", usage["cached_tokens"])
+    metrics.observe("llm.latency_ms", latency_seconds * 1000)
+    if usage["prompt_tokens"]:
+        metrics.observe("llm.cached_prompt_ratio", usage["cached_tokens"] / usage["prompt_tokens"])
+    return usage
+
+def retrieve(query, document_ids):
+    """Retrieval step: the controls and uploaded excerpts closest to the query"""
+    started = time.perf_counter()
+    kb = knowledge.current()
+    hits = kb.get("control_index")().search(
+        get_embedder().embed_query(query), k=int(os.getenv("RETRIEVAL_CONTROLS", "5"))
+    )[0]
+    min_score = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.15"))
+    controls = [kb.by_id[control_id] for control_id, score in hits if score >= min_score]
+    excerpts = []
+    if document_ids:
+        k = int(os.getenv("EVIDENCE_CHUNKS", "4"))
+        excerpts = get_chunk_index().search(query, document_ids, k=k) or documents.search(query, document_ids, k=k)
+    metrics.observe("retrieval.latency_ms", (time.perf_counter() - started) * 1000)
+    return controls, excerpts
+
+def _history_messages(state, limit=10):
+    from langchain_core.messages import AIMessage, HumanMessage
+    if state.log is None:
+        return []
+    return [(HumanMessage if role == "user" else AIMessage)(content=text)
+            for role, text in state.log.tail(limit) if role in ("user", "assistant")]
+
+# Pre-processing branches: run in parallel after START, each writes its own fields
+def classify_query_node(state: AgentState) -> Dict[str, Any]:
+    """Classify the query and pick out the controls and groups it names"""
+    from preprocessing import classify_query
+    return {"query_class": classify_query(state.current_query, knowledge.current(), bool(state.document_ids))}
+
+def summarize_history_node(state: AgentState) -> Dict[str, Any]:
+    """Recap the turns that are older than the history window sent to the model"""
+    from preprocessing import summarize_history
+    if state.log is None:
+        return {"history_summary": ""}
+    return {"history_summary": summarize_history(state.log.older(keep_last=10))}
+
+def retrieve_context_node(state: AgentState) -> Dict[str, Any]:
+    """Retrieve the closest controls and document excerpts"""
+    try:
+        controls, excerpts = retrieve(state.current_query, state.document_ids)
+    except Exception as e:
+        print(f"WARNING: Retrieval failed, answering without it: {e}")
+        return {"retrieved_controls": [], "retrieved_excerpts": []}
+    return {"retrieved_controls": [control.id for control in controls], "retrieved_excerpts": excerpts}
+
+PREPROCESSING_NODES = {
+    "classify_query": classify_query_node,
+    "summarize_history": summarize_history_node,
+    "retrieve_context": retrieve_context_node,
+}
+
+def _with_context(state: AgentState) -> str:
+    """Prefix the query with what the pre-processing branches found"""
+    kb = knowledge.current()
+    parts = []
+    if state.history_summary:
+        parts.append(state.history_summary)
+    named = [control_id for control_id in state.query_class.get("control_ids", []) if control_id in kb.by_id]
+    related = [control_id for control_id in state.retrieved_controls if control_id in kb.by_id and control_id not in named]
+    if named:
+        parts.append("Controls named in the question:\n" + "\n".join(
+            f"- {kb.by_id[control_id].id} {kb.by_id[control_id].title} ({kb.by_id[control_id].group})" for control_id in named
+        ))
+    if related:
+        parts.append("Controls most relevant to the question:\n" + "\n".join(
+            f"- {kb.by_id[control_id].id} {kb.by_id[control_id].title} ({kb.by_id[control_id].group})" for control_id in related
+        ))
+    if state.retrieved_excerpts:
+        parts.append("Relevant excerpts from the uploaded evidence:\n\n" + "\n\n".join(
+            f"[{(documents.get(item['doc_id']) or {}).get('filename', item['doc_id'])} #{item['chunk_index']}]\n{item['text']}"
+            for item in state.retrieved_excerpts
+        ))
+    if not parts:
+        return state.current_query
+    return "\n\n".join(parts) + f"\n\nQuestion: {state.current_query}"
+
+def _degraded_answer(state: AgentState) -> str:
+    """Answer from the knowledge base alone when no LLM backend is reachable"""
+    kb = knowledge.current()
+    control_ids = list(dict.fromkeys(state.query_class.get("control_ids", []) + state.retrieved_controls))
+    lines = [
+        "The language model is temporarily unavailable, so this is a limited answer from the "
+        f"ISO 27001:2022 knowledge base (version {kb.version}). Please try again shortly for full guidance."
     ]
+    if control_ids:
+        lines.append("Controls related to your question:")
+        lines.extend(f"- {kb.by_id[control_id].id} {kb.by_id[control_id].title} ({kb.by_id[control_id].group})"
+                     for control_id in control_ids if control_id in kb.by_id)
+    return "\n".join(lines)
+
+def _record_turn(log, query, response):
+    """Append a finished exchange to a session's message log"""
+    log.append("user", query)
+    log.append("assistant", response)
+
+# Define the ISO 27001 auditor node with memory
+def iso_27001_auditor_node(state: AgentState) -> AgentState:
+    """Node responsible for answering ISO 27001:2022 compliance queries with memory
+
+    With tools enabled the model may answer with tool calls instead; the graph
+    then runs ``control_tools_node`` and comes back here with their results.
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from control_tools import TOOL_SCHEMAS
     
     try:
+        kb = knowledge.current()
+        llm = get_llm()
+        use_tools = tools_enabled() and hasattr(llm, "bind_tools")
+        if not state.messages:
+            # Static prefix first, then the recent conversation as real chat turns
+            system_prompt = kb.get("tool_system_prompt" if use_tools else "system_prompt")
+            state.messages = [SystemMessage(content=system_prompt)]
+            state.messages.extend(_history_messages(state, limit=10))  # Last 10 messages
+            state.messages.append(HumanMessage(content=_with_context(state)))
+            rest = sum(estimate_tokens(str(msg.content)) for msg in state.messages[1:])
+            state.metrics = {
+                "tools_enabled": use_tools,
+                "query_class": state.query_class.get("intent", ""),
+                # Wall time from graph start until the auditor node began
+                "pre_llm_ms": round((time.perf_counter() - state.started_at) * 1000, 3) if state.started_at else 0.0,
+                "llm_calls": 0,
+                "tool_calls": [],
+                "tool_ms": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cached_tokens": 0,
+                "llm_ms": 0.0,
+                "cost_usd": 0.0,
+                "prompt_tokens_estimate": 0,
+                "full_catalogue_prompt_tokens_estimate": estimate_tokens(kb.get("system_prompt")) + rest,
+            }
+        
+        # After MAX_TOOL_ROUNDS the model has to answer with what it has
+        out_of_rounds = state.tool_rounds >= int(os.getenv("MAX_TOOL_ROUNDS", "3"))
+        if use_tools:
+            llm = llm.bind_tools(TOOL_SCHEMAS, tool_choice="none" if out_of_rounds else "auto")
+        
         # Get response from LLM
-        response = llm.invoke(messages)
+        started = time.perf_counter()
+        response = llm.invoke(state.messages)
+        latency = time.perf_counter() - started
+        usage = record_llm_usage(response, latency)
+        prompt_estimate = sum(estimate_tokens(str(msg.content)) for msg in state.messages)
+        if not usage["prompt_tokens"]:
+            # Backends that report no usage are accounted by estimate
+            usage = {"prompt_tokens": prompt_estimate, "completion_tokens": estimate_tokens(str(response.content)),
+                     "cached_tokens": 0}
+            state.metrics["usage_estimated"] = True
+        response_metadata = getattr(response, "response_metadata", None) or {}
+        state.metrics["llm_calls"] += 1
+        for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            state.metrics[key] += usage[key]
+        state.metrics["llm_ms"] = round(state.metrics["llm_ms"] + latency * 1000, 3)
+        state.metrics["cost_usd"] += llm_cost(usage, response_metadata.get("model_name") or getattr(llm, "model_name", ""))
+        state.metrics["prompt_tokens_estimate"] += prompt_estimate
+        state.messages.append(response)
+        for key in ("backend", "hedge"):
+            if key in response_metadata:
+                state.metrics[key] = response_metadata[key]
+        if use_tools and not out_of_rounds and getattr(response, "tool_calls", None):
+            return state  # control_tools_node runs next
+        
         state.response = response.content
+        state.metrics["prompt_tokens_saved_estimate"] = (
+            state.metrics["full_catalogue_prompt_tokens_estimate"] - state.metrics["prompt_tokens_estimate"]
+        )
+        metrics.incr("auditor.prompt_tokens_saved_estimate", state.metrics["prompt_tokens_saved_estimate"])
         
-        # Update memory with the new conversation
-        if state.memory:
-            state.memory.chat_memory.add_user_message(state.current_query)
-            state.memory.chat_memory.add_ai_message(state.response)
-            
-            # Update conversation history
-            state.conversation_history.append({
-                "role": "user",
-                "content": state.current_query,
-                "timestamp": datetime.now().isoformat()
-            })
-            state.conversation_history.append({
-                "role": "assistant", 
-                "content": state.response,
-                "timestamp": datetime.now().isoformat()
-            })
+        # Update the session's log with the new exchange
+        if state.log is not None:
+            _record_turn(state.log, state.current_query, state.response)
             
     except Exception as e:
-        state.response = f"I apologize, but I encountered an error while processing your query. Please try again or rephrase your question. Error: {str(e)}"
+        from llm_backends import AllBackendsFailed
+        if isinstance(e, AllBackendsFailed):
+            state.response = _degraded_answer(state)
+            state.metrics["backend"] = {"name": None, "degraded": True}
+        else:
+            state.response = f"I apologize, but I encountered an error while processing your query. Please try again or rephrase your question. Error: {str(e)}"
     
     return state
 
-# Create the state graph
-workflow = StateGraph(AgentState)
+def control_tools_node(state: AgentState) -> AgentState:
+    """Execute the model's tool calls locally against the current knowledge version"""
+    from langchain_core.messages import ToolMessage
+
+    started = time.perf_counter()
+    tools = knowledge.current().get("control_tools")
+    for result in tools.execute(state.messages[-1].tool_calls):
+        state.messages.append(ToolMessage(content=result["content"], tool_call_id=result["id"]))
+        state.metrics["tool_calls"].append(
+            {"name": result["name"], "ms": round(result["ms"], 3), "cached": result["cached"]}
+        )
+        metrics.incr("tools.cache_hits" if result["cached"] else "tools.cache_misses")
+    elapsed = time.perf_counter() - started
+    state.metrics["tool_ms"] = round(state.metrics["tool_ms"] + elapsed * 1000, 3)
+    metrics.observe("tools.round_trip_ms", elapsed * 1000)
+    state.tool_rounds += 1
+    return state
+
+def _route_after_auditor(state: AgentState) -> str:
+    """Go to the tools node while the auditor is asking for lookups instead of answering"""
+    last = state.messages[-1] if state.messages else None
+    if state.response or not state.metrics.get("tools_enabled") or not getattr(last, "tool_calls", None):
+        return "end"
+    return "control_tools"
 
-# Add the single node
-workflow.add_node("iso_27001_auditor", iso_27001_auditor_node)
+def _timed(name, node):
+    """Wrap a node so it reports its wall time into ``node_timings`` (summed over loops)"""
+    def run(state: AgentState):
+        started = time.perf_counter()
+        result = node(state)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        metrics.observe(f"graph.{name}_ms", elapsed_ms)
+        total = round(state.node_timings.get(name, 0.0) + elapsed_ms, 3)
+        if isinstance(result, AgentState):
+            result.node_timings = {**result.node_timings, name: total}
+            return result
+        return {**result, "node_timings": {name: total}}
+    return run
 
-# Set the entry point
-workflow.set_entry_point("iso_27001_auditor")
+def _build_workflow():
+    from langgraph.graph import StateGraph, START, END
 
-# Set the end point
-workflow.add_edge("iso_27001_auditor", END)
+    # Create the state graph
+    workflow = StateGraph(AgentState)
 
-# Compile the graph
-app_state = workflow.compile()
+    # Pre-processing fans out from START and runs in parallel
+    for name, node in PREPROCESSING_NODES.items():
+        workflow.add_node(name, _timed(name, node))
+        workflow.add_edge(START, name)
+
+    # The auditor joins the branches, then answers or asks for control lookups
+    workflow.add_node("iso_27001_auditor", _timed("iso_27001_auditor", iso_27001_auditor_node))
+    workflow.add_node("control_tools", _timed("control_tools", control_tools_node))
+    workflow.add_edge(list(PREPROCESSING_NODES), "iso_27001_auditor")
+
+    # Loop through the tools node until the auditor produces an answer
+    workflow.add_conditional_edges(
+        "iso_27001_auditor", _route_after_auditor, {"control_tools": "control_tools", "end": END}
+    )
+    workflow.add_edge("control_tools", "iso_27001_auditor")
+
+    # Compile the graph
+    return workflow.compile()
+
+get_app_state = lazy_resource("workflow", _build_workflow)
+
+def _new_session():
+    """Create the storage record for a conversation session"""
+    return {
+        "log": MessageLog(),
+        "created_at": datetime.now().isoformat(),
+        "tenant_id": "",
+        "revision": 0
+    }
 
 # API Models
 class QueryRequest(BaseModel):
     query: str
     session_id: str = ""
+    document_ids: List[str] = []
+    # Scripts should send "batch" so they queue behind chat users
+    priority: Literal["interactive", "batch", "warmup"] = "interactive"
+    # Requests are shared fairly across tenants; defaults to the session
+    tenant_id: str = ""
 
 class QueryResponse(BaseModel):
     response: str
     query: str
     session_id: str
     conversation_history: List[Dict[str, str]] = []
+    # Per-request LLM and tool statistics (calls, tool latency, prompt-size savings)
+    metrics: Dict[str, Any] = {}
+    # Likely next questions; with PREFETCH=1 their answers are computed ahead of time
+    follow_ups: List[str] = []
+
+class GapAnalysisRequest(BaseModel):
+    controls: List[str] = []
+    groups: List[str] = []
+    tenant_id: str = ""
 
 class SessionResponse(BaseModel):
     session_id: str
     message: str
 
+def require_admin(x_admin_token: str = Header(default="")):
+    """Allow admin endpoints only when ADMIN_TOKEN is configured and matches X-Admin-Token"""
+    expected = os.getenv("ADMIN_TOKEN", "")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if x_admin_token != expected:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 # API Endpoints
 @app.get("/")
 async def root():
     return {"message": "ISO 27001:2022 Auditor Agent API with Memory"}
 
+def _result_value(result, name, default):
+    """Read a field of the graph result (a dict on newer LangGraph versions, else the state)"""
+    if isinstance(result, dict):
+        return result.get(name, default)
+    return getattr(result, name, default)
+
+def _cacheable_answer(response_text, turn_metrics):
+    """Only real model answers are cached, not apologies or degraded fallbacks"""
+    backend = turn_metrics.get("backend") or {}
+    return bool(response_text and turn_metrics.get("llm_calls") and not backend.get("degraded"))
+
+def _observe_query(query, kb, has_documents):
+    """Classify an incoming query and count it in the traffic analytics"""
+    from preprocessing import classify_query
+    query_class = classify_query(query, kb, has_documents)
+    query_analytics.observe(query, query_class["control_ids"], query_class["intent"])
+    return query_class
+
+def cache_warm_up_enabled():
+    return os.getenv("CACHE_WARM_UP", "1").lower() not in ("0", "false", "no")
+
+def _off_peak(hour):
+    """Whether ``hour`` (local time) falls in CACHE_WARM_UP_HOURS, e.g. "1-6" or "22-5" """
+    start, _, end = os.getenv("CACHE_WARM_UP_HOURS", "1-6").partition("-")
+    start, end = int(start), int(end or start)
+    return start <= hour <= end if start <= end else hour >= start or hour <= end
+
+async def _generate_answer(question):
+    """Answer a context-free question at warm-up priority; None unless it is a real model answer"""
+    state = AgentState(session_id="warm-up", current_query=question, started_at=time.perf_counter())
+    async with scheduler.slot("warmup", "warm-up"):
+        result = await run_in_threadpool(get_app_state().invoke, state)
+    response_text = _result_value(result, "response", "")
+    turn_metrics = _result_value(result, "metrics", {})
+    usage_ledger.record("warm-up", "warm-up", turn_metrics)
+    return response_text if _cacheable_answer(response_text, turn_metrics) else None
+
+async def refresh_quick_actions(force=False):
+    """Generate the quick action answers missing for the current knowledge content (all of them with ``force``)"""
+    kb = knowledge.current()
+    pending = list(quick_actions.actions.values()) if force else quick_actions.missing(kb.content_hash)
+    generated = failed = 0
+    for action in pending:
+        response_text = await _generate_answer(action["prompt"])
+        if knowledge.current() is not kb:
+            break  # the knowledge changed meanwhile; the next pass starts over
+        if response_text is None:
+            failed += 1
+            continue
+        quick_actions.put(action["id"], kb.content_hash, response_text)
+        response_cache.put(kb.version, action["prompt"], response_text, source="quick_action")
+        generated += 1
+    if generated:
+        print(f"INFO: Generated {generated} quick action answers for knowledge version {kb.version}")
+    return {"generated": generated, "failed": failed, "knowledge_version": kb.version}
+
+async def _quick_actions_loop():
+    """Answer the quick actions at startup and after each knowledge change, and refresh them if configured"""
+    check = float(os.getenv("QUICK_ACTIONS_CHECK_SECONDS", "5"))
+    refresh = float(os.getenv("QUICK_ACTIONS_REFRESH_SECONDS", "0"))
+    refreshed_at = time.monotonic()
+    seeded = None
+    while True:
+        delay = check
+        try:
+            kb = knowledge.current()
+            if kb is not seeded:
+                # Stored answers (from an earlier run, or for unchanged content) also go to the emptied response cache
+                for action in quick_actions.actions.values():
+                    answer = quick_actions.answer(action["id"], kb.content_hash)
+                    if answer:
+                        response_cache.put(kb.version, action["prompt"], answer["response"], source="quick_action")
+                seeded = kb
+            force = bool(refresh) and time.monotonic() - refreshed_at >= refresh
+            if force or quick_actions.missing(knowledge.current().content_hash):
+                result = await refresh_quick_actions(force)
+                if force:
+                    refreshed_at = time.monotonic()
+                if result["failed"]:
+                    delay = max(check, 60.0)  # the LLM is failing; do not hammer it
+        except Exception as e:
+            print(f"ERROR: Generating quick action answers failed: {e}")
+            delay = max(check, 60.0)
+        await asyncio.sleep(delay)
+
+def prefetch_enabled():
+    return os.getenv("PREFETCH", "0").lower() in ("1", "true", "yes")
+
+async def _speculate(session_id, questions):
+    """Answer a session's likely follow-ups at warm-up priority against a copy of its message log"""
+    session = conversation_sessions.get(session_id)
+    if session is None:
+        return
+    kb = knowledge.current()
+    log = session["log"].copy()
+    tenant_id = session["tenant_id"]
+    state = state_hash(log.fingerprint, kb.content_hash)
+    for question in prefetcher.plan(session_id, state, questions):
+        if not prefetcher.current(session_id, state):
+            break  # the user asked something already, or the budget ran out
+        try:
+            usage_ledger.check(session_id, tenant_id)
+        except QuotaExceeded:
+            # Speculation is never worth spending the last of a quota on
+            prefetcher.store(session_id, state, question, None, 0)
+            continue
+        speculative_state = AgentState(session_id=session_id, current_query=question, log=log.copy(),
+                                       started_at=time.perf_counter())
+        try:
+            async with scheduler.slot("warmup", tenant_id or session_id):
+                result = await run_in_threadpool(get_app_state().invoke, speculative_state)
+        except Exception as e:
+            print(f"WARNING: Speculative answer for session {session_id} failed: {e}")
+            prefetcher.store(session_id, state, question, None, 0)
+            continue
+        response_text = _result_value(result, "response", "")
+        turn_metrics = _result_value(result, "metrics", {})
+        # Billed to the session whether or not the answer is used; it is not a turn until it is
+        usage_ledger.record(session_id, tenant_id, {**turn_metrics, "turns": 0})
+        usable = _cacheable_answer(response_text, turn_metrics) and knowledge.current() is kb
+        prefetcher.store(session_id, state, question, response_text if usable else None,
+                         turn_metrics.get("prompt_tokens", 0) + turn_metrics.get("completion_tokens", 0))
+
+async def warm_response_cache(top=None, min_count=None):
+    """Answer the most asked recent questions at warm-up priority and cache the answers"""
+    kb = knowledge.current()
+    top = top or int(os.getenv("CACHE_WARM_UP_TOP", "20"))
+    min_count = min_count or int(os.getenv("CACHE_WARM_UP_MIN_COUNT", "3"))
+    warmed = skipped = 0
+    for item in query_analytics.top("question", top):
+        if item["count"] < min_count:
+            break
+        if ResponseCache.key(kb.version, item["sample"]) in response_cache:
+            skipped += 1
+            continue
+        response_text = await _generate_answer(item["sample"])
+        if response_text is not None:
+            response_cache.put(kb.version, item["sample"], response_text, source="warmup")
+            warmed += 1
+    metrics.incr("response_cache.warmed", warmed)
+    return {"warmed": warmed, "already_cached": skipped, "knowledge_version": kb.version}
+
+async def _cache_warm_up_loop():
+    """Every CACHE_WARM_UP_INTERVAL_SECONDS during off-peak hours, pre-generate answers to top questions"""
+    interval = float(os.getenv("CACHE_WARM_UP_INTERVAL_SECONDS", "900"))
+    while True:
+        await asyncio.sleep(interval)
+        if not _off_peak(datetime.now().hour):
+            continue
+        try:
+            result = await warm_response_cache()
+            if result["warmed"]:
+                print(f"INFO: Warmed the response cache with {result['warmed']} answers")
+        except Exception as e:
+            print(f"ERROR: Response cache warm-up failed: {e}")
+
 @app.post("/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     """Process a query about ISO 27001:2022 compliance with memory"""
+    return await _answer_query(request)
+
+async def _answer_query(request: QueryRequest, stored=None):
+    """Answer one turn of a session; ``stored`` ({"response", "source"}) is used instead of calling the LLM"""
     
     try:
         # Generate session ID if not provided
         if not request.session_id:
             request.session_id = str(uuid.uuid4())
         
-        # Get or create conversation memory for this session
+        # Get or create the conversation log for this session
         if request.session_id not in conversation_sessions:
-            # Create new memory for this session
-            memory = ConversationBufferWindowMemory(
-                k=20,  # Remember last 20 exchanges
-                return_messages=True,
-                memory_key="chat_history"
-            )
-            conversation_sessions[request.session_id] = {
-                "memory": memory,
-                "conversation_history": [],
-                "created_at": datetime.now().isoformat()
-            }
-        else:
-            memory = conversation_sessions[request.session_id]["memory"]
-        
-        # Initialize state with memory
-        initial_state = AgentState(
-            session_id=request.session_id,
-            current_query=request.query,
-            response="",
-            conversation_history=conversation_sessions[request.session_id]["conversation_history"],
-            memory=memory
-        )
-        
-        # Execute the workflow
-        result = app_state.invoke(initial_state)
+            conversation_sessions.add(request.session_id, _new_session(), request.tenant_id)
+        session = conversation_sessions[request.session_id]
+        # A session belongs to the tenant of its first query that named one
+        tenant_id = request.tenant_id or session["tenant_id"]
+        session["tenant_id"] = tenant_id
+        log = session["log"]
+        indexed = len(log)
         
-        # Debug: print the result structure
-        print(f"DEBUG: Result type: {type(result)}")
-        print(f"DEBUG: Result content: {result}")
-        if hasattr(result, '__dict__'):
-            print(f"DEBUG: Result attributes: {dir(result)}")
-        
-        # Handle the result properly for newer LangGraph versions
-        if hasattr(result, 'response'):
-            response_text = result.response
-        elif isinstance(result, dict) and 'response' in result:
-            response_text = result['response']
-        elif hasattr(result, '__dict__'):
-            # Try to access as object attributes
-            response_text = getattr(result, 'response', str(result))
+        # Count the question, then try the response cache for a context-free first question
+        kb = knowledge.current()
+        query_class = _observe_query(request.query, kb, bool(request.document_ids))
+        cacheable = not log and not request.document_ids
+        cached = stored
+        if cached is None and cacheable:
+            cached = response_cache.get(kb.version, request.query)
+        if cached is None and not request.document_ids:
+            cached = prefetcher.take(request.session_id, state_hash(log.fingerprint, kb.content_hash), request.query)
         else:
-            # Fallback: try to get response from the result object
-            response_text = str(result)
+            prefetcher.discard(request.session_id)
         
-        print(f"DEBUG: Final response_text: {response_text[:100]}...")
+        if cached is not None:
+            response_text = cached["response"]
+            _record_turn(log, request.query, response_text)
+            turn_metrics = {"llm_calls": 0, "query_class": query_class["intent"], "response_cache": cached["source"]}
+            usage_ledger.record(request.session_id, tenant_id, turn_metrics)
+        else:
+            quota = usage_ledger.check(request.session_id, tenant_id)
+            
+            # Initialize state with the session's log
+            initial_state = AgentState(
+                session_id=request.session_id,
+                current_query=request.query,
+                response="",
+                log=log,
+                document_ids=request.document_ids,
+                started_at=time.perf_counter()
+            )
+            
+            # Wait for a slot of the request's class, then execute the workflow off the event loop
+            async with scheduler.slot(request.priority, tenant_id or request.session_id) as queued:
+                result = await run_in_threadpool(get_app_state().invoke, initial_state)
+            
+            response_text = _result_value(result, "response", "")
+            turn_metrics = _result_value(result, "metrics", {})
+            node_timings = _result_value(result, "node_timings", {})
+            branch_ms = [node_timings[name] for name in PREPROCESSING_NODES if name in node_timings]
+            usage_ledger.record(request.session_id, tenant_id, turn_metrics)
+            if cacheable and _cacheable_answer(response_text, turn_metrics):
+                response_cache.put(kb.version, request.query, response_text)
+            turn_metrics = {
+                **turn_metrics,
+                "quota": quota,
+                "priority": request.priority,
+                "queue_ms": round(queued * 1000, 3),
+                "node_timings_ms": node_timings,
+                "preprocessing_critical_path_ms": max(branch_ms, default=0.0),
+                "preprocessing_sum_ms": round(sum(branch_ms), 3),
+            }
         
-        # For now, just use an empty conversation history to get it working
-        conversation_history = []
+        # New turns are indexed in the background
+        conversation_history = log.to_dicts()
+        history_index.submit(request.session_id, tenant_id, conversation_history[indexed:], indexed)
+        _touch_session(request.session_id)
         
-        # Update session storage with the current conversation
-        conversation_sessions[request.session_id]["conversation_history"] = conversation_history
+        suggestions = [] if request.document_ids else follow_ups(
+            query_class["intent"], query_class["control_ids"], int(os.getenv("PREFETCH_FOLLOW_UPS", "2"))
+        )
+        if suggestions and prefetch_enabled() and request.priority == "interactive":
+            task = asyncio.create_task(_speculate(request.session_id, suggestions))
+            _speculations.add(task)
+            task.add_done_callback(_speculations.discard)
         
         return QueryResponse(
             response=response_text,
             query=request.query,
             session_id=request.session_id,
-            conversation_history=conversation_history
+            conversation_history=conversation_history,
+            metrics=turn_metrics,
+            follow_ups=suggestions
         )
         
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
-        print(f"DEBUG: Exception occurred: {e}")
-        print(f"DEBUG: Exception type: {type(e)}")
+        print(f"ERROR: Processing query failed: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+class QuickActionRequest(BaseModel):
+    session_id: str = ""
+    tenant_id: str = ""
+
+@app.get("/quick-actions")
+async def list_quick_actions():
+    """The sidebar's canonical prompts and whether their answers are ready"""
+    kb = knowledge.current()
+    return {"knowledge_version": kb.version, "actions": quick_actions.listing(kb.content_hash)}
+
+@app.post("/quick-actions/refresh", dependencies=[Depends(require_admin)])
+async def refresh_quick_action_answers():
+    """Regenerate every quick action answer now"""
+    return await refresh_quick_actions(force=True)
+
+@app.post("/quick-actions/{action_id}", response_model=QueryResponse)
+async def run_quick_action(action_id: str, request: QuickActionRequest = QuickActionRequest()):
+    """Answer a quick action in a session from its pre-generated answer (a normal query until it is ready)"""
+    action = quick_actions.actions.get(action_id)
+    if action is None:
+        raise HTTPException(status_code=404, detail="Unknown quick action")
+    answer = quick_actions.answer(action_id, knowledge.current().content_hash)
+    query = QueryRequest(query=action["prompt"], session_id=request.session_id, tenant_id=request.tenant_id)
+    metrics.incr("quick_actions.hits" if answer else "quick_actions.misses")
+    return await _answer_query(query, {"response": answer["response"], "source": "quick_action"} if answer else None)
+
 @app.post("/session/new", response_model=SessionResponse)
 async def create_new_session():
     """Create a new conversation session"""
     session_id = str(uuid.uuid4())
-    memory = ConversationBufferWindowMemory(
-        k=20,
-        return_messages=True,
-        memory_key="chat_history"
-    )
-    conversation_sessions[session_id] = {
-        "memory": memory,
-        "conversation_history": [],
-        "created_at": datetime.now().isoformat()
-    }
+    conversation_sessions.add(session_id, _new_session())
+    _touch_sessions()
     return SessionResponse(
         session_id=session_id,
         message="New session created successfully"
     )
 
 @app.get("/session/{session_id}/history")
-async def get_session_history(session_id: str):
-    """Get conversation history for a specific session"""
+async def get_session_history(session_id: str, request: Request):
+    """Get conversation history for a specific session (304 when unchanged)"""
     if session_id not in conversation_sessions:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    return {
+    session = conversation_sessions[session_id]
+    return etag_response(request, f"{session_id}-{session['revision']}", lambda: {
         "session_id": session_id,
-        "conversation_history": conversation_sessions[session_id]["conversation_history"],
-        "created_at": conversation_sessions[session_id]["created_at"]
-    }
+        "conversation_history": session["log"].to_dicts(),
+        "created_at": session["created_at"]
+    })
 
 @app.delete("/session/{session_id}")
 async def delete_session(session_id: str):
@@ -440,30 +1042,375 @@ async def delete_session(session_id: str):
     if session_id not in conversation_sessions:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    del conversation_sessions[session_id]
+    _delete_sessions([session_id])
     return {"message": "Session deleted successfully"}
 
+def _timestamp(name, value):
+    """Epoch seconds from an ISO 8601 string or a number, for the session filters"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"{name} must be an ISO 8601 time or epoch seconds")
+
 @app.get("/sessions")
-async def list_sessions():
-    """List all active conversation sessions"""
-    sessions = []
-    for session_id, data in conversation_sessions.items():
-        sessions.append({
-            "session_id": session_id,
-            "created_at": data["created_at"],
-            "message_count": len(data["conversation_history"])
-        })
-    return {"sessions": sessions}
+async def list_sessions(request: Request, limit: int = 50, cursor: str = "", sort: str = "last_active",
+                        order: Literal["asc", "desc"] = "desc", tenant_id: str = "",
+                        created_after: Optional[str] = None, created_before: Optional[str] = None,
+                        active_after: Optional[str] = None, active_before: Optional[str] = None,
+                        min_messages: Optional[int] = None):
+    """List conversation sessions a page at a time, filtered and sorted by index (304 when unchanged)
+
+    Pass ``next_cursor`` from a response as ``cursor`` to get the following page.
+    """
+    if sort not in SORT_FIELDS:
+        raise HTTPException(status_code=422, detail=f"sort must be one of {', '.join(SORT_FIELDS)}")
+    filters = {
+        "created_after": _timestamp("created_after", created_after),
+        "created_before": _timestamp("created_before", created_before),
+        "active_after": _timestamp("active_after", active_after),
+        "active_before": _timestamp("active_before", active_before),
+    }
+
+    def build():
+        try:
+            page, next_cursor = conversation_sessions.query(
+                sort, descending=order == "desc", limit=max(1, min(limit, 500)), cursor=cursor or None,
+                tenant_id=tenant_id or None, min_messages=min_messages, **filters
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        sessions = []
+        for session_id in page:
+            data = conversation_sessions[session_id]
+            info = conversation_sessions.info(session_id)
+            sessions.append({
+                "session_id": session_id,
+                "created_at": data["created_at"],
+                "last_active": datetime.fromtimestamp(info["last_active"]).isoformat(),
+                "message_count": info["message_count"],
+                "tenant_id": data["tenant_id"],
+                "usage": usage_ledger.session(session_id)
+            })
+        return {
+            "sessions": sessions,
+            "next_cursor": next_cursor,
+            "total": conversation_sessions.count(tenant_id or None),
+        }
+    return etag_response(request, f"sessions-{_BOOT_ID}-{_sessions_revision}-{hash(request.url.query)}", build)
+
+class SessionExpireRequest(BaseModel):
+    # Delete sessions with no activity for this long, or since before inactive_before
+    idle_seconds: float = 0
+    inactive_before: Optional[str] = None
+    tenant_id: str = ""
+    limit: Optional[int] = None
+
+class SessionDeleteRequest(BaseModel):
+    session_ids: List[str]
+
+@app.post("/sessions/expire", dependencies=[Depends(require_admin)])
+async def expire_sessions(request: SessionExpireRequest):
+    """Delete idle sessions, oldest activity first"""
+    cutoff = _timestamp("inactive_before", request.inactive_before)
+    if cutoff is None:
+        if request.idle_seconds <= 0:
+            raise HTTPException(status_code=422, detail="Set idle_seconds or inactive_before")
+        cutoff = time.time() - request.idle_seconds
+    expired = conversation_sessions.expire(cutoff, tenant_id=request.tenant_id or None, limit=request.limit)
+    # The store has dropped them already; the rest of their state goes the same way as an explicit delete
+    _delete_sessions(expired)
+    return {"expired": len(expired), "remaining": len(conversation_sessions)}
+
+@app.post("/sessions/delete", dependencies=[Depends(require_admin)])
+async def delete_sessions(request: SessionDeleteRequest):
+    """Delete many sessions at once; unknown IDs are reported, not an error"""
+    found = [session_id for session_id in request.session_ids if session_id in conversation_sessions]
+    _delete_sessions(found)
+    return {"deleted": len(found), "not_found": sorted(set(request.session_ids) - set(found))}
+
+@app.post("/sessions/snapshot", dependencies=[Depends(require_admin)])
+async def snapshot_sessions():
+    """Write the session snapshot now (it is also written at shutdown)"""
+    try:
+        return await run_in_threadpool(save_snapshot)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Writing the session snapshot failed: {e}")
+
+UPLOAD_BLOCK_SIZE = 1 << 20
+
+async def _ingest(writer, blocks):
+    """Feed upload blocks to a DocumentWriter off the event loop and publish it"""
+    max_bytes = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+    try:
+        async for block in blocks:
+            if writer.size + len(block) > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Document exceeds {max_bytes // (1024 * 1024)} MB")
+            await run_in_threadpool(writer.write, block)
+        meta = await run_in_threadpool(writer.finish)
+    except DocumentError as e:
+        writer.abort()
+        raise HTTPException(status_code=422, detail=str(e))
+    except BaseException:
+        writer.abort()
+        raise
+    metrics.incr("documents.ingested_bytes", meta["size"])
+    metrics.observe("documents.ingest_mb_per_s", meta["ingest_mb_per_s"])
+    return {key: value for key, value in meta.items() if key != "chunks"}
+
+def _begin_document(filename, content_type, doc_id=None):
+    try:
+        return documents.begin(filename, content_type or "", doc_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    except DocumentError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+async def _upload_blocks(file: UploadFile):
+    while True:
+        block = await file.read(UPLOAD_BLOCK_SIZE)
+        if not block:
+            break
+        yield block
+
+@app.post("/documents")
+async def upload_document(file: UploadFile = File(...)):
+    """Upload a policy document (multipart) and chunk it into the evidence index"""
+    writer = _begin_document(file.filename, file.content_type)
+    return await _ingest(writer, _upload_blocks(file))
+
+@app.put("/documents/stream")
+async def stream_document(request: Request, filename: str):
+    """Upload a document as the raw request body, processed as it arrives"""
+    writer = _begin_document(filename, request.headers.get("content-type", ""))
+    return await _ingest(writer, request.stream())
+
+@app.put("/documents/{doc_id}")
+async def update_document(doc_id: str, file: UploadFile = File(...)):
+    """Upload a new version of a document; only changed chunks are re-indexed"""
+    writer = _begin_document(file.filename, file.content_type, doc_id)
+    return await _ingest(writer, _upload_blocks(file))
+
+@app.put("/documents/{doc_id}/stream")
+async def stream_document_version(doc_id: str, request: Request, filename: str = ""):
+    """Upload a new version of a document as the raw request body"""
+    previous = documents.get(doc_id)
+    writer = _begin_document(filename or (previous or {}).get("filename", ""),
+                             request.headers.get("content-type", ""), doc_id)
+    return await _ingest(writer, request.stream())
+
+@app.get("/documents")
+async def list_documents():
+    """List uploaded documents"""
+    return {"documents": documents.list()}
+
+@app.get("/documents/{doc_id}")
+async def get_document(doc_id: str):
+    """Metadata and chunk hashes of an uploaded document"""
+    meta = documents.get(doc_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return meta
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    """Delete an uploaded document and its chunks from the index"""
+    if not documents.delete(doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"message": "Document deleted successfully"}
+
+@app.post("/documents/{doc_id}/gap-analysis")
+async def gap_analysis(doc_id: str, request: GapAnalysisRequest = GapAnalysisRequest()):
+    """Evaluate a document against the controls and stream per-control coverage as NDJSON"""
+    if documents.get(doc_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    events = gap_analyzer.run(doc_id, request.controls, request.groups, request.tenant_id or DEFAULT_TENANT)
+    try:
+        first = await events.__anext__()
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=str(e.args[0]))
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    async def stream():
+        yield json.dumps(first) + "\n"
+        async for event in events:
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy", 
+    """Health check endpoint (503 while draining for shutdown)"""
+    body = {
+        "status": "draining" if drain.draining else "healthy",
         "service": "ISO 27001:2022 Auditor Agent with Memory",
-        "active_sessions": len(conversation_sessions)
+        "active_sessions": len(conversation_sessions),
+        "knowledge_version": knowledge.current().version,
+        "llm_backends": get_llm().status() if get_llm.loaded and hasattr(get_llm(), "status") else [],
+        "scheduler": scheduler.status(),
+        "drain": drain.status(),
+        "snapshot": snapshot_status
+    }
+    return FastJSONResponse(body, status_code=503) if drain.draining else body
+
+@app.get("/metrics")
+async def get_metrics():
+    """Counters and latency histograms, including LLM token and prompt-cache usage"""
+    if get_llm.loaded and hasattr(get_llm(), "status"):
+        get_llm().status()  # refreshes the rate-limit utilization gauges
+    return metrics.snapshot()
+
+@app.get("/prefetch")
+async def prefetch_status():
+    """Speculative follow-up answers: hit rate, tokens spent, used and wasted, and the hourly budget"""
+    return {"enabled": prefetch_enabled(), **prefetcher.status()}
+
+@app.get("/debug/profile", dependencies=[Depends(require_admin)])
+async def debug_profile(seconds: float = 10, hz: int = 100, mode: Literal["cpu", "wall"] = "cpu",
+                        format: Literal["collapsed", "json"] = "collapsed", include_idle: bool = False):
+    """Sample the stacks of every thread for ``seconds``: collapsed stacks for a flamegraph, or a JSON summary"""
+    seconds = max(0.1, min(seconds, float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "60"))))
+    sampler = StackSampler(hz=hz, mode=mode, include_idle=include_idle)
+    try:
+        sampler.start()
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ProfilerError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+    summary = sampler.summary()
+    metrics.observe("profiler.overhead_pct", summary["overhead"]["wall_pct"])
+    print(f"INFO: Profiled {summary['seconds']}s ({summary['samples']} samples, "
+          f"{summary['overhead']['wall_pct']}% overhead)")
+    if format == "json":
+        return summary
+    return PlainTextResponse(sampler.collapsed(), headers={
+        "Content-Disposition": f'attachment; filename="profile-{int(time.time())}.folded"',
+        "X-Profile-Samples": str(summary["samples"]),
+        "X-Profile-Overhead-Pct": str(summary["overhead"]["wall_pct"]),
+    })
+
+def _component_sizes():
+    """Estimated bytes of the in-process stores other than the session records"""
+    return {name: deep_size(component) for name, component in (
+        ("session_store", conversation_sessions),
+        ("history_index", history_index),
+        ("response_cache", response_cache),
+        ("prefetch", prefetcher),
+        ("quick_actions", quick_actions),
+        ("query_analytics", query_analytics),
+        ("usage_ledger", usage_ledger),
+    )}
+
+@app.get("/debug/memory", dependencies=[Depends(require_admin)])
+async def debug_memory(top: int = 20, largest: int = 10, components: bool = False,
+                       group_by: Literal["lineno", "filename", "traceback"] = "lineno"):
+    """Process RSS, tracemalloc top allocators and the estimated size of every session, largest first"""
+    limit_bytes = int(os.getenv("SESSION_MEMORY_LIMIT_BYTES", "0"))
+    report = await run_in_threadpool(
+        session_report, list(conversation_sessions.items()), max(0, min(largest, 1000)), limit_bytes
+    )
+    metrics.set_gauge("sessions.estimated_bytes", report["total_bytes"])
+    metrics.set_gauge("sessions.over_memory_limit", report["over_limit"])
+    result = {"process": process_memory(), "tracemalloc": memory_snapshots.status(), "sessions": report}
+    if result["tracemalloc"]["tracing"]:
+        result["tracemalloc"]["top"] = await run_in_threadpool(memory_snapshots.top, max(1, top), group_by)
+    if components:
+        result["components"] = await run_in_threadpool(_component_sizes)
+    return result
+
+@app.post("/debug/memory/snapshots", dependencies=[Depends(require_admin)])
+async def take_memory_snapshot(frames: int = 1):
+    """Take a tracemalloc snapshot, starting tracing (with ``frames`` of traceback) if it is off"""
+    return await run_in_threadpool(memory_snapshots.take, max(1, min(frames, 50)))
+
+@app.get("/debug/memory/diff", dependencies=[Depends(require_admin)])
+async def diff_memory_snapshots(base: int, target: Optional[int] = None, top: int = 20,
+                                group_by: Literal["lineno", "filename", "traceback"] = "lineno"):
+    """Allocation sites that grew the most between snapshot ``base`` and ``target`` (default: now)"""
+    try:
+        diff = await run_in_threadpool(memory_snapshots.diff, base, target, max(1, top), group_by)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"base": base, "target": target, "diff": diff}
+
+@app.delete("/debug/memory/snapshots", dependencies=[Depends(require_admin)])
+async def clear_memory_snapshots():
+    """Drop all snapshots and stop tracemalloc"""
+    memory_snapshots.clear()
+    return {"tracing": False}
+
+@app.get("/search")
+async def search_history(q: str, limit: int = 20, sort: Literal["recency", "relevance"] = "recency",
+                         tenant_id: str = "", session_id: str = ""):
+    """Find conversation turns containing every term and "quoted phrase" of ``q`` (control IDs like A.5.23 match exactly)"""
+    result = history_index.search(q, limit=max(1, min(limit, 200)), sort=sort,
+                                  tenant_id=tenant_id or None, session_id=session_id or None)
+    result["pending"] = history_index.pending()
+    return result
+
+@app.get("/analytics/top")
+async def top_queries(k: int = 20):
+    """Most asked questions, controls and intents (approximate counts) and response cache state"""
+    k = max(1, min(k, 200))
+    return {
+        **query_analytics.status(),
+        "questions": query_analytics.top("question", k),
+        "controls": query_analytics.top("control", k),
+        "intents": query_analytics.top("intent", k),
+        "response_cache": response_cache.status(),
+    }
+
+@app.post("/analytics/warm-up", dependencies=[Depends(require_admin)])
+async def run_cache_warm_up(top: int = 0, min_count: int = 0):
+    """Pre-generate answers to the top questions now instead of waiting for off-peak hours"""
+    return await warm_response_cache(top or None, min_count or None)
+
+@app.get("/usage")
+async def usage_summary():
+    """Token and cost totals with per-tenant usage and quota state for the current period"""
+    return usage_ledger.summary()
+
+@app.get("/usage/{tenant_id}")
+async def tenant_usage(tenant_id: str):
+    """Usage and quota state of one tenant, with its sessions"""
+    result = usage_ledger.tenant(tenant_id, with_sessions=True)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No usage recorded for this tenant")
+    return result
+
+@app.get("/knowledge")
+async def knowledge_status():
+    """Version, content hash and size of the loaded knowledge base"""
+    return knowledge.status()
+
+@app.post("/knowledge/reload", dependencies=[Depends(require_admin)])
+async def reload_knowledge(force: bool = False):
+    """Reload the knowledge base file and atomically swap it in"""
+    try:
+        return knowledge.reload(force=force)
+    except KnowledgeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/startup")
+async def startup_report():
+    """Report startup phase timings and which heavy resources are loaded"""
+    return {
+        "timings_ms": {phase: round(seconds * 1000, 1) for phase, seconds in STARTUP_TIMINGS.items()},
+        "loaded": resource_status()
     }
 
+STARTUP_TIMINGS["import_main"] = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
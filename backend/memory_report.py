@@ -0,0 +1,196 @@
+"""
+Memory introspection behind /debug/memory.
+
+``deep_size`` estimates the bytes reachable from an object. It adds up
+``sys.getsizeof`` of every object reached through containers, instance dicts
+and slots, and counts shared objects once. Classes, modules and functions are
+shared by every session, so they are not followed.
+
+``session_footprint`` applies it to a session record. It reports the
+session's ``MessageLog`` separately, with how many of its messages are in
+compressed cold blocks.
+
+``SnapshotTracker`` wraps tracemalloc. Tracing slows every allocation and
+keeps a trace per live block, so it starts with the first snapshot and stops
+when the snapshots are cleared. (``PYTHONTRACEMALLOC=1`` traces from process
+start instead.) Snapshots are numbered. ``diff`` compares two of them, or one
+with the present, by allocation site.
+"""
+
+import heapq
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+import types
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_NOT_FOLLOWED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+                 types.CodeType, types.FrameType, threading.Thread)
+_LEAVES = (str, bytes, bytearray, int, float, complex, bool, type(None))
+
+def deep_size(obj: Any, seen: Optional[set] = None) -> int:
+    """Approximate bytes held by ``obj`` and everything it references, skipping objects in ``seen``"""
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _NOT_FOLLOWED):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj, 0)
+        if isinstance(obj, _LEAVES):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        else:
+            attributes = getattr(obj, "__dict__", None)
+            if attributes is not None:
+                stack.append(attributes)
+            for cls in type(obj).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    if name != "__dict__" and hasattr(obj, name):
+                        stack.append(getattr(obj, name))
+    return size
+
+def session_footprint(record: Dict[str, Any]) -> Dict[str, int]:
+    """Estimated bytes of a session record and of its message log"""
+    seen: set = set()
+    log = record["log"]
+    log_bytes = deep_size(log, seen)
+    stats = log.stats()
+    return {"log_bytes": log_bytes, "total_bytes": log_bytes + deep_size(record, seen),
+            "messages": stats["messages"], "cold_messages": stats["cold_messages"]}
+
+def session_report(sessions: Iterable[Tuple[str, Dict[str, Any]]], largest: int = 10,
+                   limit_bytes: int = 0) -> Dict[str, Any]:
+    """Totals over all sessions, the ``largest`` sessions and how many exceed ``limit_bytes``"""
+    count = log = total = over = 0
+    heap: List[Tuple[int, str, Dict[str, int]]] = []
+    for session_id, record in sessions:
+        try:
+            footprint = session_footprint(record)
+        except RuntimeError:
+            continue  # changed while it was measured; it is measured again on the next report
+        count += 1
+        log += footprint["log_bytes"]
+        total += footprint["total_bytes"]
+        over += bool(limit_bytes and footprint["total_bytes"] > limit_bytes)
+        item = (footprint["total_bytes"], session_id, footprint)
+        if len(heap) < largest:
+            heapq.heappush(heap, item)
+        elif largest:
+            heapq.heappushpop(heap, item)
+    return {
+        "count": count,
+        "total_bytes": total,
+        "log_bytes": log,
+        "mean_bytes": round(total / count) if count else 0,
+        "limit_bytes": limit_bytes,
+        "over_limit": over,
+        "largest": [{"session_id": session_id, **footprint}
+                    for _, session_id, footprint in sorted(heap, key=lambda item: item[0], reverse=True)],
+    }
+
+def process_memory() -> Dict[str, Any]:
+    """Current resident set size (Linux) and peak RSS of the process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report = {"peak_rss_bytes": peak if sys.platform == "darwin" else peak * 1024}
+    try:
+        with open("/proc/self/statm") as f:
+            report["rss_bytes"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        report["rss_bytes"] = None
+    return report
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+def _where(frame) -> str:
+    path = frame.filename
+    if "site-packages" + os.sep in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    elif path.startswith((os.path.dirname(os.path.abspath(__file__)), os.path.dirname(os.__file__))):
+        path = os.path.basename(path)
+    return f"{path}:{frame.lineno}"
+
+def _statistic(stat, diff: bool = False) -> Dict[str, Any]:
+    item = {"where": _where(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+    if len(stat.traceback) > 1:
+        item["traceback"] = [_where(frame) for frame in stat.traceback]
+    if diff:
+        item["size_diff_bytes"] = stat.size_diff
+        item["count_diff"] = stat.count_diff
+    return item
+
+class SnapshotTracker:
+    """Numbered tracemalloc snapshots, with top allocators and diffs between them"""
+
+    def __init__(self, max_snapshots: int = 10):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[int, tracemalloc.Snapshot]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        traced, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+            "traced_bytes": traced,
+            "peak_traced_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            "snapshots": list(self._snapshots),
+        }
+
+    def _take(self) -> "tracemalloc.Snapshot":
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+    def take(self, frames: int = 1) -> Dict[str, Any]:
+        """Start tracing if needed and keep a snapshot; only the last ``max_snapshots`` are kept"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, frames))
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = self._take()
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return {"id": snapshot_id, **self.status()}
+
+    def _get(self, snapshot_id: Optional[int]) -> "tracemalloc.Snapshot":
+        if snapshot_id is None:
+            if not tracemalloc.is_tracing():
+                raise LookupError("tracemalloc is not tracing; take a snapshot first")
+            return self._take()
+        snapshot = self._snapshots.get(snapshot_id)
+        if snapshot is None:
+            raise LookupError(f"Unknown snapshot {snapshot_id}; kept: {list(self._snapshots)}")
+        return snapshot
+
+    def top(self, limit: int = 20, group_by: str = "lineno", snapshot_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Allocation sites holding the most memory in a snapshot (or now)"""
+        return [_statistic(stat) for stat in self._get(snapshot_id).statistics(group_by)[:limit]]
+
+    def diff(self, base: int, target: Optional[int] = None, limit: int = 20,
+             group_by: str = "lineno") -> List[Dict[str, Any]]:
+        """Allocation sites that grew the most from ``base`` to ``target`` (or now)"""
+        stats = self._get(target).compare_to(self._get(base), group_by)
+        return [_statistic(stat, diff=True) for stat in stats[:limit]]
+
+    def clear(self):
+        """Drop the snapshots and stop tracing"""
+        with self._lock:
+            self._snapshots.clear()
+            tracemalloc.stop()
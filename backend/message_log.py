@@ -0,0 +1,191 @@
+"""
+Compact conversation log of one session.
+
+Sessions used to hold every message twice. One copy was a LangChain message
+object in a ConversationBufferWindowMemory. The other was a dict with an ISO
+timestamp string in ``conversation_history``. ``MessageLog`` holds each message
+once. The hot tail is kept in three parallel arrays:
+
+- a role code per message (the roles are the interned ``ROLES``);
+- an integer timestamp in milliseconds;
+- the text.
+
+The auditor reads only the last ``HOT_MESSAGES``. Once ``BLOCK_MESSAGES`` more
+than that have piled up, the oldest of them are compressed with zlib into one
+cold block. Cold blocks are decompressed only when the full history is read
+(the history endpoint and the /query response), or when the recap of older
+turns reaches back into them.
+
+A running digest over all messages identifies the conversation state without
+reading the cold blocks.
+
+``to_bytes`` and ``from_buffer`` move a log in and out of the session snapshot
+(see snapshot.py) as its raw arrays, without re-encoding the cold blocks.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROLES = ("user", "assistant", "system")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# hot messages, cold messages, cold blocks, digest length, UTF-8 bytes of the hot texts
+_HEADER = struct.Struct("<IIIBI")
+
+HOT_MESSAGES = int(os.getenv("MESSAGE_LOG_HOT_MESSAGES", "10"))
+BLOCK_MESSAGES = int(os.getenv("MESSAGE_LOG_BLOCK_MESSAGES", "6"))
+
+def _iso(timestamp_ms: int) -> str:
+    return datetime.fromtimestamp(timestamp_ms / 1000).isoformat(timespec="milliseconds")
+
+class MessageLog:
+    """One session's messages: a hot tail in arrays and zlib-compressed cold blocks"""
+
+    __slots__ = ("_roles", "_times", "_texts", "_cold", "_cold_count", "_digest")
+
+    def __init__(self):
+        self._roles = bytearray()
+        self._times = array("q")
+        self._texts: List[str] = []
+        self._cold: List[bytes] = []  # oldest block first
+        self._cold_count = 0
+        self._digest = b""
+
+    def __len__(self):
+        return self._cold_count + len(self._texts)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of every message so far; equal fingerprints mean identical conversations"""
+        return self._digest.hex()
+
+    def append(self, role: str, content: str, timestamp_ms: Optional[int] = None):
+        self._roles.append(_ROLE_CODES[role])
+        self._times.append(int(time.time() * 1000) if timestamp_ms is None else timestamp_ms)
+        self._texts.append(content)
+        self._digest = hashlib.blake2b(self._digest + bytes([_ROLE_CODES[role]]) + content.encode(),
+                                       digest_size=16).digest()
+        if len(self._texts) >= HOT_MESSAGES + BLOCK_MESSAGES:
+            self._freeze(BLOCK_MESSAGES)
+
+    def _freeze(self, count: int):
+        """Compress the oldest ``count`` hot messages into a cold block"""
+        block = [list(self._roles[:count]), self._times[:count].tolist(), self._texts[:count]]
+        self._cold.append(zlib.compress(json.dumps(block, ensure_ascii=False, separators=(",", ":")).encode()))
+        del self._roles[:count], self._times[:count], self._texts[:count]
+        self._cold_count += count
+
+    @staticmethod
+    def _thaw(blob: bytes) -> List[Tuple[int, int, str]]:
+        roles, times, texts = json.loads(zlib.decompress(blob))
+        return list(zip(roles, times, texts))
+
+    def _hot(self) -> List[Tuple[int, int, str]]:
+        return list(zip(self._roles, self._times, self._texts))
+
+    def _records(self, start: int = 0) -> Iterator[Tuple[int, int, str]]:
+        """(role code, timestamp, text) from message ``start`` on, thawing only the cold blocks it needs"""
+        position = 0
+        size = self._cold_count // len(self._cold) if self._cold else 0  # every block has the same size
+        for blob in self._cold:
+            if position + size > start:
+                yield from self._thaw(blob)[max(0, start - position):]
+            position += size
+        yield from self._hot()[max(0, start - position):]
+
+    def tail(self, count: int) -> List[Tuple[str, str]]:
+        """(role, text) of the last ``count`` messages"""
+        return [(ROLES[role], text) for role, _, text in self._records(max(0, len(self) - count))]
+
+    def older(self, keep_last: int) -> Iterator[Tuple[str, str]]:
+        """(role, text) of the messages before the last ``keep_last``, newest first, thawing blocks lazily"""
+        hot = self._hot()
+        for role, _, text in reversed(hot[:max(0, len(hot) - keep_last)]):
+            yield ROLES[role], text
+        skipped = max(0, keep_last - len(hot))
+        for blob in reversed(self._cold):
+            for role, _, text in reversed(self._thaw(blob)):
+                if skipped:
+                    skipped -= 1
+                    continue
+                yield ROLES[role], text
+
+    def to_dicts(self, start: int = 0) -> List[Dict[str, Any]]:
+        """Messages from ``start`` on, in the API's ``conversation_history`` format"""
+        return [{"role": ROLES[role], "content": text, "timestamp": _iso(timestamp)}
+                for role, timestamp, text in self._records(start)]
+
+    def copy(self) -> "MessageLog":
+        """Independent log with the same messages; cold blocks are immutable and shared"""
+        clone = MessageLog()
+        clone._roles = bytearray(self._roles)
+        clone._times = array("q", self._times)
+        clone._texts = list(self._texts)
+        clone._cold = list(self._cold)
+        clone._cold_count = self._cold_count
+        clone._digest = self._digest
+        return clone
+
+    def to_bytes(self) -> bytes:
+        """Binary form for the session snapshot (native byte order), read back by ``from_buffer``"""
+        while True:
+            # Another thread may append meanwhile; take the fields again until they agree
+            cold, cold_count, digest = list(self._cold), self._cold_count, self._digest
+            roles, times, texts = bytes(self._roles), self._times.tobytes(), list(self._texts)
+            if len(roles) == len(texts) == len(times) // 8 and cold_count == self._cold_count:
+                break
+        # The texts are one UTF-8 string cut by character lengths, so a restore decodes once per log
+        joined = "".join(texts).encode()
+        return b"".join((
+            _HEADER.pack(len(roles), cold_count, len(cold), len(digest), len(joined)), digest,
+            roles, times, array("I", map(len, texts)).tobytes(), joined,
+            array("I", map(len, cold)).tobytes(), *cold,
+        ))
+
+    @classmethod
+    def from_buffer(cls, buffer, offset: int = 0) -> Tuple["MessageLog", int]:
+        """Log encoded by ``to_bytes`` at ``offset`` of ``buffer`` (e.g. a mapped file); returns (log, end)"""
+        hot, cold_count, blocks, digest_length, text_bytes = _HEADER.unpack_from(buffer, offset)
+        offset += _HEADER.size
+        log = cls()
+        log._digest = bytes(buffer[offset:offset + digest_length])
+        offset += digest_length
+        log._roles = bytearray(buffer[offset:offset + hot])
+        offset += hot
+        log._times.frombytes(buffer[offset:offset + 8 * hot])
+        offset += 8 * hot
+        lengths = array("I")
+        lengths.frombytes(buffer[offset:offset + 4 * hot])
+        offset += 4 * hot
+        joined = str(buffer[offset:offset + text_bytes], "utf-8")
+        offset += text_bytes
+        start = 0
+        for length in lengths:
+            log._texts.append(joined[start:start + length])
+            start += length
+        lengths = array("I")
+        lengths.frombytes(buffer[offset:offset + 4 * blocks])
+        offset += 4 * blocks
+        for length in lengths:
+            log._cold.append(bytes(buffer[offset:offset + length]))
+            offset += length
+        log._cold_count = cold_count
+        return log, offset
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "messages": len(self),
+            "hot_messages": len(self._texts),
+            "cold_messages": self._cold_count,
+            "cold_compressed_bytes": sum(len(blob) for blob in self._cold),
+        }
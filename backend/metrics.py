@@ -0,0 +1,102 @@
+"""
+In-process metrics for the ISO 27001:2022 Auditor Agent backend.
+
+Counters, gauges and rolling-window histograms, exposed as JSON by ``/metrics``.
+"""
+
+import threading
+from collections import deque
+from typing import Any, Dict
+
+class Metrics:
+    """Thread-safe counters, gauges and percentile histograms"""
+
+    def __init__(self, window: int = 2048):
+        self._window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, deque] = {}
+        self._totals: Dict[str, list] = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """Record a sample; percentiles are computed over the last ``window`` samples"""
+        with self._lock:
+            samples = self._histograms.get(name)
+            if samples is None:
+                samples = self._histograms[name] = deque(maxlen=self._window)
+                self._totals[name] = [0, 0.0]
+            samples.append(value)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += value
+
+    def count(self, name: str) -> int:
+        """Number of samples currently in the window of ``name``"""
+        with self._lock:
+            return len(self._histograms.get(name, ()))
+
+    def percentile(self, name: str, q: float) -> float:
+        with self._lock:
+            samples = sorted(self._histograms.get(name, ()))
+        return _percentile(samples, q)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {name: (sorted(samples), list(self._totals[name]))
+                          for name, samples in self._histograms.items()}
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {
+                name: {
+                    "count": count,
+                    "mean": total / count if count else 0.0,
+                    "p50": _percentile(samples, 0.50),
+                    "p95": _percentile(samples, 0.95),
+                    "p99": _percentile(samples, 0.99),
+                }
+                for name, (samples, (count, total)) in histograms.items()
+            },
+        }
+
+def _percentile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(q * len(sorted_samples)))
+    return sorted_samples[index]
+
+def token_usage(message) -> Dict[str, int]:
+    """Prompt, completion and provider-cached prompt tokens reported for an LLM response"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage:
+        details = usage.get("input_token_details") or {}
+        return {
+            "prompt_tokens": int(usage.get("input_tokens") or 0),
+            "completion_tokens": int(usage.get("output_tokens") or 0),
+            "cached_tokens": int(details.get("cache_read") or 0),
+        }
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    details = token_usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": int(token_usage.get("prompt_tokens") or 0),
+        "completion_tokens": int(token_usage.get("completion_tokens") or 0),
+        "cached_tokens": int(details.get("cached_tokens") or 0),
+    }
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for budgeting before a call"""
+    return (len(text) + 3) // 4
+
+# Process-wide registry
+metrics = Metrics()
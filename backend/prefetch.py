@@ -0,0 +1,151 @@
+"""
+Speculative answers to likely follow-up questions.
+
+Auditor users follow up predictably. After "what is A.5.7" they ask how to
+implement it or what evidence an auditor expects. ``follow_ups`` proposes
+these questions from templates keyed by the turn's intent and controls, with no
+LLM call. main.py returns them as suggestions with the answer. While the user
+reads, main.py answers them at ``warmup`` priority against a copy of the
+session's message log.
+
+Speculations are stored under the session's state hash, which covers the
+conversation so far and the knowledge content. The next query uses one only
+if the session is still in that state and the normalized question matches
+exactly. Whatever is not used is counted as wasted. Speculative spend is capped
+by a token budget per hour.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from analytics import normalize_question
+from metrics import metrics
+
+_CONTROL_FOLLOW_UPS = (
+    "How do I implement {control}?",
+    "What evidence do auditors expect for {control}?",
+    "Which other controls relate to {control}?",
+)
+_INTENT_FOLLOW_UPS = {
+    "risk": ("How do I write a risk treatment plan?", "Which controls address the risks we identified?",
+             "What evidence do auditors expect for the risk assessment?"),
+    "audit": ("What evidence do auditors expect for this?", "How do I handle a nonconformity found in the audit?",
+              "How do I prepare for the certification audit?"),
+    "implementation": ("What documents are mandatory for ISO 27001:2022?", "How long does certification take?",
+                       "What evidence do auditors expect for this?"),
+    "general": ("What are the key steps to implement ISO 27001:2022?",
+                "What are the main control groups in ISO 27001:2022?", "How do I conduct a risk assessment?"),
+}
+
+def follow_ups(intent: str, control_ids: List[str], limit: int = 2) -> List[str]:
+    """Likely next questions after a turn of this intent about these controls"""
+    if control_ids:
+        questions = [template.format(control=control_ids[0]) for template in _CONTROL_FOLLOW_UPS]
+    else:
+        questions = list(_INTENT_FOLLOW_UPS.get(intent, _INTENT_FOLLOW_UPS["general"]))
+    return questions[:limit]
+
+def state_hash(fingerprint: str, content_hash: str) -> str:
+    """Hash of what an answer depends on: the conversation so far (its MessageLog fingerprint) and the knowledge"""
+    return hashlib.sha256(f"{fingerprint}\n{content_hash}".encode()).hexdigest()[:24]
+
+class Prefetcher:
+    """Speculative follow-up answers per session, with a spend cap and hit-rate accounting"""
+
+    def __init__(self, budget_tokens_per_hour: int = 200000, max_sessions: int = 1000):
+        self.budget = budget_tokens_per_hour
+        self.max_sessions = max_sessions
+        # session_id -> {"state": hash, "answers": {normalized question: answer}, "pending": int}
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._window_start = time.time()
+        self._window_spent = 0
+        self._stats = {"speculated": 0, "hits": 0, "misses": 0, "skipped_budget": 0,
+                       "tokens_spent": 0, "tokens_used": 0, "tokens_wasted": 0}
+        self._lock = threading.Lock()
+
+    def _waste(self, entry: Dict[str, Any]):
+        wasted = sum(answer["tokens"] for answer in entry["answers"].values())
+        self._stats["tokens_wasted"] += wasted
+        metrics.incr("prefetch.tokens_wasted", wasted)
+
+    def _over_budget(self, now: float) -> bool:
+        if now - self._window_start >= 3600:
+            self._window_start, self._window_spent = now, 0
+        return self._window_spent >= self.budget
+
+    def plan(self, session_id: str, state: str, questions: List[str], now: Optional[float] = None) -> List[str]:
+        """Start speculating for a session in ``state``; returns the questions to answer (none over budget)"""
+        with self._lock:
+            old = self._sessions.pop(session_id, None)
+            if old is not None:
+                self._waste(old)
+            if self._over_budget(time.time() if now is None else now):
+                self._stats["skipped_budget"] += len(questions)
+                metrics.incr("prefetch.skipped_budget", len(questions))
+                return []
+            self._sessions[session_id] = {"state": state, "answers": {}, "pending": len(questions)}
+            while len(self._sessions) > self.max_sessions:
+                self._waste(self._sessions.popitem(last=False)[1])
+            return list(questions)
+
+    def current(self, session_id: str, state: str) -> bool:
+        """Whether speculating for this session and state is still useful"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return entry is not None and entry["state"] == state and not self._over_budget(time.time())
+
+    def store(self, session_id: str, state: str, question: str, response: Optional[str], tokens: int):
+        """Record a finished speculation; its tokens count against the budget even if it is never used"""
+        answer = {"question": question, "response": response, "tokens": tokens}
+        with self._lock:
+            self._window_spent += tokens
+            self._stats["tokens_spent"] += tokens
+            metrics.incr("prefetch.tokens_spent", tokens)
+            entry = self._sessions.get(session_id)
+            if entry is not None and entry["state"] == state:
+                entry["pending"] -= 1
+                if response is not None:
+                    entry["answers"][normalize_question(question)] = answer
+                    self._stats["speculated"] += 1
+                    return
+            # The user moved on (or the answer is unusable) before it was ready
+            self._waste({"answers": {"": answer}})
+
+    def take(self, session_id: str, state: str, query: str) -> Optional[Dict[str, Any]]:
+        """The speculative answer to ``query`` if the session is still in ``state``; other speculations are dropped"""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                return None
+            answer = entry["answers"].pop(normalize_question(query), None) if entry["state"] == state else None
+            self._waste(entry)
+            if answer is None:
+                self._stats["misses"] += 1
+                metrics.incr("prefetch.misses")
+                return None
+            self._stats["hits"] += 1
+            self._stats["tokens_used"] += answer["tokens"]
+            metrics.incr("prefetch.hits")
+            return {"response": answer["response"], "source": "prefetch"}
+
+    def discard(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._waste(entry)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            spent = self._stats["tokens_spent"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+                "wasted_ratio": round(self._stats["tokens_wasted"] / spent, 4) if spent else None,
+                "sessions": len(self._sessions),
+                "in_flight": sum(entry["pending"] for entry in self._sessions.values()),
+                "budget": {"tokens_per_hour": self.budget, "spent_this_hour": self._window_spent},
+            }
@@ -0,0 +1,56 @@
+"""
+Pre-LLM analysis of a query for the ISO 27001:2022 auditor graph.
+
+These run as parallel branches before the auditor node and must stay cheap:
+they are local heuristics, not LLM calls.
+"""
+
+import re
+from typing import Any, Dict, Iterable, Tuple
+
+_CONTROL_ID = re.compile(r"\bA\s*\.?\s*(\d{1,2})\s*\.\s*(\d{1,2})\b", re.IGNORECASE)
+
+# Checked in order; the first intent with a matching keyword wins
+INTENT_KEYWORDS = (
+    ("risk", ("risk", "threat", "vulnerab", "treatment", "likelihood", "impact")),
+    ("audit", ("audit", "evidence", "nonconformit", "finding", "gap")),
+    ("implementation", ("implement", "how do", "how to", "steps", "roadmap", "certif", "start")),
+)
+
+def classify_query(query: str, kb, has_documents: bool = False) -> Dict[str, Any]:
+    """Intent of the query and the controls it names explicitly"""
+    control_ids = []
+    for clause, number in _CONTROL_ID.findall(query):
+        control_id = f"A.{int(clause)}.{int(number)}"
+        if control_id in kb.by_id and control_id not in control_ids:
+            control_ids.append(control_id)
+    lowered = query.lower()
+
+    intent = "general"
+    if control_ids:
+        intent = "control"
+    else:
+        for name, keywords in INTENT_KEYWORDS:
+            if any(keyword in lowered for keyword in keywords):
+                intent = name
+                break
+    if has_documents and intent == "general":
+        intent = "audit"
+    return {"intent": intent, "control_ids": control_ids}
+
+def summarize_history(older: Iterable[Tuple[str, str]], max_topics: int = 5) -> str:
+    """One-line recap of the turns that fall outside the history window sent to the model
+
+    ``older`` yields (role, text) of those messages, newest first, as
+    ``MessageLog.older`` does; it is read only as far as needed. Extractive:
+    lists the user's earlier questions, most recent first.
+    """
+    questions = []
+    for role, text in older:
+        if role == "user" and text.strip():
+            questions.append(text.strip().splitlines()[0][:120])
+            if len(questions) == max_topics:
+                break
+    if not questions:
+        return ""
+    return "Earlier in this conversation the user asked about: " + "; ".join(questions)
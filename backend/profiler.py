@@ -0,0 +1,194 @@
+"""
+Sampling CPU profiler for the live process.
+
+An interval timer delivers a signal every 1/``hz`` seconds: SIGPROF after that
+much process CPU time (``cpu`` mode), or SIGALRM after that much wall time
+(``wall`` mode). The Python handler runs in the main thread, where the event
+loop lives. It records the stack of every thread from ``sys._current_frames()``.
+The frame it receives stands in for the main thread's stack. Idle threads are
+skipped unless ``include_idle`` is set, so the samples show where CPU goes:
+Pydantic validation, prompt building, LangChain, JSON encoding. A thread is
+idle if it is parked in a known wait. In ``cpu`` mode it is also idle if its
+own CPU clock barely moved since the last sample, because a thread sleeping or
+blocked in a C call looks busy from its stack alone.
+
+Each sample counts a tuple of code objects, which is cheap. The tuples become
+``thread;module:function;...`` lines, the collapsed format read by
+flamegraph.pl and speedscope, only when the profile is read. The time spent in
+the handler is measured, so each profile reports its own overhead. Only one
+profile runs at a time, and the previous signal handler is always restored.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (file name, function) of frames a thread sits in while it waits for work
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+_profiling = threading.Lock()
+
+class ProfilerError(RuntimeError):
+    """Profiling is unavailable in this process or thread"""
+
+class ProfilerBusy(ProfilerError):
+    """Another profile is already running"""
+
+class StackSampler:
+    """Collapsed stacks of all threads, sampled by an interval timer signal"""
+
+    def __init__(self, hz: int = 100, mode: str = "cpu", include_idle: bool = False, max_depth: int = 128):
+        if mode not in ("cpu", "wall"):
+            raise ValueError("mode must be 'cpu' or 'wall'")
+        self.interval = 1.0 / max(1, min(hz, 1000))
+        self.mode = mode
+        self.include_idle = include_idle
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.handler_seconds = 0.0
+        self._labels: Dict[Any, str] = {}  # code object -> "module:function"
+        self._thread_names: Dict[int, str] = {}
+        # thread ident -> (CPU clock id, CPU time at the last sample), in cpu mode where supported
+        self._clocks: Dict[int, Tuple[int, float]] = {}
+        self._per_thread_cpu = mode == "cpu" and hasattr(time, "pthread_getcpuclockid")
+        self._started = self._stopped = 0.0
+        self._cpu_started = self._cpu_stopped = 0.0
+        self._previous = None
+
+    @property
+    def _signal(self):
+        return signal.SIGPROF if self.mode == "cpu" else signal.SIGALRM
+
+    @property
+    def _timer(self):
+        return signal.ITIMER_PROF if self.mode == "cpu" else signal.ITIMER_REAL
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = code.co_filename
+            if "site-packages" + os.sep in path:
+                module = path.split("site-packages" + os.sep, 1)[1]
+            elif path.startswith(_BACKEND_DIR):
+                module = os.path.relpath(path, _BACKEND_DIR)
+            else:
+                module = os.path.basename(path)
+            module = module[:-3] if module.endswith(".py") else module
+            label = self._labels[code] = f"{module.replace(os.sep, '.')}:{code.co_name}"
+        return label
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._thread_names.setdefault(ident, f"thread-{ident}")
+        return name
+
+    def _idle(self, ident: int, frame) -> bool:
+        if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES:
+            return True
+        if self._per_thread_cpu:
+            try:
+                clock, last = self._clocks.get(ident) or (time.pthread_getcpuclockid(ident), None)
+                now = time.clock_gettime(clock)
+            except (OSError, OverflowError):
+                pass  # the thread just exited, or its ident is not a pthread
+            else:
+                self._clocks[ident] = (clock, now)
+                return last is None or now - last < self.interval / 10
+        return False
+
+    def _sample(self, signum, frame):
+        started = time.perf_counter()
+        try:
+            main = threading.main_thread().ident
+            for ident, thread_frame in sys._current_frames().items():
+                thread_frame = frame if ident == main else thread_frame
+                if self._idle(ident, thread_frame) and not self.include_idle:
+                    continue
+                codes = []
+                while thread_frame is not None and len(codes) < self.max_depth:
+                    codes.append(thread_frame.f_code)
+                    thread_frame = thread_frame.f_back
+                self.stacks[(ident, tuple(codes))] += 1
+            self.samples += 1
+        except Exception:
+            pass  # never let a sample break the code it interrupted
+        self.handler_seconds += time.perf_counter() - started
+
+    def start(self):
+        """Install the signal handler and start the timer; must be called from the main thread"""
+        if not hasattr(signal, "setitimer"):
+            raise ProfilerError("Interval timers are not available on this platform")
+        if threading.current_thread() is not threading.main_thread():
+            raise ProfilerError("The profiler must be started from the main thread")
+        if not _profiling.acquire(blocking=False):
+            raise ProfilerBusy("Another profile is already running")
+        try:
+            self._previous = signal.signal(self._signal, self._sample)
+        except Exception:
+            _profiling.release()
+            raise
+        self._started, self._cpu_started = time.perf_counter(), time.process_time()
+        signal.setitimer(self._timer, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(self._timer, 0)
+        signal.signal(self._signal, self._previous or signal.SIG_DFL)
+        self._stopped, self._cpu_stopped = time.perf_counter(), time.process_time()
+        _profiling.release()
+
+    def _collapsed(self) -> Counter:
+        stacks = Counter()
+        for (ident, codes), count in self.stacks.items():
+            labels = [self._label(code) for code in reversed(codes)]
+            stacks[";".join([self._thread_name(ident)] + labels)] += count
+        return stacks
+
+    def collapsed(self) -> str:
+        """One ``stack count`` line per distinct stack, for flamegraph.pl or speedscope"""
+        return "".join(f"{stack} {count}\n" for stack, count in self._collapsed().most_common())
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        """Sample counts, overhead and the functions with the most self and total samples"""
+        wall = max(self._stopped - self._started, 1e-9)
+        cpu = max(self._cpu_stopped - self._cpu_started, 1e-9)
+        own, total = Counter(), Counter()
+        for stack, count in self._collapsed().items():
+            frames = stack.split(";")[1:]
+            if frames:
+                own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        stack_samples = sum(self.stacks.values()) or 1
+        return {
+            "mode": self.mode,
+            "hz": round(1 / self.interval),
+            "seconds": round(wall, 3),
+            "cpu_seconds": round(cpu, 3),
+            "samples": self.samples,
+            "stack_samples": sum(self.stacks.values()),
+            "overhead": {
+                "handler_seconds": round(self.handler_seconds, 4),
+                "per_sample_us": round(self.handler_seconds / self.samples * 1e6, 1) if self.samples else 0.0,
+                "wall_pct": round(100 * self.handler_seconds / wall, 3),
+                "cpu_pct": round(100 * self.handler_seconds / cpu, 3),
+            },
+            "self": [{"function": label, "samples": count, "pct": round(100 * count / stack_samples, 1)}
+                     for label, count in own.most_common(top)],
+            "total": [{"function": label, "samples": count, "pct": round(100 * count / stack_samples, 1)}
+                      for label, count in total.most_common(top)],
+        }
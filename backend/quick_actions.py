@@ -0,0 +1,86 @@
+"""
+Pre-generated answers to the frontend's Quick Action prompts.
+
+The canonical prompts are defined in ``data/quick_actions.json`` (or the file
+named by ``QUICK_ACTIONS_FILE``). They are context-free, so each has one
+answer per knowledge base content. main.py generates the answers at startup
+and after every knowledge change, and serves them from ``POST
+/quick-actions/{id}`` without an LLM call.
+
+Answers are keyed by knowledge content hash and prompt, and saved to
+``QUICK_ACTIONS_STORE``. A restart or another worker therefore reuses them
+instead of paying for the same calls again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+QUICK_ACTIONS_FILE = Path(os.getenv(
+    "QUICK_ACTIONS_FILE", Path(__file__).resolve().parent / "data" / "quick_actions.json"
+))
+QUICK_ACTIONS_STORE = Path(os.getenv(
+    "QUICK_ACTIONS_STORE", Path(__file__).resolve().parent / "storage" / "quick_actions.json"
+))
+
+def _answer_key(content_hash: str, prompt: str) -> str:
+    return hashlib.sha256(f"{content_hash}\n{prompt}".encode()).hexdigest()[:24]
+
+class QuickActions:
+    """Canonical prompts with their stored answers for the current knowledge content"""
+
+    def __init__(self, path=QUICK_ACTIONS_FILE, store=QUICK_ACTIONS_STORE):
+        self.store = Path(store)
+        self.actions: Dict[str, Dict[str, str]] = {}
+        with open(path, "r") as f:
+            for action in json.load(f):
+                if not action.get("id") or not action.get("prompt"):
+                    raise ValueError(f"Quick action needs an 'id' and a 'prompt': {action!r}")
+                self.actions[action["id"]] = {
+                    "id": action["id"], "label": action.get("label") or action["id"], "prompt": action["prompt"]
+                }
+        self._answers: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if self.store.exists():
+            try:
+                with open(self.store, "r") as f:
+                    self._answers = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"WARNING: Ignoring unreadable quick action store {self.store}: {e}")
+
+    def answer(self, action_id: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Stored answer of an action for this knowledge content, or None"""
+        action = self.actions[action_id]
+        return self._answers.get(_answer_key(content_hash, action["prompt"]))
+
+    def missing(self, content_hash: str) -> List[Dict[str, str]]:
+        """Actions without an answer for this knowledge content"""
+        return [action for action in self.actions.values() if self.answer(action["id"], content_hash) is None]
+
+    def put(self, action_id: str, content_hash: str, response: str):
+        """Store an answer and persist the answers of the current content"""
+        action = self.actions[action_id]
+        with self._lock:
+            self._answers[_answer_key(content_hash, action["prompt"])] = {
+                "response": response, "generated_at": time.time()
+            }
+            # Keep only answers for the current prompts and content, so the file does not grow
+            current = {_answer_key(content_hash, a["prompt"]) for a in self.actions.values()}
+            self._answers = {key: value for key, value in self._answers.items() if key in current}
+            self.store.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.store.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(self._answers, f)
+            os.replace(tmp, self.store)
+
+    def listing(self, content_hash: str) -> List[Dict[str, Any]]:
+        result = []
+        for action in self.actions.values():
+            answer = self.answer(action["id"], content_hash)
+            result.append({**action, "ready": answer is not None,
+                           "generated_at": answer["generated_at"] if answer else None})
+        return result
@@ -0,0 +1,166 @@
+"""
+Client-side requests-per-minute / tokens-per-minute limiter shared by all workers.
+
+Each limited backend has two token buckets, requests and tokens. Their state
+lives in a small SQLite database (``RATE_LIMIT_DB``), so every uvicorn worker on
+the host draws from the same quota. A bucket refills continuously at the
+per-minute rate and holds at most ``burst_seconds`` worth of it, so a burst is
+smoothed instead of spending the whole minute's quota at once.
+
+Callers *reserve* capacity: the bucket may go negative, and the caller sleeps
+until its reservation is covered. Concurrent bursts are therefore queued in
+arrival order and spread out at the provider's rate instead of failing. A
+reservation that would wait longer than ``max_wait`` is refused with
+``RateLimitExceeded``. Token reservations use an estimate and are reconciled
+with the usage the provider reports. A provider 429 drains the buckets, which
+pauses every worker.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from metrics import metrics
+
+RATE_LIMIT_DB = Path(os.getenv(
+    "RATE_LIMIT_DB", Path(__file__).resolve().parent / "storage" / "rate_limits.sqlite3"
+))
+
+class RateLimitExceeded(RuntimeError):
+    """The quota is booked further ahead than the caller is willing to wait"""
+
+    def __init__(self, name: str, wait: float):
+        super().__init__(f"{name} quota is booked {wait:.1f}s ahead")
+        self.wait = wait
+
+class TokenBucketLimiter:
+    """RPM/TPM reservation buckets for one backend, persisted in SQLite"""
+
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0, path=RATE_LIMIT_DB, max_wait: float = 30.0,
+                 burst_seconds: float = 10.0):
+        self.name = name
+        self.limits = {"requests": float(rpm or 0), "tokens": float(tpm or 0)}
+        self.capacity = {kind: limit * burst_seconds / 60.0 for kind, limit in self.limits.items()}
+        self.max_wait = max_wait
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, balance REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _key(self, kind: str) -> str:
+        return f"{self.name}:{kind}"
+
+    def _update(self, change: Dict[str, float], refuse_after: Optional[float] = None) -> float:
+        """Refill, apply ``change`` to each bucket atomically and return the wait in seconds
+
+        With ``refuse_after``, nothing is booked if the wait would exceed it and
+        the would-be wait is returned instead.
+        """
+        db = self._connect()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")  # serialises all workers on this host
+        try:
+            balances = {}
+            for kind, amount in change.items():
+                limit = self.limits[kind]
+                if limit <= 0:
+                    continue
+                row = db.execute("SELECT balance, updated FROM buckets WHERE name = ?", (self._key(kind),)).fetchone()
+                balance, updated = row if row else (self.capacity[kind], now)
+                balance = min(self.capacity[kind], balance + (now - updated) * limit / 60.0)
+                balances[kind] = (balance, balance - amount, limit)
+            wait = max(
+                (max(0.0, -after) * 60.0 / limit for _, after, limit in balances.values()),
+                default=0.0,
+            )
+            refused = refuse_after is not None and wait > refuse_after
+            for kind, (before, after, _) in balances.items():
+                db.execute(
+                    "INSERT OR REPLACE INTO buckets (name, balance, updated) VALUES (?, ?, ?)",
+                    (self._key(kind), before if refused else after, now),
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        if refused:
+            raise RateLimitExceeded(self.name, wait)
+        return wait
+
+    def reserve(self, tokens: int) -> float:
+        """Book one request and ``tokens`` tokens; returns how long to wait before sending"""
+        wait = self._update({"requests": 1, "tokens": tokens}, refuse_after=self.max_wait)
+        metrics.observe(f"rate_limit.{self.name}.wait_ms", wait * 1000)
+        if wait > 0:
+            metrics.incr(f"rate_limit.{self.name}.queued")
+        return wait
+
+    def refund(self, tokens: int, requests: int = 0):
+        """Return capacity that was reserved but not used (negative ``tokens`` books more)"""
+        if tokens or requests:
+            self._update({"requests": -requests, "tokens": -tokens})
+
+    def penalize(self, retry_after: Optional[float]):
+        """The provider returned 429: empty the buckets so all workers pause for ``retry_after``"""
+        db = self._connect()
+        now = time.time()
+        pause = retry_after or 1.0
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, limit in self.limits.items():
+                if limit > 0:
+                    db.execute(
+                        "INSERT OR REPLACE INTO buckets (name, balance, updated) VALUES (?, ?, ?)",
+                        (self._key(kind), -pause * limit / 60.0, now),
+                    )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        metrics.incr(f"rate_limit.{self.name}.provider_429")
+
+    def status(self) -> Dict[str, Any]:
+        """Per-bucket limit, available balance and utilization of the burst (above 1.0 means requests are queued)"""
+        wait = self._update({kind: 0 for kind, limit in self.limits.items() if limit > 0})
+        db = self._connect()
+        result = {"queue_seconds": round(wait, 3)}
+        for kind, limit in self.limits.items():
+            if limit <= 0:
+                continue
+            balance, _ = db.execute("SELECT balance, updated FROM buckets WHERE name = ?", (self._key(kind),)).fetchone()
+            utilization = (self.capacity[kind] - balance) / self.capacity[kind]
+            result[kind] = {
+                "per_minute": limit,
+                "burst": round(self.capacity[kind], 1),
+                "available": round(balance, 1),
+                "utilization": round(utilization, 3),
+            }
+            metrics.set_gauge(f"rate_limit.{self.name}.{kind}_utilization", round(utilization, 3))
+        return result
+
+def limiter_from_env(name: str) -> Optional[TokenBucketLimiter]:
+    """Limiter for backend ``name`` from ``<NAME>_RPM`` / ``<NAME>_TPM``, or None when neither is set"""
+    rpm = float(os.getenv(f"{name.upper()}_RPM", "0") or 0)
+    tpm = float(os.getenv(f"{name.upper()}_TPM", "0") or 0)
+    if rpm <= 0 and tpm <= 0:
+        return None
+    return TokenBucketLimiter(
+        name, rpm, tpm,
+        max_wait=float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "30")),
+        burst_seconds=float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10")),
+    )
@@ -0,0 +1,83 @@
+"""
+Cache of auditor answers to context-free questions.
+
+A first question in a new session, without documents, gets the same prompt
+every time it is asked, apart from the retrieval of the current knowledge
+version. Its answer can therefore be reused. Entries are keyed by knowledge
+version and normalized question, kept in LRU order up to ``max_entries``, and
+expire after ``ttl_seconds``. A knowledge swap clears the cache.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from analytics import normalize_question
+from metrics import metrics
+
+class ResponseCache:
+    """LRU cache of answers keyed by (knowledge version, normalized question)"""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(version: str, query: str) -> tuple:
+        return (version, normalize_question(query))
+
+    def get(self, version: str, query: str) -> Optional[Dict[str, Any]]:
+        key = self.key(version, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["stored_at"] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.incr("response_cache.hits" if entry else "response_cache.misses")
+        return entry
+
+    def __contains__(self, key: tuple) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.time() - entry["stored_at"] <= self.ttl
+
+    def put(self, version: str, query: str, response: str, source: str = "query"):
+        """Store an answer; ``source`` records whether a user query or the warm-up produced it"""
+        with self._lock:
+            self._entries[self.key(version, query)] = {"response": response, "source": source, "stored_at": time.time()}
+            self._entries.move_to_end(self.key(version, query))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def export(self) -> List[list]:
+        """Entries as [version, normalized question, entry], least recently used first"""
+        with self._lock:
+            return [[version, question, entry] for (version, question), entry in self._entries.items()]
+
+    def restore(self, entries: List[list]):
+        """Add entries from ``export``; expired ones are dropped"""
+        now = time.time()
+        with self._lock:
+            for version, question, entry in entries:
+                if now - entry["stored_at"] <= self.ttl:
+                    self._entries[(version, question)] = entry
+                    self._entries.move_to_end((version, question))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            warmed = sum(1 for entry in self._entries.values() if entry["source"] == "warmup")
+            return {"entries": len(self._entries), "warmed": warmed, "max_entries": self.max_entries}
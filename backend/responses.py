@@ -0,0 +1,135 @@
+"""
+Response encoding for the ISO 27001:2022 Auditor Agent API.
+
+- ``FastJSONResponse`` renders with orjson (falls back to compact stdlib JSON)
+- ``CompressionMiddleware`` negotiates brotli or gzip for bodies above a size threshold
+- ``etag_response`` answers ``If-None-Match`` with 304 before anything is serialized
+"""
+
+import gzip
+import json
+from typing import Any, Callable
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip is used instead
+    brotli = None
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def etag_response(request: Request, etag: str, build: Callable[[], Any]) -> Response:
+    """Return 304 when the client already has ``etag``; otherwise build and send the body"""
+    etag = f'W/"{etag}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(build(), headers=headers)
+
+def _accepted_encodings(header: str):
+    """Parse Accept-Encoding into {coding: q}"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+def choose_encoding(header: str):
+    """Pick brotli or gzip from an Accept-Encoding header, or None"""
+    accepted = _accepted_encodings(header)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5)
+
+class CompressionMiddleware:
+    """Compress complete responses above ``minimum_size`` bytes with brotli or gzip
+
+    Streaming responses (more than one body message) pass through untouched so
+    that progressive output is not delayed.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            response_headers = [(k.lower(), v) for k, v in start_message.get("headers", [])]
+            already_encoded = any(k == b"content-encoding" for k, _ in response_headers)
+            if message.get("more_body", False) or already_encoded or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            response_headers = [(k, v) for k, v in response_headers if k != b"content-length"]
+            response_headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start_message, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
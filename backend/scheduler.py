@@ -0,0 +1,167 @@
+"""
+Admission scheduler in front of the auditor graph and other LLM work.
+
+Every unit of LLM work waits for a slot in a ``Scheduler`` before running.
+Work comes in three priority classes:
+
+- ``interactive``: chat queries from the UI;
+- ``batch``: scripts, gap analysis;
+- ``warmup``: background cache warming.
+
+A free slot always goes to the highest class with work waiting. Each class
+also has its own concurrency cap. Because the batch and warm-up caps are below
+the total, some slots stay free for chat, and a batch job cannot occupy every
+slot.
+
+Within a class, tenants (or sessions) share slots by start-time fair queuing.
+Each request gets a virtual finish tag, and the smallest tag runs first. A
+tenant that submits hundreds of questions therefore interleaves with one that
+submits a single question, in proportion to the tenants' weights. Queue
+latency is recorded per class in the ``scheduler.<class>.queue_ms`` histogram.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from metrics import metrics
+
+# Highest priority first
+PRIORITIES = ("interactive", "batch", "warmup")
+
+class QueueFull(RuntimeError):
+    """The class already has ``max_queue`` requests waiting"""
+
+    def __init__(self, priority: str, queued: int):
+        super().__init__(f"{priority} queue is full ({queued} waiting)")
+        self.priority = priority
+
+class Scheduler:
+    """Priority classes with per-class caps and weighted fair queuing across tenants"""
+
+    def __init__(self, concurrency: int = 8, caps: Optional[Dict[str, int]] = None,
+                 weights: Optional[Dict[str, float]] = None, max_queue: int = 1000):
+        self.concurrency = concurrency
+        self.caps = {priority: concurrency for priority in PRIORITIES}
+        self.caps.update(caps or {})
+        self.weights = dict(weights or {})
+        self.max_queue = max_queue
+        self.running = {priority: 0 for priority in PRIORITIES}
+        self._queues = {priority: [] for priority in PRIORITIES}
+        self._waiting = {priority: 0 for priority in PRIORITIES}
+        self._virtual = {priority: 0.0 for priority in PRIORITIES}
+        self._finish: Dict[str, Dict[str, float]] = {priority: {} for priority in PRIORITIES}
+        self._sequence = itertools.count()
+
+    def _has_capacity(self, priority: str) -> bool:
+        return sum(self.running.values()) < self.concurrency and self.running[priority] < self.caps[priority]
+
+    def _tag(self, priority: str, tenant: str) -> float:
+        """Start tag of the next request of ``tenant``; books its finish tag"""
+        finish = self._finish[priority]
+        start = max(self._virtual[priority], finish.get(tenant, 0.0))
+        finish[tenant] = start + 1.0 / self.weights.get(tenant, 1.0)
+        if len(finish) > 4096:
+            # Tenants whose finish tag is behind virtual time are idle; forgetting them changes nothing
+            virtual = self._virtual[priority]
+            self._finish[priority] = {key: value for key, value in finish.items() if value > virtual}
+        return start
+
+    def _dispatch(self):
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._has_capacity(priority):
+                start, _, future = heapq.heappop(queue)
+                if future.done():  # the waiter was cancelled
+                    continue
+                self._waiting[priority] -= 1
+                self._virtual[priority] = max(self._virtual[priority], start)
+                self.running[priority] += 1
+                future.set_result(None)
+            self._publish(priority)
+
+    def _release(self, priority: str):
+        self.running[priority] -= 1
+        self._dispatch()
+
+    def _publish(self, priority: str):
+        metrics.set_gauge(f"scheduler.{priority}.queued", self._waiting[priority])
+        metrics.set_gauge(f"scheduler.{priority}.running", self.running[priority])
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive", tenant: str = ""):
+        """Wait for a slot of class ``priority`` on behalf of ``tenant``; yields the queue time in seconds"""
+        if priority not in self.caps:
+            raise ValueError(f"Unknown priority {priority!r}; use one of {', '.join(PRIORITIES)}")
+        started = time.perf_counter()
+        start = self._tag(priority, tenant)
+        if not self._queues[priority] and self._has_capacity(priority):
+            self._virtual[priority] = max(self._virtual[priority], start)
+            self.running[priority] += 1
+            self._publish(priority)
+        else:
+            if self._waiting[priority] >= self.max_queue:
+                metrics.incr(f"scheduler.{priority}.rejected")
+                raise QueueFull(priority, self._waiting[priority])
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queues[priority], (start, next(self._sequence), future))
+            self._waiting[priority] += 1
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release(priority)  # granted just as the caller went away
+                else:
+                    self._waiting[priority] -= 1
+                    self._publish(priority)
+                raise
+        waited = time.perf_counter() - started
+        metrics.observe(f"scheduler.{priority}.queue_ms", waited * 1000)
+        try:
+            yield waited
+        finally:
+            self._release(priority)
+
+    def status(self) -> Dict[str, Any]:
+        """Running and waiting requests per class with their caps"""
+        return {
+            "concurrency": self.concurrency,
+            "classes": {
+                priority: {
+                    "cap": self.caps[priority],
+                    "running": self.running[priority],
+                    "queued": self._waiting[priority],
+                    "queue_ms_p95": round(metrics.percentile(f"scheduler.{priority}.queue_ms", 0.95), 1),
+                }
+                for priority in PRIORITIES
+            },
+        }
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        tenant, _, weight = item.partition("=")
+        try:
+            weights[tenant.strip()] = max(0.01, float(weight))
+        except ValueError:
+            print(f"WARNING: Ignoring tenant weight {item!r} in SCHEDULER_TENANT_WEIGHTS")
+    return weights
+
+def scheduler_from_env() -> Scheduler:
+    """Scheduler configured from ``SCHEDULER_*`` environment variables"""
+    concurrency = int(os.getenv("SCHEDULER_CONCURRENCY", "8"))
+    return Scheduler(
+        concurrency,
+        caps={
+            "interactive": int(os.getenv("SCHEDULER_INTERACTIVE_CONCURRENCY", str(concurrency))),
+            "batch": int(os.getenv("SCHEDULER_BATCH_CONCURRENCY", str(max(1, concurrency - 2)))),
+            "warmup": int(os.getenv("SCHEDULER_WARMUP_CONCURRENCY", "1")),
+        },
+        weights=_parse_weights(os.getenv("SCHEDULER_TENANT_WEIGHTS", "")),
+        max_queue=int(os.getenv("SCHEDULER_MAX_QUEUE", "1000")),
+    )
@@ -0,0 +1,318 @@
+"""
+In-memory conversation session store with secondary indexes.
+
+Sessions are kept by ID, as before. In addition, sorted indexes on creation
+time, last activity and message count are updated on every write. Each index
+exists once over all sessions and once per tenant. ``query`` walks one index
+from a keyset cursor. A page costs O(page + log n) whatever the number of
+sessions. Expiring idle sessions walks the last-activity index from its oldest
+end.
+
+The indexes are ``SortedIndex`` instances: sorted lists split into chunks of
+at most ``2 * load`` items. An insert or delete moves one chunk instead of the
+whole list, which is the layout of the ``sortedcontainers`` package without
+the dependency.
+
+``dump`` and ``restore`` move every session with its indexed fields in and out
+of the snapshot written at shutdown. ``restore`` sorts each index once instead
+of inserting session by session.
+"""
+
+import base64
+import json
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SORT_FIELDS = ("created_at", "last_active", "message_count")
+
+# Sorts after every session ID, for inclusive upper bounds on (key, session_id) pairs
+_MAX_ID = "\U0010ffff"
+
+class SortedIndex:
+    """Sorted (key, session_id) pairs with O(log n) seeks and O(sqrt n) updates"""
+
+    def __init__(self, load: int = 512):
+        self._load = load
+        self._lists: List[list] = []
+        self._maxes: list = []
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def load(self, items: list):
+        """Replace the contents with ``items``, sorted once and cut into chunks"""
+        items.sort()
+        self._lists = [items[i:i + self._load] for i in range(0, len(items), self._load)]
+        self._maxes = [chunk[-1] for chunk in self._lists]
+        self._len = len(items)
+
+    def add(self, item):
+        if not self._lists:
+            self._lists.append([item])
+            self._maxes.append(item)
+        else:
+            i = bisect_left(self._maxes, item)
+            if i == len(self._maxes):
+                i -= 1
+                self._lists[i].append(item)
+                self._maxes[i] = item
+            else:
+                insort(self._lists[i], item)
+            chunk = self._lists[i]
+            if len(chunk) > 2 * self._load:
+                self._lists[i:i + 1] = [chunk[:self._load], chunk[self._load:]]
+                self._maxes[i:i + 1] = [chunk[self._load - 1], chunk[-1]]
+        self._len += 1
+
+    def remove(self, item):
+        i = bisect_left(self._maxes, item)
+        chunk = self._lists[i] if i < len(self._lists) else ()
+        j = bisect_left(chunk, item)
+        if j == len(chunk) or chunk[j] != item:
+            raise KeyError(item)
+        del chunk[j]
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._lists[i]
+            del self._maxes[i]
+        self._len -= 1
+
+    def _position(self, item, right: bool) -> Tuple[int, int]:
+        """Chunk and offset of the first item after (``right``) or at ``item``"""
+        maxes = self._maxes
+        i = bisect_right(maxes, item) if right else bisect_left(maxes, item)
+        if i == len(maxes):
+            return i, 0
+        chunk = self._lists[i]
+        return i, bisect_right(chunk, item) if right else bisect_left(chunk, item)
+
+    def irange(self, low=None, high=None, reverse: bool = False, exclusive: bool = False) -> Iterator:
+        """Items between ``low`` and ``high`` in order, starting after the start bound when ``exclusive``
+
+        The start bound is ``low``, or ``high`` when ``reverse``. The end bound is
+        always inclusive.
+        """
+        if not reverse:
+            i, j = (0, 0) if low is None else self._position(low, right=exclusive)
+            while i < len(self._lists):
+                chunk = self._lists[i]
+                for item in chunk[j:] if j else chunk:
+                    if high is not None and item > high:
+                        return
+                    yield item
+                i, j = i + 1, 0
+        else:
+            if high is None:
+                i, j = len(self._lists) - 1, None
+            else:
+                i, j = self._position(high, right=not exclusive)
+                if j == 0:
+                    i, j = i - 1, None
+            while i >= 0:
+                chunk = self._lists[i]
+                for item in reversed(chunk if j is None else chunk[:j]):
+                    if low is not None and item < low:
+                        return
+                    yield item
+                i, j = i - 1, None
+
+class _Entry:
+    __slots__ = ("created_at", "last_active", "message_count", "tenant_id")
+
+    def __init__(self, created_at: float, tenant_id: str):
+        self.created_at = created_at
+        self.last_active = created_at
+        self.message_count = 0
+        self.tenant_id = tenant_id
+
+def encode_cursor(key, session_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([key, session_id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        key, session_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return key, str(session_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+class SessionStore:
+    """Session records by ID with indexes on creation time, last activity and message count"""
+
+    def __init__(self):
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._entries: Dict[str, _Entry] = {}
+        # (tenant or None for all sessions, field) -> index
+        self._indexes: Dict[Tuple[Optional[str], str], SortedIndex] = {
+            (None, field): SortedIndex() for field in SORT_FIELDS
+        }
+
+    def __contains__(self, session_id):
+        return session_id in self._records
+
+    def __getitem__(self, session_id) -> Dict[str, Any]:
+        return self._records[session_id]
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, session_id, default=None):
+        return self._records.get(session_id, default)
+
+    def items(self):
+        return self._records.items()
+
+    def _indexes_of(self, entry: _Entry):
+        yield from ((self._indexes[(None, field)], field) for field in SORT_FIELDS)
+        if entry.tenant_id:
+            for field in SORT_FIELDS:
+                index = self._indexes.get((entry.tenant_id, field))
+                if index is None:
+                    index = self._indexes[(entry.tenant_id, field)] = SortedIndex()
+                yield index, field
+
+    def _unindex(self, session_id: str, entry: _Entry):
+        for index, field in self._indexes_of(entry):
+            index.remove((getattr(entry, field), session_id))
+        if entry.tenant_id and not len(self._indexes[(entry.tenant_id, "created_at")]):
+            for field in SORT_FIELDS:
+                del self._indexes[(entry.tenant_id, field)]
+
+    def _index(self, session_id: str, entry: _Entry):
+        for index, field in self._indexes_of(entry):
+            index.add((getattr(entry, field), session_id))
+
+    def add(self, session_id: str, record: Dict[str, Any], tenant_id: str = "", now: Optional[float] = None):
+        """Store a new session (replacing any with the same ID)"""
+        if session_id in self._records:
+            self.delete(session_id)
+        entry = _Entry(time.time() if now is None else now, tenant_id)
+        self._records[session_id] = record
+        self._entries[session_id] = entry
+        self._index(session_id, entry)
+
+    def touch(self, session_id: str, message_count: Optional[int] = None, tenant_id: Optional[str] = None,
+              now: Optional[float] = None):
+        """Record activity on a session and re-index the fields that changed"""
+        entry = self._entries[session_id]
+        self._unindex(session_id, entry)
+        entry.last_active = max(entry.last_active, time.time() if now is None else now)
+        if message_count is not None:
+            entry.message_count = message_count
+        if tenant_id is not None:
+            entry.tenant_id = tenant_id
+        self._index(session_id, entry)
+
+    def delete(self, session_id: str) -> bool:
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return False
+        del self._records[session_id]
+        self._unindex(session_id, entry)
+        return True
+
+    def dump(self) -> Iterator[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+        """(session ID, record, indexed fields) of every session, for a snapshot"""
+        for session_id, record in list(self._records.items()):
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                yield session_id, record, {field: getattr(entry, field) for field in _Entry.__slots__}
+
+    def restore(self, sessions: Iterable[Tuple[str, Dict[str, Any], Dict[str, Any]]]):
+        """Replace every session with ``sessions`` as produced by ``dump``, and rebuild the indexes
+
+        Nothing changes if reading ``sessions`` fails part way.
+        """
+        records, entries = {}, {}
+        for session_id, record, fields in sessions:
+            entry = _Entry(fields["created_at"], fields["tenant_id"])
+            entry.last_active = fields["last_active"]
+            entry.message_count = fields["message_count"]
+            records[session_id] = record
+            entries[session_id] = entry
+        items: Dict[Tuple[Optional[str], str], list] = {(None, field): [] for field in SORT_FIELDS}
+        for session_id, entry in entries.items():
+            for tenant in (None, entry.tenant_id) if entry.tenant_id else (None,):
+                for field in SORT_FIELDS:
+                    items.setdefault((tenant, field), []).append((getattr(entry, field), session_id))
+        indexes = {}
+        for key, pairs in items.items():
+            index = indexes[key] = SortedIndex()
+            index.load(pairs)
+        self._records, self._entries, self._indexes = records, entries, indexes
+
+    def info(self, session_id: str) -> Dict[str, Any]:
+        """Indexed fields of a session, timestamps as epoch seconds"""
+        entry = self._entries[session_id]
+        return {field: getattr(entry, field) for field in _Entry.__slots__}
+
+    def count(self, tenant_id: Optional[str] = None) -> int:
+        index = self._indexes.get((tenant_id or None, "created_at"))
+        return len(index) if index is not None else 0
+
+    def query(self, sort: str = "last_active", descending: bool = True, limit: int = 50,
+              cursor: Optional[str] = None, tenant_id: Optional[str] = None,
+              created_after: Optional[float] = None, created_before: Optional[float] = None,
+              active_after: Optional[float] = None, active_before: Optional[float] = None,
+              min_messages: Optional[int] = None) -> Tuple[List[str], Optional[str]]:
+        """One page of session IDs and the cursor of the next page (None on the last page)
+
+        The range on the ``sort`` field is a seek into its index; the other
+        filters are checked while walking it.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field {sort!r}; use one of {', '.join(SORT_FIELDS)}")
+        index = self._indexes.get((tenant_id or None, sort))
+        if index is None:
+            return [], None
+        ranges = {
+            "created_at": (created_after, created_before),
+            "last_active": (active_after, active_before),
+            "message_count": (min_messages, None),
+        }
+        low, high = ranges[sort]
+        low = None if low is None else (low, "")
+        high = None if high is None else (high, _MAX_ID)
+        exclusive = False
+        if cursor:
+            start = tuple(decode_cursor(cursor))
+            if descending:
+                high = start if high is None else min(high, start)
+            else:
+                low = start if low is None else max(low, start)
+            exclusive = True
+
+        def wanted(entry: _Entry) -> bool:
+            return not (
+                (created_after is not None and entry.created_at < created_after)
+                or (created_before is not None and entry.created_at > created_before)
+                or (active_after is not None and entry.last_active < active_after)
+                or (active_before is not None and entry.last_active > active_before)
+                or (min_messages is not None and entry.message_count < min_messages)
+            )
+
+        page: List[str] = []
+        last = None
+        for item in index.irange(low, high, reverse=descending, exclusive=exclusive):
+            if len(page) == limit:
+                return page, encode_cursor(*last)
+            if wanted(self._entries[item[1]]):
+                page.append(item[1])
+                last = item
+        return page, None
+
+    def expire(self, inactive_before: float, tenant_id: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
+        """Delete sessions idle since before ``inactive_before``, oldest first; returns their IDs"""
+        index = self._indexes.get((tenant_id or None, "last_active"))
+        if index is None:
+            return []
+        expired = []
+        for _, session_id in index.irange(high=(inactive_before, "")):
+            if limit is not None and len(expired) >= limit:
+                break
+            expired.append(session_id)
+        for session_id in expired:
+            self.delete(session_id)
+        return expired
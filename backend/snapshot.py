@@ -0,0 +1,140 @@
+"""
+Binary snapshot of the sessions and caches, written at shutdown and read at boot.
+
+The file is ``MAGIC`` followed by sections. Each section has a header (a
+4-byte name, the payload length and the payload's CRC-32) and then the
+payload. Sections are streamed to a temporary file, and the header is patched
+once the payload is written. The file replaces the previous snapshot only
+when it is complete, so a crash while writing leaves the old one intact.
+
+Sessions are one record after another. A record has a fixed header (string
+lengths, revision, indexed times and message count), then the session ID,
+tenant and creation time, then the ``MessageLog`` in its own binary form. Cold
+blocks are copied as they are, without being decompressed. Arrays are written
+in native byte order, which the ``META`` section records.
+
+``open_snapshot`` maps the file and checks every CRC before anything is
+restored. Records are then decoded straight from the mapping, so a restore
+reads the file once and never holds a second copy of it.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from message_log import MessageLog
+
+SNAPSHOT_FILE = Path(os.getenv(
+    "SESSION_SNAPSHOT_FILE", Path(__file__).resolve().parent / "storage" / "sessions.snapshot"
+))
+
+MAGIC = b"ISOSNAP1"
+_SECTION = struct.Struct("<4sQI")  # name, payload length, CRC-32
+# session ID, tenant and created_at lengths (UTF-8), revision, indexed created_at, last_active, message count
+_SESSION = struct.Struct("<HHHIddI")
+
+class SnapshotError(Exception):
+    """The snapshot file is not one this version can restore"""
+
+def encode_session(session_id: str, record: Dict[str, Any], fields: Dict[str, Any]) -> bytes:
+    """One session record; ``fields`` are its indexed fields (``SessionStore.dump``)"""
+    strings = [session_id.encode(), record["tenant_id"].encode(), record["created_at"].encode()]
+    header = _SESSION.pack(*map(len, strings), record["revision"], fields["created_at"], fields["last_active"],
+                           fields["message_count"])
+    return b"".join((header, *strings, record["log"].to_bytes()))
+
+def decode_sessions(buffer) -> Iterator[Tuple[str, Dict[str, Any], Dict[str, Any]]]:
+    """(session ID, record, indexed fields) of every record in a sessions payload"""
+    offset, end = 0, len(buffer)
+    while offset < end:
+        (id_length, tenant_length, created_length, revision, created_at, last_active,
+         message_count) = _SESSION.unpack_from(buffer, offset)
+        offset += _SESSION.size
+        session_id = str(buffer[offset:offset + id_length], "utf-8")
+        offset += id_length
+        tenant_id = str(buffer[offset:offset + tenant_length], "utf-8")
+        offset += tenant_length
+        created = str(buffer[offset:offset + created_length], "utf-8")
+        offset += created_length
+        log, offset = MessageLog.from_buffer(buffer, offset)
+        record = {"log": log, "created_at": created, "tenant_id": tenant_id, "revision": revision}
+        yield session_id, record, {"created_at": created_at, "last_active": last_active,
+                                   "message_count": message_count, "tenant_id": tenant_id}
+
+def write_snapshot(path: Path, sections: Iterable[Tuple[bytes, Iterable[bytes]]]) -> int:
+    """Stream ``(name, chunks)`` sections into a new snapshot at ``path``; returns its size in bytes"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    meta = json.dumps({"format": 1, "byteorder": sys.byteorder}).encode()
+    tmp = path.with_suffix(".tmp")
+    try:
+        with open(tmp, "wb", buffering=1 << 20) as f:
+            f.write(MAGIC)
+            for name, chunks in ((b"META", [meta]), *sections):
+                start = f.tell()
+                f.write(_SECTION.pack(name, 0, 0))
+                length, crc = 0, 0
+                for chunk in chunks:
+                    f.write(chunk)
+                    length += len(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                end = f.tell()
+                f.seek(start)
+                f.write(_SECTION.pack(name, length, crc))
+                f.seek(end)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return size
+
+@contextmanager
+def open_snapshot(path: Path):
+    """Map a snapshot and yield its sections as {name: memoryview}, after checking every CRC
+
+    Raises FileNotFoundError when there is no snapshot and SnapshotError when
+    it is damaged or was written on a different byte order.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < len(MAGIC):
+            raise SnapshotError(f"{path} is truncated")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    sections: Dict[str, memoryview] = {}
+    try:
+        if view[:len(MAGIC)] != MAGIC:
+            raise SnapshotError(f"{path} is not a session snapshot")
+        offset = len(MAGIC)
+        while offset < size:
+            if offset + _SECTION.size > size:
+                raise SnapshotError(f"{path} is truncated")
+            name, length, crc = _SECTION.unpack_from(view, offset)
+            offset += _SECTION.size
+            payload = view[offset:offset + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                payload.release()
+                raise SnapshotError(f"Section {name.decode(errors='replace')} of {path} is damaged")
+            sections[name.decode()] = payload
+            offset += length
+        meta = json.loads(bytes(sections.get("META", b"{}")) or b"{}")
+        if meta.get("format") != 1 or meta.get("byteorder") != sys.byteorder:
+            raise SnapshotError(f"{path} has format {meta.get('format')} and byte order {meta.get('byteorder')}")
+        yield sections
+    finally:
+        for payload in sections.values():
+            payload.release()
+        view.release()
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # a caller still holds a slice; the mapping closes when it is collected
@@ -0,0 +1,122 @@
+"""
+Startup-time helpers for the ISO 27001:2022 Auditor Agent backend.
+
+Heavy dependencies (LangGraph, LangChain, the OpenAI client) are not imported
+when ``main`` is loaded. They are built on first use, or ahead of time by
+``warm_up()``, so that workers boot quickly and report healthy early.
+
+Run ``python startup.py`` for a ``-X importtime`` report of the backend.
+"""
+
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+# Seconds spent in each startup phase (import, lazy resource construction, warm-up)
+STARTUP_TIMINGS = {}
+
+class LazyResource:
+    """Thread-safe holder that builds an expensive object once, on first call"""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                started = time.perf_counter()
+                self._value = self._factory()
+                STARTUP_TIMINGS[self.name] = time.perf_counter() - started
+                self._loaded = True
+        return self._value
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def reset(self):
+        """Drop the cached object so the next call rebuilds it"""
+        with self._lock:
+            self._value = None
+            self._loaded = False
+
+_resources = []
+
+def lazy_resource(name, factory):
+    """Register a lazily built resource that ``warm_up()`` will construct"""
+    resource = LazyResource(name, factory)
+    _resources.append(resource)
+    return resource
+
+def register_resource(resource):
+    """Register an object with ``name``, ``loaded`` and ``__call__`` for warm-up and status reports"""
+    _resources.append(resource)
+    return resource
+
+def resource_status():
+    """Map each registered lazy resource to whether it has been built"""
+    return {resource.name: resource.loaded for resource in _resources}
+
+def warm_up():
+    """Build every registered lazy resource now instead of on the first request"""
+    started = time.perf_counter()
+    for resource in _resources:
+        resource()
+    STARTUP_TIMINGS["warm_up"] = time.perf_counter() - started
+    return dict(STARTUP_TIMINGS)
+
+def start_warm_up(mode=None):
+    """Warm up according to ``WARM_UP``: ``lazy``, ``background`` (default) or ``eager``"""
+    mode = (mode or os.getenv("WARM_UP", "background")).lower()
+    if mode == "eager":
+        warm_up()
+    elif mode == "background":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    return mode
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def import_time_report(module="main", top=20, env=None):
+    """Import ``module`` in a fresh interpreter under ``-X importtime``
+
+    Returns the total wall time in seconds and the ``top`` entries as
+    ``(module, self_us, cumulative_us)`` sorted by cumulative cost.
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    entries.sort(key=lambda entry: entry[2], reverse=True)
+    return elapsed, entries[:top]
+
+if __name__ == "__main__":
+    elapsed, entries = import_time_report()
+    print(f"Cold import of main: {elapsed * 1000:.0f} ms (including interpreter start)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us in entries:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
@@ -0,0 +1,283 @@
+"""
+Token and cost accounting per session and per tenant, with quotas.
+
+Every auditor turn reports its LLM calls, prompt, completion and cached tokens,
+latency and estimated cost. The ledger folds them into running totals: per
+session, per tenant, and per tenant and quota period (a calendar day or month).
+Reads are O(1), and ``/usage`` never scans the turn records.
+
+Tenant totals survive restarts. Each turn is appended to ``USAGE_LEDGER_FILE``
+as a JSON line. On load, the file is folded back into the totals and, once
+long, compacted to one line per tenant and period. Sessions live in memory, as
+the conversations themselves do, and are carried across graceful restarts in
+the session snapshot (``export_sessions``/``restore_sessions``).
+
+Quotas count prompt plus completion tokens per tenant and period. Crossing the
+soft quota adds a warning to the response. At the hard quota, ``check`` raises
+``QuotaExceeded`` before any LLM call is made.
+
+The totals live in this process. Unlike the rate limiter's SQLite buckets,
+they are not shared between uvicorn workers, so with several workers each one
+enforces the quotas only against its own usage since it loaded the file.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import metrics
+
+USAGE_LEDGER_FILE = Path(os.getenv(
+    "USAGE_LEDGER_FILE", Path(__file__).resolve().parent / "storage" / "usage.jsonl"
+))
+
+FIELDS = ("turns", "llm_calls", "prompt_tokens", "completion_tokens", "cached_tokens", "llm_ms", "cost_usd")
+
+# USD per 1k prompt and completion tokens; cached prompt tokens are billed at half the prompt price
+PRICES_PER_1K = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+DEFAULT_TENANT = "default"
+
+class QuotaExceeded(RuntimeError):
+    """The tenant or session has used its hard token quota for the period"""
+
+    def __init__(self, scope: str, name: str, used: int, limit: int):
+        super().__init__(f"{scope} {name!r} has used {used} of its {limit} token quota")
+        self.scope = scope
+        self.used = used
+        self.limit = limit
+
+def _empty() -> Dict[str, float]:
+    return {field: 0 for field in FIELDS}
+
+def _add(totals: Dict[str, float], usage: Dict[str, Any]):
+    for field in FIELDS:
+        totals[field] += usage.get(field) or 0
+
+def _tokens(totals: Dict[str, float]) -> int:
+    return int(totals["prompt_tokens"] + totals["completion_tokens"])
+
+def _rounded(totals: Dict[str, float]) -> Dict[str, float]:
+    return {
+        **{field: int(value) for field, value in totals.items() if field not in ("llm_ms", "cost_usd")},
+        "tokens": _tokens(totals),
+        "llm_ms": round(totals["llm_ms"], 1),
+        "cost_usd": round(totals["cost_usd"], 6),
+    }
+
+def price(model: str) -> Tuple[float, float]:
+    """Prompt and completion USD per 1k tokens for ``model`` (longest matching known prefix)"""
+    model = (model or "").lower()
+    for name in sorted(PRICES_PER_1K, key=len, reverse=True):
+        if model.startswith(name):
+            return PRICES_PER_1K[name]
+    return (float(os.getenv("LLM_PROMPT_PRICE_PER_1K", "0")), float(os.getenv("LLM_COMPLETION_PRICE_PER_1K", "0")))
+
+def cost(usage: Dict[str, int], model: str) -> float:
+    """Estimated USD cost of one call from its token usage"""
+    prompt_price, completion_price = price(model)
+    uncached = usage["prompt_tokens"] - usage["cached_tokens"]
+    return (uncached * prompt_price + usage["cached_tokens"] * prompt_price / 2
+            + usage["completion_tokens"] * completion_price) / 1000
+
+class UsageLedger:
+    """Incremental usage rollups with soft and hard token quotas per tenant"""
+
+    def __init__(self, path=USAGE_LEDGER_FILE, period: str = "month", soft_tokens: int = 0, hard_tokens: int = 0,
+                 tenant_quotas: Optional[Dict[str, Tuple[int, int]]] = None, session_tokens: int = 0,
+                 compact_after: int = 10000):
+        self.path = Path(path)
+        self.period = period
+        self.default_quota = (soft_tokens, hard_tokens)
+        self.tenant_quotas = dict(tenant_quotas or {})
+        self.session_tokens = session_tokens
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.tenants: Dict[str, Dict[str, Any]] = {}
+        self.totals = _empty()
+        self._lock = threading.Lock()
+        self._file = None
+        self._warned = set()
+        self._load(compact_after)
+
+    def period_key(self, now: Optional[float] = None) -> str:
+        return time.strftime("%Y-%m-%d" if self.period == "day" else "%Y-%m", time.gmtime(now))
+
+    def _tenant(self, tenant: str) -> Dict[str, Any]:
+        record = self.tenants.get(tenant)
+        if record is None:
+            record = self.tenants[tenant] = {"total": _empty(), "periods": {}, "sessions": set()}
+        return record
+
+    def _fold(self, tenant: str, period: str, usage: Dict[str, Any]):
+        record = self._tenant(tenant)
+        _add(record["total"], usage)
+        _add(record["periods"].setdefault(period, _empty()), usage)
+        _add(self.totals, usage)
+
+    def _load(self, compact_after: int):
+        if not self.path.exists():
+            return
+        lines = 0
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line
+                self._fold(entry["tenant"], entry["period"], entry)
+                lines += 1
+        if lines > max(compact_after, 2 * sum(len(t["periods"]) for t in self.tenants.values())):
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                for tenant, record in self.tenants.items():
+                    for period, totals in record["periods"].items():
+                        f.write(json.dumps({"tenant": tenant, "period": period, **totals}) + "\n")
+            os.replace(tmp, self.path)
+
+    def quota(self, tenant: str) -> Tuple[int, int]:
+        """Soft and hard token quota of ``tenant`` per period (0 means unlimited)"""
+        return self.tenant_quotas.get(tenant, self.default_quota)
+
+    def check(self, session_id: str, tenant: str = DEFAULT_TENANT) -> Dict[str, Any]:
+        """Quota state before a turn; raises ``QuotaExceeded`` at a hard quota"""
+        tenant = tenant or DEFAULT_TENANT
+        period = self.period_key()
+        with self._lock:
+            record = self.tenants.get(tenant)
+            used = _tokens(record["periods"][period]) if record and period in record["periods"] else 0
+            session = self.sessions.get(session_id)
+            session_used = _tokens(session["total"]) if session else 0
+        soft, hard = self.quota(tenant)
+        if hard and used >= hard:
+            metrics.incr("usage.hard_limit_rejections")
+            raise QuotaExceeded("tenant", tenant, used, hard)
+        if self.session_tokens and session_used >= self.session_tokens:
+            metrics.incr("usage.hard_limit_rejections")
+            raise QuotaExceeded("session", session_id, session_used, self.session_tokens)
+        status = "ok"
+        if soft and used >= soft:
+            status = "soft_limit"
+            if (tenant, period) not in self._warned:
+                self._warned.add((tenant, period))
+                print(f"WARNING: Tenant {tenant!r} passed its soft quota of {soft} tokens for {period}")
+        return {"tenant": tenant, "period": period, "tokens": used, "soft": soft, "hard": hard, "status": status}
+
+    def record(self, session_id: str, tenant: str, usage: Dict[str, Any]):
+        """Add one turn's usage to the session, tenant and period totals and append it to the ledger file
+
+        ``usage`` may set ``turns`` to 0 for LLM calls that are not a conversation turn.
+        """
+        tenant = tenant or DEFAULT_TENANT
+        period = self.period_key()
+        usage = {"turns": 1, **usage}
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = {"tenant": tenant, "total": _empty()}
+            _add(session["total"], usage)
+            self._fold(tenant, period, usage)
+            self.tenants[tenant]["sessions"].add(session_id)
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps(
+                {"tenant": tenant, "period": period, "session": session_id,
+                 **{field: usage.get(field) or 0 for field in FIELDS}}
+            ) + "\n")
+            self._file.flush()
+        metrics.incr("usage.cost_usd", usage.get("cost_usd") or 0)
+
+    def export_sessions(self) -> Dict[str, Dict[str, Any]]:
+        """Per-session rollups, for the session snapshot"""
+        with self._lock:
+            return {session_id: {"tenant": session["tenant"], "total": dict(session["total"])}
+                    for session_id, session in self.sessions.items()}
+
+    def restore_sessions(self, sessions: Dict[str, Dict[str, Any]]):
+        """Put back per-session rollups from ``export_sessions``; tenant totals come from the ledger file"""
+        with self._lock:
+            for session_id, session in sessions.items():
+                self.sessions[session_id] = {"tenant": session["tenant"], "total": {**_empty(), **session["total"]}}
+                self._tenant(session["tenant"])["sessions"].add(session_id)
+
+    def forget_session(self, session_id: str):
+        """Drop a deleted session's rollup; its usage stays in the tenant totals"""
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                self.tenants[session["tenant"]]["sessions"].discard(session_id)
+
+    def session(self, session_id: str) -> Dict[str, Any]:
+        """Usage of one session so far"""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            return {"tenant": session["tenant"], **_rounded(session["total"])} if session else _rounded(_empty())
+
+    def tenant(self, tenant: str, with_sessions: bool = False) -> Optional[Dict[str, Any]]:
+        """All-time and current-period usage of ``tenant`` with its quota state"""
+        period = self.period_key()
+        soft, hard = self.quota(tenant)
+        with self._lock:
+            record = self.tenants.get(tenant)
+            if record is None:
+                return None
+            current = record["periods"].get(period) or _empty()
+            result = {
+                "tenant": tenant,
+                "total": _rounded(record["total"]),
+                "period": {"key": period, **_rounded(current)},
+                "quota": {
+                    "soft": soft,
+                    "hard": hard,
+                    "remaining": max(0, hard - _tokens(current)) if hard else None,
+                    "status": ("hard_limit" if hard and _tokens(current) >= hard
+                               else "soft_limit" if soft and _tokens(current) >= soft else "ok"),
+                },
+                "active_sessions": len(record["sessions"]),
+            }
+            if with_sessions:
+                result["sessions"] = {
+                    session_id: _rounded(self.sessions[session_id]["total"]) for session_id in record["sessions"]
+                }
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals and per-tenant usage"""
+        with self._lock:
+            totals = _rounded(self.totals)
+            tenants = list(self.tenants)
+        return {
+            "period": self.period_key(),
+            "total": totals,
+            "tenants": [self.tenant(tenant) for tenant in tenants],
+        }
+
+def _parse_quotas(spec: str) -> Dict[str, Tuple[int, int]]:
+    quotas = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        tenant, _, limits = item.partition("=")
+        soft, _, hard = limits.partition(":")
+        try:
+            quotas[tenant.strip()] = (int(soft or 0), int(hard or 0))
+        except ValueError:
+            print(f"WARNING: Ignoring quota {item!r} in USAGE_TENANT_QUOTAS")
+    return quotas
+
+def ledger_from_env() -> UsageLedger:
+    """Ledger configured from ``USAGE_*`` environment variables"""
+    return UsageLedger(
+        period=os.getenv("USAGE_QUOTA_PERIOD", "month"),
+        soft_tokens=int(os.getenv("USAGE_SOFT_QUOTA_TOKENS", "0")),
+        hard_tokens=int(os.getenv("USAGE_HARD_QUOTA_TOKENS", "0")),
+        tenant_quotas=_parse_quotas(os.getenv("USAGE_TENANT_QUOTAS", "")),
+        session_tokens=int(os.getenv("USAGE_SESSION_QUOTA_TOKENS", "0")),
+    )
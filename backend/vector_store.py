@@ -0,0 +1,436 @@
+"""
+Local vector index for the ISO 27001:2022 Auditor Agent.
+
+Embeddings are L2-normalised float32 rows in a memory-mapped NumPy file
+(``<name>.f32``) with an append-only ID sidecar (``<name>.ids``), so the index
+survives restarts and can exceed RAM. Search is a blocked, vectorised cosine
+top-k over all rows. Large corpora can build an IVF pre-filter (spherical
+k-means centroids), which limits scoring to the ``nprobe`` closest lists.
+
+Embedders are pluggable: ``HashingEmbedder`` is deterministic and offline (used
+by default and in tests); ``OpenAIEmbedder`` calls the OpenAI embeddings API.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+VECTORS_DIR = Path(os.getenv(
+    "VECTORS_DIR", Path(__file__).resolve().parent / "storage" / "vectors"
+))
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how in is it of on or our should the this to we what "
+    "when where which who why will with".split()
+)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class HashingEmbedder:
+    """Deterministic offline embedder: signed feature hashing of words, word stems and word pairs"""
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self._slots: Dict[str, Tuple[int, float]] = {}
+
+    def _slot(self, feature: str) -> Tuple[int, float]:
+        slot = self._slots.get(feature)
+        if slot is None:
+            value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            slot = (value % self.dim, 1.0 if (value >> 63) & 1 else -1.0)
+            if len(self._slots) < 500_000:
+                self._slots[feature] = slot
+        return slot
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+        for token in tokens:
+            index, sign = self._slot(token)
+            vector[index] += sign
+            if len(token) > 5:
+                # Crude stem so "backups" and "backup" share a feature
+                index, sign = self._slot(f"{token[:5]}~")
+                vector[index] += sign
+        for first, second in zip(tokens, tokens[1:]):
+            index, sign = self._slot(f"{first} {second}")
+            vector[index] += 0.5 * sign
+        return vector
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return _normalize(np.stack([self._embed(text) for text in texts]))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+class OpenAIEmbedder:
+    """OpenAI embeddings through langchain_openai (imported on first use)"""
+
+    name = "openai"
+
+    def __init__(self, model: str = None):
+        self.model = model or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+        self.dim = int(os.getenv("EMBEDDING_DIM", "1536"))
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from langchain_openai import OpenAIEmbeddings
+            self._client = OpenAIEmbeddings(model=self.model, dimensions=self.dim)
+        return self._client
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return _normalize(self._get_client().embed_documents(list(texts)))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return _normalize(self._get_client().embed_query(text))
+
+EMBEDDERS = {"hashing": HashingEmbedder, "openai": OpenAIEmbedder}
+
+def get_embedder(name: str = None):
+    """Embedder selected by ``EMBEDDER`` (``hashing`` by default)"""
+    name = (name or os.getenv("EMBEDDER", "hashing")).lower()
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder {name!r}; choose one of {', '.join(EMBEDDERS)}")
+    return EMBEDDERS[name]()
+
+class VectorStore:
+    """Append-only cosine index over memory-mapped float32 rows
+
+    With ``path=None`` the rows live in an in-memory array instead of a file.
+    """
+
+    BLOCK_ROWS = 65536
+
+    def __init__(self, dim: int, path: Optional[Path] = None, capacity: int = 1024):
+        self.dim = dim
+        self.path = Path(path) if path else None
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._count = 0
+        self._capacity = 0
+        self._vectors = None
+        self._alive = np.zeros(0, dtype=bool)
+        # IVF pre-filter: centroids, row -> list assignment, rows grouped by list
+        self._centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._list_rows: List[np.ndarray] = []
+        self._ivf_rows = 0
+        self._ids_file = None
+        if self.path and self._meta_path.exists():
+            self._load()
+        else:
+            self._resize(capacity)
+
+    # ---- storage -------------------------------------------------------
+    @property
+    def _data_path(self) -> Path:
+        return self.path.with_suffix(".f32")
+
+    @property
+    def _ids_path(self) -> Path:
+        return self.path.with_suffix(".ids")
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.path.with_suffix(".meta.json")
+
+    def _resize(self, capacity: int):
+        capacity = max(capacity, 1)
+        if self.path is None:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            if self._vectors is not None:
+                vectors[:self._count] = self._vectors[:self._count]
+            self._vectors = vectors
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            with open(self._data_path, "ab") as f:
+                f.truncate(capacity * self.dim * 4)
+            self._vectors = np.memmap(self._data_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive[:capacity]
+        self._alive = alive
+        assign = np.full(capacity, -1, dtype=np.int32)
+        assign[:len(self._assign)] = self._assign[:capacity]
+        self._assign = assign
+        self._capacity = capacity
+
+    def _load(self):
+        meta = json.loads(self._meta_path.read_text())
+        if meta["dim"] != self.dim:
+            raise ValueError(f"{self.path} holds {meta['dim']}-dim vectors, expected {self.dim}")
+        # Replay the sidecar: "<id>" appends a row, "-<id>" tombstones the live row of that ID
+        rows: Dict[str, int] = {}
+        dead = []
+        with open(self._ids_path, "r") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line.startswith("-"):
+                    row = rows.pop(line[1:], None)
+                    if row is not None:
+                        dead.append(row)
+                elif line:
+                    rows[line] = len(self._ids)
+                    self._ids.append(line)
+        self._count = min(len(self._ids), meta["count"])
+        del self._ids[self._count:]
+        self._resize(max(meta.get("capacity", self._count), self._count, 1))
+        self._alive[:self._count] = True
+        self._alive[[row for row in dead if row < self._count]] = False
+        self._rows = {vector_id: row for vector_id, row in rows.items() if row < self._count}
+        if len(rows) != len(self._rows) or any(row >= self._count for row in dead):
+            # IDs were written for vectors whose meta never landed: drop them from the sidecar
+            tmp = self._ids_path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                for row, vector_id in enumerate(self._ids):
+                    f.write(f"{vector_id}\n" if self._alive[row] else f"{vector_id}\n-{vector_id}\n")
+            os.replace(tmp, self._ids_path)
+
+    def _append_ids(self, lines: Iterable[str]):
+        if self.path is None:
+            return
+        if self._ids_file is None:
+            self._ids_file = open(self._ids_path, "a")
+        self._ids_file.write("".join(f"{line}\n" for line in lines))
+        self._ids_file.flush()
+
+    def _write_meta(self):
+        if self.path is None:
+            return
+        self._vectors.flush()
+        tmp = self._meta_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"dim": self.dim, "count": self._count, "capacity": self._capacity}))
+        os.replace(tmp, self._meta_path)
+
+    # ---- mutation ------------------------------------------------------
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, vector_id: str):
+        return vector_id in self._rows
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._rows)
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray) -> int:
+        """Add vectors for IDs that are not indexed yet; returns how many were added"""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim))
+        with self._lock:
+            fresh = [(i, vector_id) for i, vector_id in enumerate(ids)
+                     if vector_id not in self._rows and "\n" not in vector_id]
+            fresh = list({vector_id: i for i, vector_id in fresh}.items())
+            if not fresh:
+                return 0
+            needed = self._count + len(fresh)
+            if needed > self._capacity:
+                self._resize(max(needed, self._capacity * 2))
+            start = self._count
+            rows = np.arange(start, start + len(fresh))
+            self._vectors[rows] = vectors[[i for _, i in fresh]]
+            self._alive[rows] = True
+            for row, (vector_id, _) in zip(rows, fresh):
+                self._ids.append(vector_id)
+                self._rows[vector_id] = int(row)
+            if self._centroids is not None:
+                self._assign[rows] = np.argmax(self._vectors[rows] @ self._centroids.T, axis=1)
+            self._count = needed
+            self._append_ids(vector_id for vector_id, _ in fresh)
+            self._write_meta()
+            return len(fresh)
+
+    def remove(self, ids: Iterable[str]) -> int:
+        removed = []
+        with self._lock:
+            for vector_id in ids:
+                row = self._rows.pop(vector_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    removed.append(vector_id)
+            self._append_ids(f"-{vector_id}" for vector_id in removed)
+        return len(removed)
+
+    # ---- IVF pre-filter ------------------------------------------------
+    def build_ivf(self, nlist: int = None, iterations: int = 8, sample_size: int = 100_000, seed: int = 0):
+        """Cluster the rows with spherical k-means so searches can probe a few lists"""
+        with self._lock:
+            count = self._count
+            if count == 0:
+                return
+            nlist = min(nlist or max(1, int(np.sqrt(count))), count)
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(count, size=min(sample_size, count), replace=False))
+            sample = np.asarray(self._vectors[sample_rows])
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = np.bincount(labels, minlength=nlist) == 0
+                sums[empty] = centroids[empty]
+                centroids = _normalize(sums)
+            assign = np.empty(count, dtype=np.int32)
+            for start in range(0, count, self.BLOCK_ROWS):
+                block = np.asarray(self._vectors[start:start + self.BLOCK_ROWS][:count - start])
+                assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+            self._centroids = centroids
+            self._assign[:count] = assign
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+            self._list_rows = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+            self._ivf_rows = count
+
+    # ---- search --------------------------------------------------------
+    def search(self, queries: np.ndarray, k: int = 5, nprobe: int = None,
+               restrict_to: Optional[Iterable[str]] = None) -> List[List[Tuple[str, float]]]:
+        """Top-k (id, cosine) for each query row
+
+        ``nprobe`` uses the IVF pre-filter when it has been built.
+        ``restrict_to`` limits the search to the given IDs.
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        with self._lock:
+            count = self._count
+            if count == 0 or not self._rows:
+                return [[] for _ in queries]
+            if restrict_to is not None:
+                rows = np.array(sorted(self._rows[i] for i in set(restrict_to) if i in self._rows), dtype=np.int64)
+                return [self._top_k(scores, rows, k) for scores in self._score_rows(queries, rows)]
+            if nprobe and self._centroids is not None:
+                return [self._search_ivf(query, k, nprobe, count) for query in queries]
+
+            # Blocked brute force: keep the best k of every block, then merge
+            best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+            best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+            for start in range(0, count, self.BLOCK_ROWS):
+                stop = min(start + self.BLOCK_ROWS, count)
+                scores = np.asarray(self._vectors[start:stop]) @ queries.T
+                scores[~self._alive[start:stop]] = -np.inf
+                scores = scores.T
+                take = min(k, stop - start)
+                part = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+                best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+                best_rows = np.concatenate([best_rows, part + start], axis=1)
+            order = np.argsort(-best_scores, axis=1)[:, :k]
+            results = []
+            for q in range(len(queries)):
+                results.append([
+                    (self._ids[row], float(score))
+                    for row, score in zip(best_rows[q, order[q]], best_scores[q, order[q]])
+                    if np.isfinite(score)
+                ])
+            return results
+
+    def _search_ivf(self, query: np.ndarray, k: int, nprobe: int, count: int):
+        probe = np.argsort(-(self._centroids @ query))[:nprobe]
+        rows = [self._list_rows[i] for i in probe]
+        if count > self._ivf_rows:
+            tail = np.arange(self._ivf_rows, count)
+            rows.append(tail[np.isin(self._assign[tail], probe)])
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        return self._top_k(next(iter(self._score_rows(query[None, :], rows))), rows, k)
+
+    def _score_rows(self, queries: np.ndarray, rows: np.ndarray):
+        if len(rows) == 0:
+            return [np.zeros(0, dtype=np.float32) for _ in queries]
+        scores = (np.asarray(self._vectors[rows]) @ queries.T).T
+        scores[:, ~self._alive[rows]] = -np.inf
+        return scores
+
+    def _top_k(self, scores: np.ndarray, rows: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        if len(rows) == 0:
+            return []
+        take = min(k, len(rows))
+        part = np.argpartition(-scores, take - 1)[:take]
+        part = part[np.argsort(-scores[part])]
+        return [(self._ids[rows[i]], float(scores[i])) for i in part if np.isfinite(scores[i])]
+
+def build_control_index(kb, embedder) -> VectorStore:
+    """In-memory index of one knowledge version's controls, keyed by control ID"""
+    index = VectorStore(embedder.dim, capacity=len(kb.controls))
+    index.add(
+        [control.id for control in kb.controls],
+        embedder.embed_documents([f"{control.id} {control.title}" for control in kb.controls]),
+    )
+    return index
+
+class ChunkIndex:
+    """Persistent embeddings of document chunks, kept in step with a DocumentStore
+
+    Vectors are keyed by chunk hash, so a chunk shared by several documents or
+    versions is embedded once, and a new version only embeds its added chunks.
+    """
+
+    def __init__(self, documents, embedder, root: Path = VECTORS_DIR, batch_size: int = 64):
+        self.documents = documents
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.store = VectorStore(embedder.dim, Path(root) / f"chunks-{embedder.name}-{embedder.dim}")
+        self.backfill()
+
+    def backfill(self) -> int:
+        """Embed referenced chunks that have no vector yet and drop vectors of deleted documents"""
+        referenced = self.documents.referenced_chunks()
+        self.store.remove(digest for digest in self.store.ids() if digest not in referenced)
+        return self.add([digest for digest in referenced if digest not in self.store])
+
+    def add(self, hashes: Sequence[str]) -> int:
+        added = 0
+        hashes = [digest for digest in dict.fromkeys(hashes) if digest not in self.store]
+        for start in range(0, len(hashes), self.batch_size):
+            batch = hashes[start:start + self.batch_size]
+            added += self.store.add(batch, self.embedder.embed_documents(
+                [self.documents.chunk_text(digest) for digest in batch]
+            ))
+        return added
+
+    def update(self, added_hashes: Sequence[str], removed_hashes: Sequence[str]) -> Dict[str, int]:
+        """Publish listener: embed new chunks, drop ones no document references any more"""
+        referenced = self.documents.referenced_chunks()
+        return {
+            "embedded": self.add(added_hashes),
+            "removed": self.store.remove(digest for digest in removed_hashes if digest not in referenced),
+        }
+
+    def search(self, query: str, doc_ids: Optional[Iterable[str]] = None, k: int = 4) -> List[dict]:
+        """Chunks of the given documents closest to ``query``, shaped like ``DocumentStore.search``"""
+        allowed: Dict[str, Tuple[str, dict]] = {}
+        for doc_id in (list(doc_ids) if doc_ids else [meta["doc_id"] for meta in self.documents.list()]):
+            meta = self.documents.get(doc_id)
+            if meta:
+                for chunk in meta["chunks"]:
+                    allowed.setdefault(chunk["hash"], (doc_id, chunk))
+        if not allowed:
+            return []
+        hits = self.store.search(self.embedder.embed_query(query), k=k, restrict_to=allowed)[0]
+        return [
+            {
+                "doc_id": allowed[digest][0],
+                "chunk_index": allowed[digest][1]["index"],
+                "hash": digest,
+                "score": round(score, 4),
+                "text": self.documents.chunk_text(digest),
+            }
+            for digest, score in hits
+        ]
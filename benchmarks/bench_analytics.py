@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Accuracy and cost of the count-min sketch analytics under skewed traffic.
+
+Replays --queries questions drawn from a Zipf-like distribution over
+--distinct questions, then compares QueryAnalytics' top-k with exact counts.
+It prints top-k recall, the largest overcount among the reported items, the
+observe() cost, and the sketch size next to an exact counter's size.
+
+    python benchmarks/bench_analytics.py --queries 200000 --skew 0.5
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from analytics import QueryAnalytics, normalize_question
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=200000)
+    parser.add_argument("--skew", type=float, default=0.5, help="Pareto shape; higher is more skewed")
+    parser.add_argument("--width", type=int, default=4096)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    stream = [f"How do we implement requirement {min(int(rng.paretovariate(args.skew)), args.distinct)}?"
+              for _ in range(args.queries)]
+    exact = Counter(normalize_question(query) for query in stream)
+
+    analytics = QueryAnalytics(width=args.width, capacity=10 * args.top, half_life_hours=0)
+    started = time.perf_counter()
+    for query in stream:
+        analytics.observe(query, [], "implementation")
+    elapsed = time.perf_counter() - started
+
+    reported = analytics.top("question", args.top)
+    truth = {key for key, _ in exact.most_common(args.top)}
+    recall = len(truth & {item["key"] for item in reported}) / args.top
+    overcount = max(item["count"] - exact[item["key"]] for item in reported)
+    sketch_bytes = analytics.sketch.width * analytics.sketch.depth * 4
+    exact_bytes = sum(sys.getsizeof(key) + 64 for key in exact)
+
+    print(f"{args.queries} queries over {len(exact)} distinct questions")
+    print(f"top-{args.top} recall: {recall:.0%}, largest overcount: {overcount} "
+          f"(bound {2.718 * analytics.sketch.total / analytics.sketch.width:.0f})")
+    print(f"observe: {elapsed / args.queries * 1e6:.1f} us per query")
+    print(f"memory: sketch {sketch_bytes / 1024:.0f} KiB + {10 * args.top} tracked questions, "
+          f"exact counter ~{exact_bytes / 1024:.0f} KiB")
+    for item in reported[:5]:
+        print(f"  {item['count']:>7} (exact {exact[item['key']]:>7})  {item['sample']}")
+
+if __name__ == "__main__":
+    main()
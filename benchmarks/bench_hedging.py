@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tail latency with and without hedged requests, simulated with the fake LLM.
+
+The primary model has log-normal first-token latency plus a small probability
+of a very slow completion (the 20-30 s GPT-4 stalls users complain about).
+The same request stream is replayed against the primary alone, and then
+against HedgedLLM with a secondary model. The run prints p50/p95/p99 and the
+extra load that hedging costs.
+
+Times are scaled by --time-scale so the run takes seconds; the printed
+latencies are converted back to unscaled seconds.
+
+    python benchmarks/bench_hedging.py --requests 1000 --tail-probability 0.03
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fake_llm import FakeLLM
+from hedging import HedgedLLM, LatencyTracker
+from metrics import Metrics
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def run(llm, requests, concurrency):
+    def one(_):
+        started = time.perf_counter()
+        llm.invoke([])
+        return time.perf_counter() - started
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(requests)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--first-token", type=float, default=1.5, help="median primary first-token seconds")
+    parser.add_argument("--tail-probability", type=float, default=0.03)
+    parser.add_argument("--tail-seconds", type=float, default=25.0)
+    parser.add_argument("--secondary-first-token", type=float, default=1.0)
+    parser.add_argument("--percentile", type=float, default=0.95, help="hedge deadline percentile")
+    parser.add_argument("--time-scale", type=float, default=0.05)
+    args = parser.parse_args()
+    scale = args.time_scale
+
+    def primary(seed):
+        return FakeLLM("primary", first_token_seconds=args.first_token * scale, jitter=0.35,
+                       tail_probability=args.tail_probability, tail_seconds=args.tail_seconds * scale,
+                       tokens_per_second=400 / scale, seed=seed)
+
+    baseline = run(primary(1), args.requests, args.concurrency)
+
+    secondary = FakeLLM("secondary", first_token_seconds=args.secondary_first_token * scale, jitter=0.35,
+                        tail_probability=args.tail_probability, tail_seconds=args.tail_seconds * scale,
+                        tokens_per_second=400 / scale, seed=2)
+    registry = Metrics()
+    tracker = LatencyTracker(registry, percentile=args.percentile, default_deadline=3 * args.first_token * scale,
+                             min_deadline=0.25 * scale, max_deadline=30 * scale)
+    hedged_primary = primary(1)
+    hedged = run(HedgedLLM(hedged_primary, secondary, tracker), args.requests, args.concurrency)
+
+    print(f"{args.requests} requests, primary tail {args.tail_probability:.1%} at {args.tail_seconds:.0f}s, "
+          f"hedge at p{args.percentile * 100:.0f} of first-token latency\n")
+    print(f"{'':>10} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8}")
+    for label, samples in (("primary", baseline), ("hedged", hedged)):
+        print(f"{label:>10} " + " ".join(
+            f"{value / scale:>8.2f}" for value in (
+                percentile(samples, 0.50), percentile(samples, 0.95), percentile(samples, 0.99), max(samples)
+            )
+        ))
+    print(f"\nhedged requests: {secondary.calls} ({secondary.calls / args.requests:.1%} extra model calls), "
+          f"final deadline {tracker.deadline('primary') / scale:.2f}s")
+    print(f"p99 improvement: {percentile(baseline, 0.99) / percentile(hedged, 0.99):.1f}x")
+
+if __name__ == "__main__":
+    main()
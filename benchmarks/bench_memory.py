@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Memory held per conversation session.
+
+Creates --sessions sessions, each with --turns exchanges. Each layout is built
+in a fresh child process:
+
+- ``log``: the current layout, a MessageLog per session, built through the same
+  helpers /query uses;
+- ``legacy``: the old layout, with every message held twice, as a LangChain
+  message object in the window memory and as a dict with an ISO timestamp.
+
+Answers are random sentences over the knowledge base's vocabulary, so they
+compress no better than real text. For each layout it prints the RSS growth
+per session, the /debug/memory style estimate of a session and the build
+time. The log layout also gets its cold/hot split.
+
+It exits non-zero when a ``log`` session costs more than --budget-bytes, so
+memory regressions fail the benchmark run.
+
+    python benchmarks/bench_memory.py --sessions 100000 --turns 10 --budget-bytes 12000
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("WARM_UP", "lazy")
+
+def vocabulary():
+    text = json.dumps(json.load(open(BACKEND / "data" / "iso_27001_knowledge.json")))
+    return re.findall(r"[A-Za-z][a-z]{2,}", text)
+
+def answer(rng, words, chars):
+    out, length = [], 0
+    while length < chars:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(6, 14))).capitalize() + "."
+        out.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(out)[:chars]
+
+def build(layout, sessions, turns, chars):
+    """Build the sessions in this process; returns (sessions dict, seconds)"""
+    rng = random.Random(0)
+    words = vocabulary()
+    answers = [answer(rng, words, chars) for _ in range(2000)]
+    store = {}
+    if layout == "log":
+        from main import _new_session, _record_turn
+    else:
+        from langchain_core.chat_history import InMemoryChatMessageHistory
+    started = time.perf_counter()
+    for i in range(sessions):
+        questions = [f"How do I evidence control A.5.{turn % 37 + 1} for supplier {i}?" for turn in range(turns)]
+        # Distinct strings per session, as real answers are
+        replies = [answers[(i * turns + turn) % len(answers)] + f" ({i}.{turn})" for turn in range(turns)]
+        if layout == "log":
+            session = _new_session()
+            for question, reply in zip(questions, replies):
+                _record_turn(session["log"], question, reply)
+        else:
+            history, memory = [], InMemoryChatMessageHistory()
+            for question, reply in zip(questions, replies):
+                memory.add_user_message(question)
+                memory.add_ai_message(reply)
+                for role, content in (("user", question), ("assistant", reply)):
+                    history.append({"role": role, "content": content, "timestamp": datetime.now().isoformat()})
+            session = {"memory": memory, "conversation_history": history,
+                       "created_at": datetime.now().isoformat(), "tenant_id": "", "revision": 0}
+        store[f"bench-{i}"] = session
+    return store, time.perf_counter() - started
+
+def measure(layout, sessions, turns, chars):
+    from memory_report import deep_size, process_memory
+    build(layout, 10, turns, chars)  # imports and first-call costs
+    before = process_memory()["rss_bytes"]
+    store, seconds = build(layout, sessions, turns, chars)
+    after = process_memory()["rss_bytes"]
+    sample = list(store.values())[:1000]
+    result = {
+        "layout": layout,
+        "rss_per_session": (after - before) / sessions,
+        "estimate_per_session": sum(deep_size(session) for session in sample) / len(sample),
+        "build_seconds": seconds,
+    }
+    if layout == "log":
+        stats = [session["log"].stats() for session in sample]
+        result["cold_messages"] = sum(item["cold_messages"] for item in stats) / len(stats)
+        result["hot_messages"] = sum(item["hot_messages"] for item in stats) / len(stats)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--answer-chars", type=int, default=600)
+    parser.add_argument("--layout", choices=["both", "log", "legacy"], default="both")
+    parser.add_argument("--budget-bytes", type=float, default=float(os.getenv("SESSION_MEMORY_BUDGET_BYTES", "0")),
+                        help="Fail when a log session costs more than this many bytes (0: no budget)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.layout, args.sessions, args.turns, args.answer_chars)))
+        return
+    results = {}
+    for layout in (["log", "legacy"] if args.layout == "both" else [args.layout]):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--layout", layout, "--sessions", str(args.sessions),
+             "--turns", str(args.turns), "--answer-chars", str(args.answer_chars)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[layout] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{args.sessions} sessions x {args.turns} exchanges ({args.answer_chars}-char answers)")
+    print(f"{'layout':>8} {'RSS/session':>12} {'estimate':>10} {'build s':>8}")
+    for layout, result in results.items():
+        print(f"{layout:>8} {result['rss_per_session']:>12,.0f} {result['estimate_per_session']:>10,.0f} "
+              f"{result['build_seconds']:>8.1f}")
+    if "log" in results:
+        print(f"log: {results['log']['hot_messages']:.0f} hot and {results['log']['cold_messages']:.0f} "
+              f"compressed messages per session")
+    if len(results) == 2:
+        print(f"reduction: {results['legacy']['rss_per_session'] / results['log']['rss_per_session']:.1f}x RSS, "
+              f"{results['legacy']['estimate_per_session'] / results['log']['estimate_per_session']:.1f}x estimated")
+    if args.budget_bytes and "log" in results:
+        if results["log"]["rss_per_session"] > args.budget_bytes:
+            print(f"\n❌ Session memory regressed past budget: "
+                  f"{results['log']['rss_per_session']:,.0f} > {args.budget_bytes:,.0f} bytes")
+            sys.exit(1)
+        print("\n✅ Session memory within budget")
+
+if __name__ == "__main__":
+    main()
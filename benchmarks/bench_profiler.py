@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Overhead of the sampling profiler behind /debug/profile.
+
+Runs a CPU-bound slice of the request path for --seconds: it validates an
+AgentState around a long message log, builds its chat messages and
+JSON-encodes a QueryResponse. The workload runs in the main thread with --threads busy
+worker threads next to it. It runs first without the profiler, then once per
+--hz rate. For each run it prints throughput, the slowdown against the
+unprofiled run, the profiler's own measured overhead and the top functions
+found.
+
+    python benchmarks/bench_profiler.py --hz 100 1000 --threads 4
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("WARM_UP", "lazy")
+
+from main import AgentState, QueryResponse, _history_messages
+from message_log import MessageLog
+from profiler import StackSampler
+
+def request_slice(log):
+    state = AgentState(session_id="bench", current_query="How do I evidence A.5.23?", log=log)
+    messages = _history_messages(state)
+    response = QueryResponse(response=messages[-1].content, query=state.current_query, session_id="bench",
+                             conversation_history=state.log.to_dicts())
+    return response.model_dump_json()
+
+def run(seconds, threads, log, sampler=None):
+    """Request slices completed by all threads in ``seconds``"""
+    done = [0] * (threads + 1)
+    deadline = time.perf_counter() + seconds
+
+    def work(slot):
+        while time.perf_counter() < deadline:
+            request_slice(log)
+            done[slot] += 1
+
+    workers = [threading.Thread(target=work, args=(i + 1,)) for i in range(threads)]
+    if sampler:
+        sampler.start()
+    try:
+        for worker in workers:
+            worker.start()
+        work(0)
+        for worker in workers:
+            worker.join()
+    finally:
+        if sampler:
+            sampler.stop()
+    return sum(done) / seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--hz", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    log = MessageLog()
+    for i in range(args.messages):
+        log.append("user" if i % 2 == 0 else "assistant",
+                       f"Turn {i} about control A.5.{i % 37 + 1} and its evidence. " * 4)
+    run(1.0, args.threads, log)  # imports, first-call costs and CPU frequency ramp-up
+
+    baseline = run(args.seconds, args.threads, log)
+    print(f"{'profiler':>10} {'req/s':>9} {'slowdown':>9} {'samples':>8} {'us/sample':>10} {'measured':>9}")
+    print(f"{'off':>10} {baseline:>9.0f} {'':>9} {'':>8} {'':>10} {'':>9}")
+    for hz in args.hz:
+        sampler = StackSampler(hz=hz)
+        throughput = run(args.seconds, args.threads, log, sampler)
+        summary = sampler.summary(top=3)
+        overhead = summary["overhead"]
+        print(f"{f'{hz} Hz':>10} {throughput:>9.0f} {100 * (1 - throughput / baseline):>8.1f}% "
+              f"{summary['samples']:>8} {overhead['per_sample_us']:>10.1f} {overhead['cpu_pct']:>8.2f}%")
+        for item in summary["self"]:
+            print(f"{'':>12}{item['pct']:>5.1f}%  {item['function']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Throughput and errors of several workers sharing one RPM/TPM quota.
+
+Starts --workers processes, each firing --requests calls from --threads
+threads through FailoverLLM with a fake backend limited to --rpm. Without the
+limiter the burst would hit the provider all at once. With it, requests queue
+behind the shared SQLite buckets: after the initial burst, throughput should
+sit at the configured limit with no errors.
+
+    python benchmarks/bench_rate_limit.py --workers 4 --requests 100 --rpm 1200
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+def worker(requests, threads, result_path):
+    from llm_backends import build_backends
+    llm = build_backends("fake")
+    llm.backends[0].client.invoke([])  # import the message classes outside the timed run
+    first = time.time()
+
+    def one(_):
+        started = time.time()
+        try:
+            llm.invoke(["x" * 2000])
+            return time.time() - started, True
+        except Exception:
+            return time.time() - started, False
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(one, range(requests)))
+    waits = [elapsed for elapsed, _ in results]
+    Path(result_path).write_text(json.dumps({
+        "ok": sum(ok for _, ok in results), "errors": sum(not ok for _, ok in results),
+        "started": first, "finished": time.time(), "max_wait": max(waits),
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100, help="requests per worker")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=1200)
+    parser.add_argument("--tpm", type=float, default=0)
+    parser.add_argument("--burst-seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.environ.update(
+            RATE_LIMIT_DB=str(Path(root) / "limits.sqlite3"),
+            FAKE_RPM=str(args.rpm),
+            FAKE_TPM=str(args.tpm),
+            RATE_LIMIT_BURST_SECONDS=str(args.burst_seconds),
+            RATE_LIMIT_MAX_WAIT_SECONDS="600",
+            LLM_FAKE_LATENCY_SECONDS="0.01",
+        )
+        paths = [Path(root) / f"worker-{i}.json" for i in range(args.workers)]
+        processes = [Process(target=worker, args=(args.requests, args.threads, path)) for path in paths]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        results = [json.loads(path.read_text()) for path in paths]
+
+    total = sum(result["ok"] for result in results)
+    errors = sum(result["errors"] for result in results)
+    elapsed = max(result["finished"] for result in results) - min(result["started"] for result in results)
+    burst = args.rpm * args.burst_seconds / 60
+    steady = (total - burst) / max(elapsed, 1e-9) * 60
+    print(f"{args.workers} workers x {args.requests} requests, limit {args.rpm:.0f} RPM (burst {burst:.0f})")
+    print(f"   completed {total}, errors {errors}, in {elapsed:.1f}s")
+    print(f"   steady-state throughput after the burst: {steady:.0f} RPM ({steady / args.rpm:.0%} of limit)")
+    print(f"   longest queue wait: {max(result['max_wait'] for result in results):.1f}s")
+
+if __name__ == "__main__":
+    main()
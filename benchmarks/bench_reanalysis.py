@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Incremental re-analysis cost after a document edit.
+
+Uploads a synthetic policy, runs a full gap analysis with an offline fake LLM,
+then uploads edited versions of growing size and re-runs the analysis. The
+LLM calls per re-run should follow the number of changed chunks, not the size
+of the document.
+
+    python benchmarks/bench_reanalysis.py --paragraphs 300
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from documents import DocumentStore
+from gap_analysis import GapAnalyzer, GapCache
+from knowledge import KnowledgeStore
+
+WORDS = "access control supplier cloud backup encryption policy review risk asset owner logging".split()
+
+class CountingFakeLLM:
+    """Deterministic offline evaluator that counts calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        from langchain_core.messages import AIMessage
+        self.calls += 1
+        status = "partial" if hash(messages[1].content) % 7 == 0 else "not_addressed"
+        return AIMessage(content=f'{{"status": "{status}", "evidence": "", "rationale": "fake"}}')
+
+def paragraphs(count, seed):
+    rng = random.Random(seed)
+    return [f"{i}. " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 140))) for i in range(count)]
+
+async def analyse(analyzer, doc_id):
+    summary = None
+    async for event in analyzer.run(doc_id):
+        if event["type"] == "summary":
+            summary = event
+    return summary
+
+def upload(store, text, doc_id=None):
+    writer = store.begin("policy.txt", "text/plain", doc_id)
+    writer.write(text.encode())
+    return writer.finish()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        store = DocumentStore(Path(root) / "documents")
+        llm = CountingFakeLLM()
+        analyzer = GapAnalyzer(lambda: llm, KnowledgeStore(), store, GapCache(Path(root) / "gap.jsonl"),
+                               concurrency=64)
+        base = paragraphs(args.paragraphs, seed=1)
+        meta = upload(store, "\n\n".join(base))
+        doc_id = meta["doc_id"]
+
+        started = time.perf_counter()
+        full = asyncio.run(analyse(analyzer, doc_id))
+        print(f"📄 {args.paragraphs} paragraphs, {meta['chunk_count']} chunks, {full['llm_calls'] // max(meta['chunk_count'], 1)} controls")
+        print(f"   full analysis: {full['llm_calls']} LLM calls in {time.perf_counter() - started:.2f}s\n")
+
+        print(f"{'edited paragraphs':>18} {'chunks +/-':>11} {'indexed':>8} {'LLM calls':>10} {'reused':>8} {'seconds':>8}")
+        current = list(base)
+        edit_sizes = [1, 5, args.paragraphs // 10, args.paragraphs // 4, args.paragraphs]
+        for edit in edit_sizes:
+            rng = random.Random(edit)
+            for index in rng.sample(range(len(current)), min(edit, len(current))):
+                current[index] = current[index] + f" Revised wording {edit}-{index}."
+            meta = upload(store, "\n\n".join(current), doc_id)
+            started = time.perf_counter()
+            summary = asyncio.run(analyse(analyzer, doc_id))
+            elapsed = time.perf_counter() - started
+            diff = meta["diff"]
+            print(f"{edit:>18} {diff['added']:>5}/{diff['removed']:<5} {meta['indexed_chunks']:>8} "
+                  f"{summary['llm_calls']:>10} {summary['findings_reused']:>8} {elapsed:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Chat latency while a batch script saturates the LLM, with and without priority lanes.
+
+Chat users send questions at random intervals. A compliance script submits
+--batch questions with --batch-concurrency requests in flight. Every request
+holds one of --concurrency slots for a fake LLM call.
+
+The scenario runs four times:
+
+- chat alone;
+- first-come first-served, with one class and one tenant;
+- fair queuing only, with one class and the script as its own tenant;
+- priority lanes, with chat as interactive and the script as batch.
+
+Each run prints chat p50/p95 end-to-end latency, chat queue time and the
+script's throughput.
+
+Times are scaled by --time-scale; printed latencies are unscaled seconds.
+
+    python benchmarks/bench_scheduler.py --batch 300 --chat 60
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fake_llm import FakeLLM
+from scheduler import Scheduler
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+async def scenario(args, scheduler, batch_priority, with_batch, fifo):
+    scale = args.time_scale
+    llm = FakeLLM("fake", first_token_seconds=args.llm_seconds * scale, jitter=0.3,
+                  tokens_per_second=400 / scale, seed=1)
+    chat_latency, chat_queue = [], []
+
+    async def request(priority, tenant, latencies=None, queue=None):
+        started = time.perf_counter()
+        async with scheduler.slot(priority, tenant) as waited:
+            await llm.ainvoke([])
+        if latencies is not None:
+            latencies.append(time.perf_counter() - started)
+            queue.append(waited)
+
+    async def chat_users():
+        rng = random.Random(7)
+        tasks = []
+        for i in range(args.chat):
+            await asyncio.sleep(rng.expovariate(1.0 / (args.chat_interval * scale)))
+            tasks.append(asyncio.ensure_future(
+                request("interactive", "" if fifo else f"user-{i % 10}", chat_latency, chat_queue)
+            ))
+        await asyncio.gather(*tasks)
+
+    async def batch_script():
+        pending = iter(range(args.batch))
+
+        async def worker():
+            for _ in pending:
+                await request(batch_priority, "" if fifo else "compliance-script")
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.batch_concurrency)))
+        return time.perf_counter() - started
+
+    jobs = [chat_users()] + ([batch_script()] if with_batch else [])
+    results = await asyncio.gather(*jobs)
+    batch_seconds = results[1] if with_batch else None
+    return chat_latency, chat_queue, batch_seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="total LLM slots")
+    parser.add_argument("--batch-cap", type=int, default=6, help="slots the batch class may use")
+    parser.add_argument("--batch", type=int, default=300, help="questions submitted by the script")
+    parser.add_argument("--batch-concurrency", type=int, default=32, help="requests the script keeps in flight")
+    parser.add_argument("--chat", type=int, default=60, help="chat questions")
+    parser.add_argument("--chat-interval", type=float, default=1.0, help="mean seconds between chat questions")
+    parser.add_argument("--llm-seconds", type=float, default=2.0, help="median LLM call seconds")
+    parser.add_argument("--time-scale", type=float, default=0.05)
+    args = parser.parse_args()
+    scale = args.time_scale
+
+    runs = [
+        ("chat alone", Scheduler(args.concurrency), "batch", False, False),
+        ("FIFO", Scheduler(args.concurrency), "interactive", True, True),
+        ("fair queue", Scheduler(args.concurrency), "interactive", True, False),
+        ("priority", Scheduler(args.concurrency, caps={"batch": args.batch_cap}), "batch", True, False),
+    ]
+    print(f"{args.chat} chat questions, script of {args.batch} questions "
+          f"({args.batch_concurrency} in flight), {args.concurrency} LLM slots\n")
+    print(f"{'':>11} {'chat p50 s':>11} {'chat p95 s':>11} {'queue p95 s':>12} {'script q/min':>13}")
+    for label, scheduler, batch_priority, with_batch, fifo in runs:
+        latency, queue, batch_seconds = asyncio.run(scenario(args, scheduler, batch_priority, with_batch, fifo))
+        throughput = f"{args.batch / (batch_seconds / scale) * 60:>13.1f}" if batch_seconds else f"{'-':>13}"
+        print(f"{label:>11} {percentile(latency, 0.5) / scale:>11.2f} {percentile(latency, 0.95) / scale:>11.2f} "
+              f"{percentile(queue, 0.95) / scale:>12.2f} {throughput}")
+
+if __name__ == "__main__":
+    main()
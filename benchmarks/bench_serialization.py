@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Serialization and compression cost of API responses for large sessions.
+
+Builds a synthetic 1k-message conversation history and compares stdlib JSON,
+the orjson-backed FastJSONResponse, and Pydantic encoding of QueryResponse,
+plus gzip/brotli output size and time, and the cost of a 304 revalidation.
+
+    python benchmarks/bench_serialization.py --messages 1000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("WARM_UP", "lazy")
+
+import responses
+from main import QueryResponse
+
+def build_history(messages):
+    """Alternate user/assistant turns with realistic lengths"""
+    started = datetime(2024, 1, 1)
+    history = []
+    for i in range(messages):
+        role = "user" if i % 2 == 0 else "assistant"
+        body = (
+            f"How do I evidence control A.5.{i % 37 + 1} for our cloud suppliers?"
+            if role == "user"
+            else "To satisfy this control, document the policy, assign owners, "
+                 "collect evidence of periodic reviews and retain records. " * 6
+        )
+        history.append({
+            "role": role,
+            "content": body,
+            "timestamp": (started + timedelta(seconds=i * 30)).isoformat(),
+        })
+    return history
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    history = build_history(args.messages)
+    payload = {"session_id": "bench", "conversation_history": history, "created_at": history[0]["timestamp"]}
+    model = QueryResponse(response="ok", query="q", session_id="bench", conversation_history=history)
+
+    print(f"📦 Serializing a {args.messages}-message session (best of {args.repeat})")
+    rows = [
+        ("stdlib json.dumps", lambda: json.dumps(payload).encode()),
+        ("FastJSONResponse (orjson)" if responses.orjson else "FastJSONResponse (stdlib)",
+         lambda: responses.FastJSONResponse(payload).body),
+        ("Pydantic model_dump_json", lambda: model.model_dump_json().encode()),
+    ]
+    for name, fn in rows:
+        seconds, out = timed(fn, args.repeat)
+        print(f"   {name:<28} {seconds * 1000:8.2f} ms  {len(out) / 1024:8.1f} KiB")
+
+    body = responses.dumps(payload)
+    print("\n🗜️  Compression")
+    encodings = ["gzip"] + (["br"] if responses.brotli else [])
+    for encoding in encodings:
+        seconds, out = timed(lambda: responses.compress(body, encoding), args.repeat)
+        print(f"   {encoding:<28} {seconds * 1000:8.2f} ms  {len(out) / 1024:8.1f} KiB "
+              f"({len(body) / len(out):.1f}x smaller)")
+    if not responses.brotli:
+        print("   (install 'brotli' to compare brotli)")
+
+    from fastapi.testclient import TestClient
+    import main as backend
+    session = backend._new_session()
+    for turn in history:
+        session["log"].append(turn["role"], turn["content"],
+                              int(datetime.fromisoformat(turn["timestamp"]).timestamp() * 1000))
+    backend.conversation_sessions.add("bench", session)
+    with TestClient(backend.app) as client:
+        first = client.get("/session/bench/history")
+        etag = first.headers["ETag"]
+        full, _ = timed(lambda: client.get("/session/bench/history"), args.repeat)
+        cached, response = timed(lambda: client.get("/session/bench/history", headers={"If-None-Match": etag}), args.repeat)
+    print("\n🔁 /session/{id}/history round trip (in-process)")
+    print(f"   200 full body                {full * 1000:8.2f} ms")
+    print(f"   {response.status_code} If-None-Match             {cached * 1000:8.2f} ms")
+
+if __name__ == "__main__":
+    main()
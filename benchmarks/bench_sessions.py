@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+/sessions listing latency from 1k to 1M sessions with the indexed SessionStore.
+
+For each size the store is filled with sessions spread over --tenants
+tenants, with random activity and message counts. Then it times:
+
+- the first page (most recently active);
+- a page reached through a cursor;
+- a tenant-filtered page;
+- a page of sessions with at least 10 messages, sorted by message count;
+- one touch (the write after every turn);
+- expiring the 100 oldest sessions.
+
+It also times the old approach once per size: scanning and sorting every
+session.
+
+    python benchmarks/bench_sessions.py --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from sessions import SessionStore
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)[len(samples) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--tenants", type=int, default=100)
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    print(f"{'sessions':>9} {'build s':>8} {'first ms':>9} {'cursor ms':>10} {'tenant ms':>10} "
+          f"{'min msg ms':>11} {'touch ms':>9} {'expire ms':>10} {'full scan ms':>13}")
+    for size in args.sizes:
+        store = SessionStore()
+        started = time.perf_counter()
+        for i in range(size):
+            session_id = f"{i:08x}-session"
+            store.add(session_id, {"conversation_history": []}, f"tenant-{i % args.tenants}", now=i)
+            store.touch(session_id, message_count=rng.randint(0, 40), now=size + rng.random() * size)
+        build = time.perf_counter() - started
+
+        _, cursor = store.query(limit=args.page)
+        for _ in range(10):
+            _, cursor = store.query(limit=args.page, cursor=cursor)
+        ids = list(store._records)
+        clock = [2.0 * size]
+
+        def touch():
+            clock[0] += 1
+            store.touch(rng.choice(ids), message_count=rng.randint(0, 40), now=clock[0])
+
+        first = timed(lambda: store.query(limit=args.page), args.repeat)
+        deep = timed(lambda: store.query(limit=args.page, cursor=cursor), args.repeat)
+        tenant = timed(lambda: store.query(limit=args.page, tenant_id="tenant-7"), args.repeat)
+        busy = timed(lambda: store.query("message_count", limit=args.page, min_messages=10), args.repeat)
+        write = timed(touch, args.repeat)
+        expire = timed(lambda: store.expire(float("inf"), limit=100), 5)
+
+        def full_scan():
+            rows = [(store.info(session_id)["last_active"], session_id) for session_id, _ in store.items()]
+            rows.sort(reverse=True)
+            return rows[:args.page]
+        scan = timed(full_scan, 1 if size >= 100000 else 5)
+        print(f"{size:>9} {build:>8.1f} {first:>9.3f} {deep:>10.3f} {tenant:>10.3f} {busy:>11.3f} "
+              f"{write:>9.3f} {expire:>10.3f} {scan:>13.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Snapshot and restore time of the session store across a graceful restart.
+
+Builds --sessions sessions of --turns exchanges through the same helpers
+/query uses. Answers are random sentences over the knowledge base's vocabulary,
+so they compress no better than real text. The store is then written with
+save_snapshot (what shutdown does) and read back into an empty store with
+restore_snapshot (what boot does), --repeat times each. A sample of the
+restored sessions is checked against the originals.
+
+For comparison, the same sessions also go through the obvious alternative:
+every history as JSON dicts, re-appended message by message on restore.
+
+The restore reads a file that is still in the page cache, as it is when a
+process restarts on the same host.
+
+    python benchmarks/bench_snapshot.py --sessions 100000 --turns 10
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("WARM_UP", "lazy")
+os.environ.setdefault("USAGE_LEDGER_FILE", os.path.join(tempfile.mkdtemp(), "usage.jsonl"))
+
+from main import _new_session, _record_turn, conversation_sessions, restore_snapshot, save_snapshot
+from message_log import MessageLog
+
+def vocabulary():
+    text = json.dumps(json.load(open(BACKEND / "data" / "iso_27001_knowledge.json")))
+    return re.findall(r"[A-Za-z][a-z]{2,}", text)
+
+def answer(rng, words, chars):
+    out, length = [], 0
+    while length < chars:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(6, 14))).capitalize() + "."
+        out.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(out)[:chars]
+
+def build(sessions, turns, chars):
+    rng = random.Random(0)
+    words = vocabulary()
+    answers = [answer(rng, words, chars) for _ in range(2000)]
+    for i in range(sessions):
+        session = _new_session()
+        session["tenant_id"] = f"tenant-{i % 20}"
+        for turn in range(turns):
+            _record_turn(session["log"], f"How do I evidence control A.5.{turn % 37 + 1} for supplier {i}?",
+                         answers[(i * turns + turn) % len(answers)] + f" ({i}.{turn})")
+        conversation_sessions.add(f"bench-{i}", session, session["tenant_id"])
+        conversation_sessions.touch(f"bench-{i}", message_count=len(session["log"]))
+
+def timed(function, repeat):
+    """Best of ``repeat`` runs: (seconds, last result)"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--answer-chars", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-json", action="store_true", help="Skip the JSON comparison")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    build(args.sessions, args.turns, args.answer_chars)
+    print(f"{args.sessions} sessions x {args.turns} exchanges built in {time.perf_counter() - started:.1f}s")
+    sample = [f"bench-{i}" for i in range(0, args.sessions, max(1, args.sessions // 500))]
+    expected = {session_id: (conversation_sessions[session_id]["log"].to_dicts(), conversation_sessions.info(session_id))
+                for session_id in sample}
+
+    path = Path(tempfile.mkdtemp()) / "sessions.snapshot"
+    restored_path = path.with_name(path.name + ".restored")
+
+    def restore():
+        conversation_sessions.restore([])
+        result = restore_snapshot(path)
+        restored_path.replace(path)  # restore sets the file aside; put it back for the next run
+        return result
+
+    write_seconds, saved = timed(lambda: save_snapshot(path), args.repeat)
+    read_seconds, restored = timed(restore, args.repeat)
+    assert restored and restored["sessions"] == args.sessions
+    for session_id, (history, info) in expected.items():
+        assert conversation_sessions[session_id]["log"].to_dicts() == history, session_id
+        assert conversation_sessions.info(session_id) == info, session_id
+
+    size_mb = saved["bytes"] / 1e6
+    print(f"{'format':>8} {'size MB':>9} {'write s':>8} {'MB/s':>7} {'restore s':>10} {'sessions/s':>11}")
+    print(f"{'binary':>8} {size_mb:>9.1f} {write_seconds:>8.2f} {size_mb / write_seconds:>7.0f} "
+          f"{read_seconds:>10.2f} {args.sessions / read_seconds:>11,.0f}")
+
+    if not args.skip_json:
+        json_path = path.with_suffix(".json")
+
+        def write_json():
+            with open(json_path, "w") as f:
+                json.dump({session_id: record["log"].to_dicts() for session_id, record in conversation_sessions.items()},
+                          f)
+
+        def read_json():
+            logs = {}
+            with open(json_path) as f:
+                for session_id, history in json.load(f).items():
+                    log = logs[session_id] = MessageLog()
+                    for message in history:
+                        log.append(message["role"], message["content"])
+            return logs
+
+        json_write, _ = timed(write_json, 1)
+        json_read, _ = timed(read_json, 1)
+        json_mb = json_path.stat().st_size / 1e6
+        print(f"{'json':>8} {json_mb:>9.1f} {json_write:>8.2f} {json_mb / json_write:>7.0f} "
+              f"{json_read:>10.2f} {args.sessions / json_read:>11,.0f}")
+        print(f"restore speed-up over JSON: {json_read / read_seconds:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the ISO 27001:2022 Auditor Agent backend.
+
+Imports ``main`` in fresh interpreters, reports the median cold import time and
+the heaviest imports, and exits non-zero when the median exceeds the budget so
+it can gate CI:
+
+    python benchmarks/bench_startup.py --budget-ms 1500
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from startup import import_time_report
+
+def cold_import_seconds(env):
+    """Time ``import main`` plus ``warm_up()`` in a fresh interpreter"""
+    code = (
+        "import time; t = time.perf_counter(); import main; "
+        "i = time.perf_counter() - t; import startup; startup.warm_up(); "
+        "print(i, time.perf_counter() - t)"
+    )
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    total = time.perf_counter() - started
+    import_seconds, warm_seconds = map(float, result.stdout.split()[-2:])
+    return total, import_seconds, warm_seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")),
+                        help="Fail when the median cold import of main exceeds this")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    env = {**os.environ, "WARM_UP": "lazy", "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-benchmark")}
+    samples = [cold_import_seconds(env) for _ in range(args.runs)]
+    process_ms = statistics.median(s[0] for s in samples) * 1000
+    import_ms = statistics.median(s[1] for s in samples) * 1000
+    warm_ms = statistics.median(s[2] for s in samples) * 1000
+
+    print(f"🚀 Backend cold start ({args.runs} runs, median)")
+    print(f"   import main        {import_ms:8.0f} ms   (budget {args.budget_ms:.0f} ms)")
+    print(f"   import + warm-up   {warm_ms:8.0f} ms")
+    print(f"   process wall time  {process_ms:8.0f} ms")
+
+    _, entries = import_time_report(top=args.top, env=env)
+    print(f"\n📦 Heaviest imports at boot (-X importtime, cumulative)")
+    for name, _, cumulative_us in entries:
+        print(f"   {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if import_ms > args.budget_ms:
+        print(f"\n❌ Cold import regressed past budget: {import_ms:.0f} ms > {args.budget_ms:.0f} ms")
+        sys.exit(1)
+    print("\n✅ Cold import within budget")
+
+if __name__ == "__main__":
+    main()
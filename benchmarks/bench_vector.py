@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Query latency of the memory-mapped vector index.
+
+Fills a VectorStore on disk with clustered synthetic embeddings, then times
+single and batched brute-force top-k queries and IVF-filtered queries (with
+their recall against brute force) at each corpus size.
+
+    python benchmarks/bench_vector.py --sizes 10000 100000 1000000 --dim 256
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from vector_store import VectorStore
+
+def clustered(rng, centers, count):
+    """Embeddings scattered around topic centres, like chunks of many documents"""
+    labels = rng.integers(0, len(centers), size=count)
+    return (centers[labels] + 0.35 * rng.standard_normal((count, centers.shape[1]))).astype(np.float32)
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return result, samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--nprobe", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((2000, args.dim)).astype(np.float32)
+    queries = clustered(rng, centers, args.queries)
+
+    print(f"{'vectors':>10} {'fill s':>7} {'brute p50':>10} {'brute p99':>10} {'batch/q':>8} "
+          f"{'ivf build s':>12} {'ivf p50':>8} {'ivf p99':>8} {'recall':>7}")
+    with tempfile.TemporaryDirectory() as root:
+        for size in args.sizes:
+            store = VectorStore(args.dim, Path(root) / f"bench-{size}", capacity=size)
+            started = time.perf_counter()
+            for start in range(0, size, 100_000):
+                count = min(100_000, size - start)
+                store.add([f"chunk-{i}" for i in range(start, start + count)], clustered(rng, centers, count))
+            fill = time.perf_counter() - started
+
+            single = iter(range(10 ** 9))
+            exact, brute_p50, brute_p99 = timed(
+                lambda: [store.search(queries[next(single) % len(queries)], k=args.k)[0]], args.queries
+            )
+            exact = store.search(queries, k=args.k)
+            _, batch_ms, _ = timed(lambda: store.search(queries[:args.batch], k=args.k), 5)
+
+            started = time.perf_counter()
+            store.build_ivf()
+            ivf_build = time.perf_counter() - started
+            probe = iter(range(10 ** 9))
+            _, ivf_p50, ivf_p99 = timed(
+                lambda: store.search(queries[next(probe) % len(queries)], k=args.k, nprobe=args.nprobe), args.queries
+            )
+            approx = store.search(queries, k=args.k, nprobe=args.nprobe)
+            recall = np.mean([
+                len({i for i, _ in a} & {i for i, _ in e}) / max(len(e), 1) for a, e in zip(approx, exact)
+            ])
+            print(f"{size:>10} {fill:>7.1f} {brute_p50:>8.2f}ms {brute_p99:>8.2f}ms {batch_ms / args.batch:>6.2f}ms "
+                  f"{ivf_build:>12.1f} {ivf_p50:>6.2f}ms {ivf_p99:>6.2f}ms {recall:>7.3f}")
+            del store
+
+if __name__ == "__main__":
+    main()
@@ -244,6 +244,9 @@ if 'conversation_history' not in st.session_state:
 if 'is_typing' not in st.session_state:
     st.session_state.is_typing = False
 
+if 'follow_ups' not in st.session_state:
+    st.session_state.follow_ups = []
+
 # Function to create a new session
 def create_new_session():
     try:
@@ -252,6 +255,7 @@ def create_new_session():
             result = response.json()
             st.session_state.session_id = result["session_id"]
             st.session_state.messages = []
+            st.session_state.follow_ups = []
             st.session_state.conversation_history = []
             st.success("🆕 New conversation session created!")
             return True
@@ -262,12 +266,25 @@ def create_new_session():
         st.error(f"Error creating session: {str(e)}")
         return False
 
-# Function to get session history
+# Function to get session history (revalidated with ETag, 304 when unchanged)
 def get_session_history(session_id):
+    cached = st.session_state.get("history_cache", {}).get(session_id)
+    headers = {"If-None-Match": cached["etag"]} if cached else {}
     try:
-        response = requests.get(f"{st.session_state.api_url}/session/{session_id}/history", timeout=10)
+        response = requests.get(
+            f"{st.session_state.api_url}/session/{session_id}/history",
+            headers=headers,
+            timeout=10
+        )
+        if response.status_code == 304 and cached:
+            return cached["conversation_history"]
         if response.status_code == 200:
             result = response.json()
+            if response.headers.get("ETag"):
+                st.session_state.setdefault("history_cache", {})[session_id] = {
+                    "etag": response.headers["ETag"],
+                    "conversation_history": result["conversation_history"]
+                }
             return result["conversation_history"]
         else:
             return []
@@ -275,6 +292,36 @@ def get_session_history(session_id):
         st.error(f"Error getting session history: {str(e)}")
         return []
 
+# Function to list the quick actions (fetched once per browser session)
+def get_quick_actions():
+    if not st.session_state.get("quick_actions"):
+        try:
+            response = requests.get(f"{st.session_state.api_url}/quick-actions", timeout=5)
+            st.session_state.quick_actions = response.json()["actions"] if response.status_code == 200 else []
+        except Exception:
+            st.session_state.quick_actions = []
+    return st.session_state.quick_actions
+
+# Function to run a quick action; its answer is usually pre-generated by the API
+def run_quick_action(action):
+    try:
+        response = requests.post(
+            f"{st.session_state.api_url}/quick-actions/{action['id']}",
+            json={"session_id": st.session_state.session_id},
+            timeout=30
+        )
+        if response.status_code == 200:
+            result = response.json()
+            st.session_state.messages.append({"role": "user", "content": action["prompt"]})
+            st.session_state.messages.append({"role": "assistant", "content": result["response"]})
+            st.session_state.conversation_history = result.get("conversation_history", [])
+            st.session_state.follow_ups = result.get("follow_ups", [])
+            return True
+        st.error(f"API Error: {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        st.error(f"Connection Error: {str(e)}")
+    return False
+
 # Sidebar
 with st.sidebar:
     st.markdown("## 🔒 ISO 27001:2022 Auditor")
@@ -289,6 +336,7 @@ with st.sidebar:
     if st.button("🗑️ Clear Current Session"):
         if st.session_state.session_id:
             st.session_state.messages = []
+            st.session_state.follow_ups = []
             st.session_state.conversation_history = []
             st.success("Current session cleared!")
         else:
@@ -338,32 +386,14 @@ with st.sidebar:
     # Quick Actions
     st.markdown("### 🚀 Quick Actions")
     
-    if st.button("📋 Show Control Groups"):
-        if not st.session_state.session_id:
-            create_new_session()
-        st.session_state.messages.append({
-            "role": "user",
-            "content": "What are the main control groups in ISO 27001:2022?"
-        })
-        st.rerun()
-    
-    if st.button("🔍 Risk Assessment"):
-        if not st.session_state.session_id:
-            create_new_session()
-        st.session_state.messages.append({
-            "role": "user",
-            "content": "How do I conduct a risk assessment for ISO 27001:2022?"
-        })
-        st.rerun()
-    
-    if st.button("📚 Implementation Steps"):
-        if not st.session_state.session_id:
-            create_new_session()
-        st.session_state.messages.append({
-            "role": "user",
-            "content": "What are the key steps to implement ISO 27001:2022?"
-        })
-        st.rerun()
+    for action in get_quick_actions():
+        if st.button(action["label"], key=f"quick_{action['id']}"):
+            if not st.session_state.session_id:
+                create_new_session()
+            if run_quick_action(action):
+                st.rerun()
+    if not st.session_state.quick_actions:
+        st.caption("Quick actions are unavailable until the API is reachable.")
     
     st.markdown("---")
     
@@ -379,6 +409,7 @@ with st.sidebar:
     # Clear all data button
     if st.button("🗑️ Clear All Data"):
         st.session_state.messages = []
+        st.session_state.follow_ups = []
         st.session_state.conversation_history = []
         st.session_state.session_id = ""
         st.success("All data cleared!")
@@ -437,6 +468,16 @@ with chat_container:
         """, unsafe_allow_html=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Suggested follow-ups; the API may already have their answers
+    if st.session_state.follow_ups and not st.session_state.is_typing:
+        columns = st.columns(len(st.session_state.follow_ups))
+        for i, (column, question) in enumerate(zip(columns, st.session_state.follow_ups)):
+            if column.button(question, key=f"follow_up_{i}"):
+                st.session_state.messages.append({"role": "user", "content": question})
+                st.session_state.follow_ups = []
+                st.session_state.is_typing = True
+                st.rerun()
 
 # Input area with form for better handling
 st.markdown("---")
@@ -500,6 +541,7 @@ if st.session_state.is_typing and st.session_state.messages and st.session_state
             
             # Update conversation history
             st.session_state.conversation_history = result.get("conversation_history", [])
+            st.session_state.follow_ups = result.get("follow_ups", [])
             
         else:
             st.error(f"API Error: {response.status_code}")
@@ -2,16 +2,25 @@
 """
 Startup script for ISO 27001:2022 Auditor Agent
 This script helps you start both the backend and frontend services.
+
+Both services are launched in parallel and probed for readiness (backend
+``/health`` and the Streamlit port) with exponential backoff instead of fixed
+sleeps. Use ``--backend-only --workers N`` to run just the API for production.
 """
 
+import argparse
+import socket
 import subprocess
 import sys
-import os
+import tempfile
 import time
-import signal
 import threading
+import urllib.error
+import urllib.request
 from pathlib import Path
 
+ROOT_DIR = Path(__file__).resolve().parent
+
 def print_banner():
     """Print the application banner"""
     print("""
@@ -20,12 +29,14 @@ def print_banner():
 Built with FastAPI, LangGraph & Streamlit
 """)
 
-def check_dependencies():
+def check_dependencies(backend_only=False):
     """Check if required dependencies are installed"""
     try:
         import fastapi
-        import streamlit
+        import uvicorn
         import langgraph
+        if not backend_only:
+            import streamlit
         print("✅ All dependencies are installed")
         return True
     except ImportError as e:
@@ -35,150 +46,235 @@ def check_dependencies():
 
 def check_env_file():
     """Check if .env file exists and has OpenAI API key"""
-    env_file = Path(".env")
+    env_file = ROOT_DIR / ".env"
     if not env_file.exists():
         print("⚠️  .env file not found")
         print("Please copy env.example to .env and add your OpenAI API key")
         return False
-    
+
     with open(env_file, 'r') as f:
         content = f.read()
         if "your_openai_api_key_here" in content:
             print("⚠️  Please update your OpenAI API key in .env file")
             return False
-    
+
     print("✅ Environment configuration found")
     return True
 
-def start_backend():
-    """Start the FastAPI backend"""
-    print("🚀 Starting FastAPI backend...")
-    backend_dir = Path("backend")
-    if not backend_dir.exists():
-        print("❌ Backend directory not found")
-        return None
-    
+def _backoff_delays(initial=0.05, maximum=1.0, factor=2.0):
+    """Yield exponentially growing probe delays capped at ``maximum``"""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+def wait_for_http(url, timeout=60.0, process=None):
+    """Poll ``url`` until it answers 200, the process exits or ``timeout`` elapses"""
+    deadline = time.monotonic() + timeout
+    for delay in _backoff_delays():
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, socket.timeout, OSError):
+            pass
+        if time.monotonic() + delay > deadline:
+            return False
+        time.sleep(delay)
+
+def wait_for_port(host, port, timeout=60.0, process=None):
+    """Poll a TCP port until it accepts connections, the process exits or ``timeout`` elapses"""
+    deadline = time.monotonic() + timeout
+    for delay in _backoff_delays():
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            pass
+        if time.monotonic() + delay > deadline:
+            return False
+        time.sleep(delay)
+
+def _spawn(name, command, cwd):
+    """Start a service process with its output captured to a temporary log"""
+    if not cwd.exists():
+        print(f"❌ {name} directory not found")
+        return None, None
+    log = tempfile.TemporaryFile()
     try:
-        # Change to backend directory and start the server
-        os.chdir(backend_dir)
-        process = subprocess.Popen([
-            sys.executable, "main.py"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Wait a moment for the server to start
-        time.sleep(3)
-        
-        # Check if the process is still running
-        if process.poll() is None:
-            print("✅ Backend started successfully on http://localhost:8000")
-            return process
-        else:
-            stdout, stderr = process.communicate()
-            print(f"❌ Backend failed to start: {stderr.decode()}")
-            return None
-            
+        process = subprocess.Popen(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
     except Exception as e:
-        print(f"❌ Error starting backend: {e}")
-        return None
-    finally:
-        # Return to root directory
-        os.chdir("..")
+        print(f"❌ Error starting {name.lower()}: {e}")
+        log.close()
+        return None, None
+    return process, log
+
+def _log_tail(log, lines=20):
+    """Return the last lines written by a service"""
+    log.seek(0)
+    return "\n".join(log.read().decode(errors="replace").splitlines()[-lines:])
+
+def start_backend(host="0.0.0.0", port=8000, workers=1):
+    """Start the FastAPI backend under uvicorn"""
+    print(f"🚀 Starting FastAPI backend ({workers} worker{'s' if workers != 1 else ''})...")
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", host, "--port", str(port),
+    ]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    return _spawn("Backend", command, ROOT_DIR / "backend")
 
-def start_frontend():
+def start_frontend(port=8501):
     """Start the Streamlit frontend"""
     print("🎨 Starting Streamlit frontend...")
-    frontend_dir = Path("frontend")
-    if not frontend_dir.exists():
-        print("❌ Frontend directory not found")
-        return None
-    
-    try:
-        # Change to frontend directory and start Streamlit
-        os.chdir(frontend_dir)
-        process = subprocess.Popen([
-            sys.executable, "-m", "streamlit", "run", "app.py",
-            "--server.port", "8501",
-            "--server.headless", "true"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Wait a moment for the server to start
-        time.sleep(5)
-        
-        # Check if the process is still running
-        if process.poll() is None:
-            print("✅ Frontend started successfully on http://localhost:8501")
-            return process
-        else:
-            stdout, stderr = process.communicate()
-            print(f"❌ Frontend failed to start: {stderr.decode()}")
-            return None
-            
-    except Exception as e:
-        print(f"❌ Error starting frontend: {e}")
-        return None
-    finally:
-        # Return to root directory
-        os.chdir("..")
+    command = [
+        sys.executable, "-m", "streamlit", "run", "app.py",
+        "--server.port", str(port),
+        "--server.headless", "true",
+    ]
+    return _spawn("Frontend", command, ROOT_DIR / "frontend")
+
+def wait_until_ready(services, timeout):
+    """Probe every service concurrently and record how long each took to become ready"""
+    results = {}
 
-def main():
+    def probe(name, check):
+        started = time.monotonic()
+        results[name] = (check(timeout), time.monotonic() - started)
+
+    threads = [
+        threading.Thread(target=probe, args=(name, check), daemon=True)
+        for name, check in services.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def stop_processes(processes):
+    """Terminate the given processes and wait for them to exit"""
+    for process in processes:
+        if process and process.poll() is None:
+            process.terminate()
+    for process in processes:
+        if process:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Start the ISO 27001:2022 Auditor Agent")
+    parser.add_argument("--backend-only", action="store_true",
+                        help="Run only the FastAPI backend (production mode)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of uvicorn worker processes for the backend")
+    parser.add_argument("--host", default="0.0.0.0", help="Backend bind address")
+    parser.add_argument("--backend-port", type=int, default=8000)
+    parser.add_argument("--frontend-port", type=int, default=8501)
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Seconds to wait for each service to become ready")
+    parser.add_argument("--skip-env-check", action="store_true",
+                        help="Do not require a .env file (e.g. when the key comes from the environment)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to start the application"""
+    args = parse_args(argv)
     print_banner()
-    
+
     # Check dependencies
-    if not check_dependencies():
+    if not check_dependencies(args.backend_only):
         sys.exit(1)
-    
+
     # Check environment configuration
-    if not check_env_file():
+    if not args.skip_env_check and not check_env_file():
         print("Please configure your environment before starting the application")
         sys.exit(1)
-    
+
     print("\n🚀 Starting ISO 27001:2022 Auditor Agent...")
-    
-    # Start backend
-    backend_process = start_backend()
+    timings = {}
+    started = time.monotonic()
+
+    # Start both services in parallel
+    backend_process, backend_log = start_backend(args.host, args.backend_port, args.workers)
     if not backend_process:
         print("❌ Failed to start backend. Exiting.")
         sys.exit(1)
-    
-    # Start frontend
-    frontend_process = start_frontend()
-    if not frontend_process:
-        print("❌ Failed to start frontend. Stopping backend...")
-        backend_process.terminate()
+    frontend_process, frontend_log = None, None
+    if not args.backend_only:
+        frontend_process, frontend_log = start_frontend(args.frontend_port)
+        if not frontend_process:
+            print("❌ Failed to start frontend. Stopping backend...")
+            stop_processes([backend_process])
+            sys.exit(1)
+    timings["spawn"] = time.monotonic() - started
+
+    # Probe readiness instead of sleeping for a fixed time
+    probes = {
+        "backend": lambda timeout: wait_for_http(
+            f"http://localhost:{args.backend_port}/health", timeout, backend_process
+        ),
+    }
+    if frontend_process:
+        probes["frontend"] = lambda timeout: wait_for_port(
+            "localhost", args.frontend_port, timeout, frontend_process
+        )
+    results = wait_until_ready(probes, args.timeout)
+
+    logs = {"backend": backend_log, "frontend": frontend_log}
+    failed = [name for name, (ready, _) in results.items() if not ready]
+    for name, (ready, elapsed) in results.items():
+        timings[f"{name}_ready"] = elapsed
+        if not ready:
+            print(f"❌ {name.capitalize()} failed to become ready within {args.timeout:.0f}s")
+            print(_log_tail(logs[name]))
+    if failed:
+        stop_processes([backend_process, frontend_process])
         sys.exit(1)
-    
+    timings["total"] = time.monotonic() - started
+
+    print(f"✅ Backend ready on http://localhost:{args.backend_port}")
+    if frontend_process:
+        print(f"✅ Frontend ready on http://localhost:{args.frontend_port}")
+
+    print("\n⏱️  Startup timings:")
+    for phase, seconds in timings.items():
+        print(f"   {phase:<16} {seconds * 1000:8.0f} ms")
+
     print("\n🎉 Application started successfully!")
-    print("📱 Frontend: http://localhost:8501")
-    print("🔌 Backend API: http://localhost:8000")
-    print("📚 API Docs: http://localhost:8000/docs")
+    if frontend_process:
+        print(f"📱 Frontend: http://localhost:{args.frontend_port}")
+    print(f"🔌 Backend API: http://localhost:{args.backend_port}")
+    print(f"📚 API Docs: http://localhost:{args.backend_port}/docs")
     print("\nPress Ctrl+C to stop all services")
-    
+
     try:
         # Keep the main thread alive
         while True:
             time.sleep(1)
-            
+
             # Check if processes are still running
             if backend_process.poll() is not None:
                 print("❌ Backend process stopped unexpectedly")
+                print(_log_tail(backend_log))
                 break
-            if frontend_process.poll() is not None:
+            if frontend_process and frontend_process.poll() is not None:
                 print("❌ Frontend process stopped unexpectedly")
+                print(_log_tail(frontend_log))
                 break
-                
+
     except KeyboardInterrupt:
         print("\n🛑 Shutting down services...")
-        
-        # Terminate processes
-        if backend_process:
-            backend_process.terminate()
-            print("✅ Backend stopped")
-        
-        if frontend_process:
-            frontend_process.terminate()
-            print("✅ Frontend stopped")
-        
+    finally:
+        stop_processes([backend_process, frontend_process])
         print("👋 Goodbye!")
 
 if __name__ == "__main__":
@@ -52,6 +52,25 @@ echo ""
 echo "🚀 Starting ISO 27001:2022 Auditor Agent..."
 echo ""
 
+# Poll a readiness check with exponential backoff: wait_ready <pid> <timeout> <command...>
+wait_ready() {
+    local pid=$1 timeout=$2
+    shift 2
+    local delay=0.05 waited=0
+    while ! "$@" >/dev/null 2>&1; do
+        if ! kill -0 "$pid" 2>/dev/null; then
+            return 1
+        fi
+        if [ "$(awk -v w="$waited" -v t="$timeout" 'BEGIN { print (w >= t) }')" = "1" ]; then
+            return 1
+        fi
+        sleep "$delay"
+        waited=$(awk -v w="$waited" -v d="$delay" 'BEGIN { print w + d }')
+        delay=$(awk -v d="$delay" 'BEGIN { d *= 2; if (d > 1) d = 1; print d }')
+    done
+    return 0
+}
+
 # Function to cleanup background processes
 cleanup() {
     echo ""
@@ -78,36 +97,25 @@ python3 main.py &
 BACKEND_PID=$!
 cd ..
 
-# Wait for backend to start
-echo "⏳ Waiting for backend to start..."
-sleep 5
-
-# Check if backend is running
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "❌ Backend failed to start"
-    exit 1
-fi
-
-echo "✅ Backend started successfully on http://localhost:8000"
-
-# Start frontend
+# Start frontend in parallel
 echo "🎨 Starting Streamlit frontend..."
 cd frontend
 streamlit run app.py --server.port 8501 --server.headless true &
 FRONTEND_PID=$!
 cd ..
 
-# Wait for frontend to start
-echo "⏳ Waiting for frontend to start..."
-sleep 5
+# Probe readiness instead of sleeping for a fixed time
+echo "⏳ Waiting for services to become ready..."
+if ! wait_ready $BACKEND_PID 60 curl -sf http://localhost:8000/health; then
+    echo "❌ Backend failed to start"
+    exit 1
+fi
+echo "✅ Backend started successfully on http://localhost:8000"
 
-# Check if frontend is running
-if ! kill -0 $FRONTEND_PID 2>/dev/null; then
+if ! wait_ready $FRONTEND_PID 60 curl -sf http://localhost:8501/_stcore/health; then
     echo "❌ Frontend failed to start"
-    kill $BACKEND_PID 2>/dev/null
     exit 1
 fi
-
 echo "✅ Frontend started successfully on http://localhost:8501"
 
 echo ""
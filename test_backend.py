@@ -7,6 +7,8 @@ import requests
 import json
 import time
 
+from start import wait_for_http
+
 def test_backend():
     """Test the backend API endpoints"""
     
@@ -96,8 +98,12 @@ if __name__ == "__main__":
     print("Make sure the backend is running on http://localhost:8000")
     print("You can start it with: cd backend && python main.py")
     
-    # Wait a moment for user to read
-    time.sleep(2)
+    # Wait until the backend answers its health probe instead of sleeping
+    started = time.monotonic()
+    if not wait_for_http("http://localhost:8000/health", timeout=30):
+        print("❌ Backend did not become ready within 30s")
+        raise SystemExit(1)
+    print(f"✅ Backend ready after {time.monotonic() - started:.2f}s")
     
     try:
         success = test_backend()
@@ -0,0 +1,6 @@
+"""Unit tests import the backend modules directly, as main.py does; no server is started."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from control_tools import ControlTools
+from knowledge import KnowledgeStore
+
+@pytest.fixture(scope="module")
+def kb():
+    return KnowledgeStore().current()
+
+def search_first(kb):
+    return lambda text, limit: [(kb.controls[0].id, 0.9)][:limit]
+
+def test_lookup_is_memoized(kb):
+    tools = ControlTools(kb, search_first(kb))
+    first, cached = tools.call("lookup_control", {"control_id": kb.controls[0].id})
+    again, cached_again = tools.call("lookup_control", {"control_id": kb.controls[0].id})
+    assert json.loads(first)["id"] == kb.controls[0].id
+    assert (cached, cached_again) == (False, True)
+    assert again == first
+
+def test_unknown_tool(kb):
+    content, cached = ControlTools(kb, search_first(kb)).call("delete_everything", {})
+    assert "Unknown tool" in json.loads(content)["error"]
+    assert not cached
+
+@pytest.mark.parametrize("args", [
+    {"text": "access control", "limit": "five"},  # ValueError in int()
+    {"text": "access control", "bogus": 1},        # unexpected keyword
+    {},                                            # missing argument
+])
+def test_malformed_arguments_return_an_error(kb, args):
+    tools = ControlTools(kb, search_first(kb))
+    content, cached = tools.call("search_controls", args)
+    assert "error" in json.loads(content)
+    assert not cached
+    # Errors are not memoized: the same call is evaluated again
+    assert tools.call("search_controls", args)[1] is False
+
+def test_failing_search_returns_an_error(kb):
+    def broken(text, limit):
+        raise RuntimeError("embedder unavailable")
+    content, _ = ControlTools(kb, broken).call("search_controls", {"text": "backups"})
+    assert "embedder unavailable" in json.loads(content)["error"]
+
+def test_execute_answers_every_call(kb):
+    tools = ControlTools(kb, search_first(kb))
+    results = tools.execute([
+        {"name": "search_controls", "args": {"text": "x", "limit": "five"}, "id": "1"},
+        {"name": "list_group", "args": {"name": kb.controls[0].group}, "id": "2"},
+    ])
+    assert [result["id"] for result in results] == ["1", "2"]
+    assert "error" in json.loads(results[0]["content"])
+    assert json.loads(results[1]["content"])["controls"]
@@ -0,0 +1,66 @@
+import asyncio
+
+from drain import Drain, DrainMiddleware
+
+def http(path):
+    return {"type": "http", "path": path}
+
+async def call(middleware, path):
+    """Status code the middleware's app answers ``path`` with"""
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(http(path), None, send)
+    return sent[0]["status"]
+
+def test_running_requests_are_counted_and_waited_for():
+    async def run():
+        drain = Drain()
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            assert drain.in_flight == 1
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200})
+
+        request = asyncio.create_task(call(DrainMiddleware(app, drain), "/query"))
+        await asyncio.sleep(0)
+        drain.begin()
+        assert not await drain.wait(0.01)
+        release.set()
+        assert await drain.wait(1)
+        assert await request == 200
+        assert drain.status()["in_flight"] == 0
+
+    asyncio.run(run())
+
+def test_new_requests_are_refused_while_draining():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200})
+
+    drain = Drain()
+    drain.begin()
+    middleware = DrainMiddleware(app, drain)
+    assert asyncio.run(call(middleware, "/query")) == 503
+    assert asyncio.run(call(middleware, "/health")) == 200
+
+def test_exempt_paths_do_not_hold_up_the_drain():
+    async def run():
+        drain = Drain()
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200})
+
+        probe = asyncio.create_task(call(DrainMiddleware(app, drain), "/health"))
+        await asyncio.sleep(0)
+        assert drain.in_flight == 0
+        drain.begin()
+        assert await drain.wait(0.01)
+        release.set()
+        assert await probe == 200
+
+    asyncio.run(run())
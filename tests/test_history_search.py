@@ -0,0 +1,51 @@
+import pytest
+
+from history_search import HistoryIndex
+
+@pytest.fixture
+def index(tmp_path):
+    index = HistoryIndex(tmp_path / "history.jsonl")
+    turns = [
+        {"role": "user", "content": "How do we manage supplier access to the cloud?", "timestamp": "2024-01-01T10:00:00"},
+        {"role": "assistant", "content": "Control A.5.23 covers cloud services; supplier access is A.5.19.",
+         "timestamp": "2024-01-01T10:00:05"},
+        {"role": "user", "content": "And access control for the cloud supplier?", "timestamp": "2024-01-02T10:00:00"},
+    ]
+    index.submit("s1", "acme", turns, 0)
+    index.submit("s2", "other", [{"role": "user", "content": "Explain A.5.2 and 5.23 please",
+                                  "timestamp": "2024-01-03T10:00:00"}], 0)
+    index.flush()
+    return index
+
+def turns(result):
+    return [(hit["session_id"], hit["turn"]) for hit in result["results"]]
+
+def test_terms_must_all_match(index):
+    assert turns(index.search("supplier cloud")) == [("s1", 2), ("s1", 1), ("s1", 0)]
+
+def test_phrase_matches_consecutive_positions_only(index):
+    assert turns(index.search('"supplier access"')) == [("s1", 1), ("s1", 0)]
+    assert turns(index.search('"cloud supplier"')) == [("s1", 2)]
+    assert index.search('"access supplier"')["total"] == 0
+
+def test_phrase_and_term_combined(index):
+    assert turns(index.search('"supplier access" services')) == [("s1", 1)]
+
+def test_control_ids_match_exactly(index):
+    assert turns(index.search("A.5.23")) == [("s1", 1)]
+    assert turns(index.search("A.5.2")) == [("s2", 0)]
+
+def test_filters_and_session_removal(index):
+    assert index.search("cloud", tenant_id="other")["total"] == 0
+    assert index.search("please", session_id="s2")["total"] == 1
+    index.remove_session("s1")
+    index.flush()
+    assert index.search("cloud")["total"] == 0
+    assert len(index) == 1
+
+def test_index_is_replayed_from_its_log(index, tmp_path):
+    index.remove_session("s2")
+    index.flush()
+    reloaded = HistoryIndex(tmp_path / "history.jsonl")
+    assert turns(reloaded.search('"cloud supplier"')) == [("s1", 2)]
+    assert reloaded.search("please")["total"] == 0
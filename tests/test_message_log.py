@@ -0,0 +1,61 @@
+import pytest
+
+from message_log import BLOCK_MESSAGES, HOT_MESSAGES, MessageLog
+
+def conversation(messages):
+    log = MessageLog()
+    for i in range(messages):
+        log.append("user" if i % 2 == 0 else "assistant", f"message {i} ü", timestamp_ms=1_700_000_000_000 + i)
+    return log
+
+def test_append_and_tail():
+    log = conversation(4)
+    assert len(log) == 4
+    assert log.tail(2) == [("user", "message 2 ü"), ("assistant", "message 3 ü")]
+    assert log.tail(10) == log.tail(4)
+
+def test_oldest_messages_are_frozen_into_cold_blocks():
+    log = conversation(HOT_MESSAGES + BLOCK_MESSAGES)
+    stats = log.stats()
+    assert stats["cold_messages"] == BLOCK_MESSAGES
+    assert stats["hot_messages"] == HOT_MESSAGES
+    assert stats["cold_compressed_bytes"] > 0
+    assert [m["content"] for m in log.to_dicts()] == [f"message {i} ü" for i in range(len(log))]
+
+def test_tail_and_older_reach_into_cold_blocks():
+    total = HOT_MESSAGES + 2 * BLOCK_MESSAGES + 3
+    log = conversation(total)
+    assert log.tail(HOT_MESSAGES + 2) == [
+        ("user" if i % 2 == 0 else "assistant", f"message {i} ü") for i in range(total - HOT_MESSAGES - 2, total)
+    ]
+    older = list(log.older(4))
+    assert [text for _, text in older] == [f"message {i} ü" for i in reversed(range(total - 4))]
+    assert log.to_dicts(total - 1)[0]["content"] == f"message {total - 1} ü"
+
+def test_fingerprint_identifies_the_conversation():
+    assert conversation(20).fingerprint == conversation(20).fingerprint
+    assert conversation(20).fingerprint != conversation(21).fingerprint
+    assert MessageLog().fingerprint == ""
+
+def test_copy_is_independent():
+    log = conversation(HOT_MESSAGES + BLOCK_MESSAGES)
+    clone = log.copy()
+    clone.append("user", "only in the copy")
+    assert len(clone) == len(log) + 1
+    assert log.fingerprint != clone.fingerprint
+    assert log.tail(1) == [("assistant", f"message {len(log) - 1} ü")]
+
+@pytest.mark.parametrize("messages", [0, 3, HOT_MESSAGES + BLOCK_MESSAGES, 50])
+def test_bytes_round_trip(messages):
+    log = conversation(messages)
+    prefix, suffix = b"xyz", b"trailing"
+    buffer = memoryview(prefix + log.to_bytes() + suffix)
+    restored, end = MessageLog.from_buffer(buffer, len(prefix))
+    assert end == len(buffer) - len(suffix)
+    assert restored.to_dicts() == log.to_dicts()
+    assert restored.fingerprint == log.fingerprint
+    assert restored.stats() == log.stats()
+    # The restored log keeps growing like the original
+    restored.append("user", "next")
+    log.append("user", "next")
+    assert restored.fingerprint == log.fingerprint
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from scheduler import QueueFull, Scheduler
+
+def served_order(scheduler, requests):
+    """Tenants in the order their (priority, tenant) requests got a slot, all queued behind one running request"""
+    order = []
+
+    async def request(priority, tenant):
+        async with scheduler.slot(priority, tenant):
+            order.append(tenant)
+            await asyncio.sleep(0)
+
+    async def run():
+        async with scheduler.slot("interactive", "holder"):
+            tasks = [asyncio.create_task(request(priority, tenant)) for priority, tenant in requests]
+            while sum(scheduler._waiting.values()) < len(requests):
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    return order
+
+def test_tenants_interleave_within_a_class():
+    order = served_order(Scheduler(concurrency=1), [("batch", "bulk")] * 6 + [("batch", "single")] * 2)
+    # The late tenant is not stuck behind the whole backlog of the busy one
+    assert order == ["bulk", "single", "bulk", "single", "bulk", "bulk", "bulk", "bulk"]
+
+def test_weights_share_slots_in_proportion():
+    scheduler = Scheduler(concurrency=1, weights={"gold": 2.0})
+    order = served_order(scheduler, [("batch", "gold")] * 8 + [("batch", "basic")] * 8)
+    assert order[:6].count("gold") == 4
+
+def test_higher_class_runs_first():
+    order = served_order(Scheduler(concurrency=1), [("warmup", "w"), ("batch", "b"), ("interactive", "i")])
+    assert order == ["i", "b", "w"]
+
+def test_class_cap_leaves_slots_for_chat():
+    scheduler = Scheduler(concurrency=2, caps={"batch": 1})
+
+    async def run():
+        async with scheduler.slot("batch", "job"):
+            waiting = asyncio.create_task(scheduler.slot("batch", "job").__aenter__())
+            await asyncio.sleep(0)
+            assert scheduler.running == {"interactive": 0, "batch": 1, "warmup": 0}
+            assert scheduler.status()["classes"]["batch"]["queued"] == 1
+            async with scheduler.slot("interactive", "user") as queued:
+                assert queued < 0.1
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.status()["classes"]["batch"]["queued"] == 0
+
+    asyncio.run(run())
+
+def test_full_queue_is_rejected():
+    scheduler = Scheduler(concurrency=1, max_queue=1)
+
+    async def run():
+        async with scheduler.slot("batch", "a"):
+            waiting = asyncio.create_task(scheduler.slot("batch", "a").__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(QueueFull):
+                async with scheduler.slot("batch", "b"):
+                    pass
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+
+    asyncio.run(run())
@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from sessions import SessionStore, SortedIndex
+
+def test_sorted_index_matches_a_sorted_list():
+    rng = random.Random(3)
+    index, reference = SortedIndex(load=4), []  # small buckets, so they split and empty often
+    for _ in range(2000):
+        if reference and rng.random() < 0.4:
+            item = rng.choice(reference)
+            reference.remove(item)
+            index.remove(item)
+        else:
+            item = (rng.randint(0, 50), str(rng.random()))
+            reference.append(item)
+            index.add(item)
+    reference.sort()
+    assert len(index) == len(reference)
+    assert list(index.irange()) == reference
+    assert list(index.irange(reverse=True)) == reference[::-1]
+    for _ in range(200):
+        low, high = sorted([(rng.randint(-1, 52), str(rng.random())) for _ in range(2)])
+        assert list(index.irange(low, high)) == [x for x in reference if low <= x <= high]
+        assert list(index.irange(low, high, exclusive=True)) == [x for x in reference if low < x <= high]
+        assert list(index.irange(low, high, reverse=True, exclusive=True)) == [
+            x for x in reference if low <= x < high
+        ][::-1]
+
+def test_sorted_index_load():
+    index = SortedIndex(load=4)
+    index.load([(3, "c"), (1, "a"), (2, "b")] * 5)
+    assert list(index.irange()) == sorted([(3, "c"), (1, "a"), (2, "b")] * 5)
+
+@pytest.fixture
+def store():
+    rng = random.Random(7)
+    store = SessionStore()
+    for i in range(300):
+        store.add(f"s{i}", {"n": i}, rng.choice(["", "a", "b"]), now=i)
+    for _ in range(400):
+        session_id = f"s{rng.randrange(300)}"
+        store.touch(session_id, message_count=rng.randint(0, 20), now=300 + rng.random() * 100)
+    for i in range(0, 300, 7):
+        store.delete(f"s{i}")
+    return store
+
+def pages(store, **query):
+    """Every session ID the query returns, following cursors page by page"""
+    found, cursor = [], None
+    while True:
+        page, cursor = store.query(limit=13, cursor=cursor, **query)
+        found += page
+        if not cursor:
+            return found
+
+@pytest.mark.parametrize("sort", ["created_at", "last_active", "message_count"])
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("tenant_id", [None, "a"])
+def test_keyset_paging_matches_a_full_sort(store, sort, descending, tenant_id):
+    expected = sorted(
+        (store.info(session_id)[sort], session_id) for session_id, _ in store.items()
+        if not tenant_id or store.info(session_id)["tenant_id"] == tenant_id
+    )
+    if descending:
+        expected.reverse()
+    assert pages(store, sort=sort, descending=descending, tenant_id=tenant_id) == [s for _, s in expected]
+
+def test_paging_with_a_range_filter(store):
+    found = pages(store, sort="last_active", descending=False, min_messages=10, active_after=350)
+    assert found == [
+        s for _, s in sorted((store.info(s)["last_active"], s) for s, _ in store.items()
+                             if store.info(s)["message_count"] >= 10 and store.info(s)["last_active"] >= 350)
+    ]
+
+def test_expire_removes_the_oldest_first(store):
+    oldest = sorted(store.items(), key=lambda item: store.info(item[0])["last_active"])[:5]
+    cutoff = store.info(oldest[-1][0])["last_active"] + 1e-9
+    remaining = len(store)
+    assert store.expire(cutoff) == [session_id for session_id, _ in oldest]
+    assert len(store) == remaining - 5
+    assert all(session_id not in store for session_id, _ in oldest)
+
+def test_dump_and_restore(store):
+    copy = SessionStore()
+    copy.restore(store.dump())
+    assert len(copy) == len(store)
+    for session_id, record in store.items():
+        assert copy[session_id] is record
+        assert copy.info(session_id) == store.info(session_id)
+    assert pages(copy, sort="message_count", tenant_id="b") == pages(store, sort="message_count", tenant_id="b")
+    assert copy.count("a") == store.count("a")
+
+def test_failed_restore_changes_nothing(store):
+    def broken():
+        yield from list(store.dump())[:3]
+        raise OSError("read failed")
+
+    before = pages(store)
+    with pytest.raises(OSError):
+        store.restore(broken())
+    assert pages(store) == before
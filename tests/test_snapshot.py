@@ -0,0 +1,81 @@
+import pytest
+
+from message_log import MessageLog
+from sessions import SessionStore
+from snapshot import MAGIC, SnapshotError, decode_sessions, encode_session, open_snapshot, write_snapshot
+
+@pytest.fixture
+def store():
+    store = SessionStore()
+    for i in range(5):
+        log = MessageLog()
+        for turn in range(3 * i):
+            log.append("user", f"question {turn} of session {i}")
+            log.append("assistant", f"answer {turn} — session {i}")
+        store.add(f"s{i}", {"log": log, "created_at": "2024-01-01T00:00:00", "tenant_id": "acme" if i % 2 else "",
+                            "revision": i}, "acme" if i % 2 else "", now=100 + i)
+        store.touch(f"s{i}", message_count=len(log), now=200 + i)
+    return store
+
+def write(store, path):
+    return write_snapshot(path, [
+        (b"SESS", (encode_session(session_id, record, fields) for session_id, record, fields in store.dump())),
+        (b"TEST", [b"payload"]),
+    ])
+
+def test_sessions_round_trip(store, tmp_path):
+    path = tmp_path / "sessions.snapshot"
+    assert write(store, path) == path.stat().st_size
+    restored = SessionStore()
+    with open_snapshot(path) as sections:
+        assert bytes(sections["TEST"]) == b"payload"
+        restored.restore(list(decode_sessions(sections["SESS"])))
+    assert len(restored) == len(store)
+    for session_id, record in store.items():
+        copy = restored[session_id]
+        assert copy["log"].to_dicts() == record["log"].to_dicts()
+        assert copy["log"].fingerprint == record["log"].fingerprint
+        assert (copy["tenant_id"], copy["revision"], copy["created_at"]) == (
+            record["tenant_id"], record["revision"], record["created_at"])
+        assert restored.info(session_id) == store.info(session_id)
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_damaged_section_is_rejected(store, tmp_path):
+    path = tmp_path / "sessions.snapshot"
+    write(store, path)
+    data = bytearray(path.read_bytes())
+    data[len(data) // 2] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError, match="damaged"):
+        with open_snapshot(path):
+            pass
+
+@pytest.mark.parametrize("content", [b"", MAGIC[:4], b"NOTASNAP" + b"\0" * 32])
+def test_other_files_are_rejected(tmp_path, content):
+    path = tmp_path / "sessions.snapshot"
+    path.write_bytes(content)
+    with pytest.raises(SnapshotError):
+        with open_snapshot(path):
+            pass
+
+def test_truncated_file_is_rejected(store, tmp_path):
+    path = tmp_path / "sessions.snapshot"
+    write(store, path)
+    path.write_bytes(path.read_bytes()[:-3])
+    with pytest.raises(SnapshotError):
+        with open_snapshot(path):
+            pass
+
+def test_failed_write_keeps_the_previous_snapshot(store, tmp_path):
+    path = tmp_path / "sessions.snapshot"
+    write(store, path)
+    previous = path.read_bytes()
+
+    def failing():
+        yield b"partial"
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_snapshot(path, [(b"SESS", failing())])
+    assert path.read_bytes() == previous
+    assert not list(tmp_path.glob("*.tmp"))